@@ -0,0 +1,69 @@
+""" import時間のベンチマーク
+
+``import pytwitcasting`` が重いモジュールを読み込んでいないこと、時間が上限を超えていないことを確認する。
+上限を超えた場合は終了コード ``1`` で終了する
+
+Usage::
+
+  $ python benchmarks/import_time.py
+  $ python benchmarks/import_time.py --repeat 20 --limit-ms 50
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# importしただけでは読み込まれてはいけないモジュール
+HEAVY_MODULES = ('requests', 'urllib3', 'webbrowser', 'pytwitcasting.api', 'pytwitcasting.auth')
+
+# (import文, 読み込まれてはいけないモジュール)
+CASES = (
+    ('import pytwitcasting', HEAVY_MODULES),
+    ('import pytwitcasting.models', HEAVY_MODULES),
+    ('import pytwitcasting.auth', ('requests', 'urllib3', 'webbrowser')),
+)
+
+MEASURE = '''
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(','.join(m for m in {modules!r} if m in sys.modules))
+'''
+
+
+def measure(statement, modules):
+    """ 新しいプロセスでimportし、かかった秒数と読み込まれてしまったモジュールを返す """
+    code = MEASURE.format(statement=statement, modules=modules)
+    out = subprocess.check_output([sys.executable, '-c', code], cwd=ROOT, text=True)
+    elapsed, loaded = out.splitlines()
+    return float(elapsed), [m for m in loaded.split(',') if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10, help='計測回数')
+    parser.add_argument('--limit-ms', type=float, default=30.0, help='中央値の上限(ミリ秒)')
+    args = parser.parse_args()
+
+    failed = False
+    for statement, modules in CASES:
+        results = [measure(statement, modules) for _ in range(args.repeat)]
+        median_ms = statistics.median(elapsed for elapsed, _ in results) * 1000
+        loaded = results[0][1]
+        ok = median_ms <= args.limit_ms and not loaded
+        failed = failed or not ok
+
+        print(f"{'ok  ' if ok else 'FAIL'} {statement:<35} {median_ms:8.2f} ms", end='')
+        print(f'  (loaded: {", ".join(loaded)})' if loaded else '')
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+""" NGワード判定のスループットの計測
+
+ランダムに作ったNGワードとコメントの本文で、 :class:`KeywordMatcher <pytwitcasting.moderation.KeywordMatcher>` と
+NGワードごとに ``re.search`` するループの1秒あたりの判定数を比べ、両者の判定結果が一致することを確認する。
+判定結果が一致しない場合、または :class:`KeywordMatcher` のスループットが ``--min-rate`` を下回った場合は終了コード ``1`` で終了する
+
+Usage::
+
+  $ python benchmarks/moderation.py
+  $ python benchmarks/moderation.py --words 20000 --messages 100000 --naive-messages 200
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pytwitcasting.moderation import KeywordMatcher, fold  # noqa: E402
+
+
+HIRAGANA = [chr(code) for code in range(ord('ぁ'), ord('ん') + 1)]
+KATAKANA = [chr(code) for code in range(ord('ァ'), ord('ン') + 1)]
+ALPHABET = list('abcdefghijklmnopqrstuvwxyzＡＢＣＤＥＦ０１２３')
+CHARS = HIRAGANA + KATAKANA + ALPHABET + list('漢字配信雑談歌枠ゲーム！？ ')
+
+
+def make_words(count, rng):
+    words = set()
+    while len(words) < count:
+        words.add(''.join(rng.choice(HIRAGANA + ALPHABET) for _ in range(rng.randint(2, 6))))
+    return sorted(words)
+
+
+def make_messages(count, words, rng, hit_ratio):
+    messages = []
+    for _ in range(count):
+        message = ''.join(rng.choice(CHARS) for _ in range(rng.randint(5, 60)))
+        if rng.random() < hit_ratio:
+            pos = rng.randint(0, len(message))
+            message = message[:pos] + rng.choice(words) + message[pos:]
+        messages.append(message)
+    return messages
+
+
+def rate(func, messages):
+    """ (1秒あたりの判定数, 判定結果) """
+    start = time.perf_counter()
+    results = [func(message) for message in messages]
+    return len(messages) / (time.perf_counter() - start), results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', type=int, default=20000)
+    parser.add_argument('--messages', type=int, default=50000)
+    parser.add_argument('--naive-messages', type=int, default=200, help='re.searchのループで判定するコメント数')
+    parser.add_argument('--hit-ratio', type=float, default=0.05)
+    parser.add_argument('--min-rate', type=float, default=20000, help='KeywordMatcherの1秒あたりの最低判定数')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = make_words(args.words, rng)
+    messages = make_messages(args.messages, words, rng, args.hit_ratio)
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(words)
+    print(f'build      {len(matcher)} words in {time.perf_counter() - start:.2f} s')
+
+    matcher_rate, matched = rate(lambda message: matcher.first(message) is not None, messages)
+    print(f'matcher    {matcher_rate:12.0f} messages/s')
+
+    patterns = [re.compile(re.escape(fold(word))) for word in words]
+    sample = messages[:args.naive_messages]
+    naive_rate, naive_matched = rate(lambda message: any(p.search(fold(message)) for p in patterns), sample)
+    print(f're.search  {naive_rate:12.0f} messages/s')
+    print(f'speedup    {matcher_rate / naive_rate:12.1f} x')
+
+    ok = True
+    if matched[:len(sample)] != naive_matched:
+        print('FAIL: results differ from re.search')
+        ok = False
+    if matcher_rate < args.min_rate:
+        print(f'FAIL: {matcher_rate:.0f} messages/s < {args.min_rate:.0f}')
+        ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+""" スレッドセーフなAPIの負荷テスト
+
+ローカルに立てた代わりのサーバーに対して、スレッド数を変えながら :meth:`API.get_user_info` を並列に呼び出し、
+すべての結果が正しいこと、スループットがスレッド数にほぼ比例して伸びることを確認する。
+結果が正しくない場合、または最大スレッド数での効率が ``--min-efficiency`` を下回った場合は終了コード ``1`` で終了する
+
+Usage::
+
+  $ python benchmarks/thread_stress.py
+  $ python benchmarks/thread_stress.py --threads 1 2 4 8 16 32 --requests 2000 --latency-ms 20
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytwitcasting.api  # noqa: E402
+from pytwitcasting.api import API, ThreadSafeSession  # noqa: E402
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """ ``GET /users/:user_id`` だけに応答する代わりのサーバー """
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    connections = set()
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            self.connections.add(self.client_address)
+        time.sleep(self.latency)
+        user_id = self.path.rsplit('/', 1)[-1]
+        body = json.dumps({'user': {'id': user_id, 'screen_id': user_id, 'name': f'user {user_id}',
+                                    'created': 1500000000}}).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run(api, threads, requests):
+    """ ``threads`` 個のスレッドで ``requests`` 回呼び出し、(秒数, 誤った結果の数)を返す """
+    def call(i):
+        user = api.get_user_info(str(i))
+        return user.id == str(i) and user.name == f'user {i}'
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(call, range(requests)))
+    return time.perf_counter() - start, results.count(False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, 8, 16])
+    parser.add_argument('--requests', type=int, default=400, help='スレッド数ごとのリクエスト数')
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='サーバーの応答時間(ミリ秒)')
+    parser.add_argument('--min-efficiency', type=float, default=0.7,
+                        help='最大スレッド数でのスループット / (1スレッドのスループット * スレッド数) の下限')
+    args = parser.parse_args()
+
+    StandInHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    pytwitcasting.api.API_BASE_URL = f'http://127.0.0.1:{server.server_address[1]}'
+
+    max_threads = max(args.threads)
+    session = ThreadSafeSession(pool_maxsize=max_threads)
+    api = API('stand-in', requests_session=session)
+
+    failed = False
+    base = None
+    for threads in args.threads:
+        elapsed, wrong = run(api, threads, args.requests)
+        throughput = args.requests / elapsed
+        base = base or throughput / threads
+        efficiency = throughput / (base * threads)
+        failed = failed or wrong > 0
+        print(f'threads={threads:3d}  {throughput:8.1f} req/s  efficiency={efficiency:5.2f}  wrong={wrong}')
+
+    print(f'connections opened: {len(StandInHandler.connections)} (pool_maxsize={max_threads})')
+    if efficiency < args.min_efficiency or len(StandInHandler.connections) > max_threads:
+        failed = True
+
+    server.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
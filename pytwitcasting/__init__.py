@@ -0,0 +1,66 @@
+import importlib
+
+from pytwitcasting.__version__ import __version__
+
+
+# 属性名と、それを定義しているサブモジュール
+# 使われたときに初めてimportするため、 ``import pytwitcasting`` だけではrequestsなどを読み込まない
+_LAZY_ATTRIBUTES = {
+    'API': 'api',
+    'create_session': 'api',
+    'ThreadSafeSession': 'api',
+    'APIPool': 'pool',
+    'TwitcastingImplicit': 'auth',
+    'TwitcastingOauth': 'auth',
+    'TwitcastingApplicationBasis': 'auth',
+    'TwitcastingError': 'error',
+    'TwitcastingException': 'error',
+}
+
+_SUBMODULES = (
+    'api',
+    'auth',
+    'changes',
+    'cli',
+    'crawl',
+    'dedupe',
+    'dispatch',
+    'error',
+    'events',
+    'export',
+    'index',
+    'moderation',
+    'models',
+    'outbound',
+    'parsers',
+    'pool',
+    'ratelimit',
+    'resilience',
+    'sampler',
+    'snapshot',
+    'storage',
+    'streaming',
+    'sync',
+    'thumbnails',
+    'utils',
+)
+
+__all__ = list(_LAZY_ATTRIBUTES) + list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        module = importlib.import_module(f'{__name__}.{_LAZY_ATTRIBUTES[name]}')
+        value = getattr(module, name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'{__name__}.{name}')
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+    # 次からは__getattr__を通らないようにする
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
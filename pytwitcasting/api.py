@@ -1,63 +1,248 @@
+import copy
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 from requests.adapters import HTTPAdapter
 from requests.packages.urllib3.util.retry import Retry
 
-from pytwitcasting.error import TwitcastingException
+from pytwitcasting.error import TwitcastingError, TwitcastingException
 from pytwitcasting.parsers import ModelParser
-from pprint import pprint
+from pytwitcasting.ratelimit import RateLimit
+from pytwitcasting.resilience import endpoint_key
+from pytwitcasting.streaming import iter_array_items
+from pytwitcasting.utils import parse_datetime
 
 
 API_BASE_URL = 'https://apiv2.twitcasting.tv'
 
 STATUS_CODES_TO_RETRY = (500)
 
+# ストリーミングで1度に読み込むバイト数
+STREAM_CHUNK_SIZE = 8192
 
-def _requests_retry_session(retries=3,
-                            backoff_factor=0.3,
-                            status_forcelist=(500, 502, 504),
-                            session=None):
-    """ リトライ用セッションの作成 """
 
-    session = session or requests.Session()
+def _retry_adapter(retries=3,
+                   backoff_factor=0.3,
+                   status_forcelist=(500, 502, 504),
+                   pool_connections=10,
+                   pool_maxsize=10,
+                   pool_block=False):
+    """ リトライ用アダプタの作成 """
+
     # リトライオブジェクトの作成。max_retriesに渡すため
     retry = Retry(total=retries,
                   read=retries,
                   connect=retries,
                   backoff_factor=backoff_factor,
-                  status_forcelist=status_forcelist)
+                  # リトライしない場合は、5xxのレスポンスをそのまま返す
+                  status_forcelist=status_forcelist if retries else None)
 
     # urllib3の組み込みHTTPアダプタ
-    adapter = HTTPAdapter(max_retries=retry)
+    return HTTPAdapter(max_retries=retry,
+                       pool_connections=pool_connections,
+                       pool_maxsize=pool_maxsize,
+                       pool_block=pool_block)
+
+
+def _no_retry_adapter(adapter):
+    """ コネクションプールを共有し、urllib3のリトライだけを無効にしたアダプタを作る """
+    no_retry = HTTPAdapter(max_retries=Retry(total=0, read=False),
+                           pool_connections=adapter._pool_connections,
+                           pool_maxsize=adapter._pool_maxsize,
+                           pool_block=adapter._pool_block)
+    no_retry.poolmanager = adapter.poolmanager
+    no_retry.proxy_manager = adapter.proxy_manager
+    return no_retry
+
+
+def _without_retries(session):
+    """ urllib3のリトライを無効にしたセッションを返す。retry_policyと重ねてリトライしないように
+
+    渡されたセッションは他の :class:`API` と共有されていることがあるため変更せず、
+    コネクションプールだけを共有した、このAPI専用のセッションを作る
+    """
+    if isinstance(session, ThreadSafeSession):
+        own = copy.copy(session)
+        own._adapter = _no_retry_adapter(session._adapter)
+        own._local = threading.local()
+        return own
+    if isinstance(session, requests.Session):
+        own = copy.copy(session)
+        own.adapters = type(session.adapters)()
+        for prefix, adapter in session.adapters.items():
+            own.mount(prefix, _no_retry_adapter(adapter) if isinstance(adapter, HTTPAdapter) else adapter)
+        return own
+    return session
+
+
+def _requests_retry_session(retries=3,
+                            backoff_factor=0.3,
+                            status_forcelist=(500, 502, 504),
+                            session=None,
+                            pool_connections=10,
+                            pool_maxsize=10):
+    """ リトライ用セッションの作成 """
+
+    session = session or requests.Session()
+    adapter = _retry_adapter(retries=retries,
+                             backoff_factor=backoff_factor,
+                             status_forcelist=status_forcelist,
+                             pool_connections=pool_connections,
+                             pool_maxsize=pool_maxsize)
     # https:// に接続アダプタを設定する
     session.mount('https://', adapter)
+    # 設定済みの印。APIに渡されたときにアダプタを付け替えないようにする
+    session._pytwitcasting_mounted = True
+    return session
+
+
+class ThreadSafeSession(object):
+    """ 複数のスレッドから使えるセッション
+
+    :class:`requests.Session <requests.Session>` はスレッドごとに作り、コネクションプール(アダプタ)は全スレッドで共有する。
+    ``block`` が ``True`` の場合、コネクション数が ``pool_maxsize`` に達したら空くまで待つため、
+    スレッド数に関係なく接続数は ``pool_maxsize`` を超えない
+
+    Usage::
+
+      >>> from concurrent.futures import ThreadPoolExecutor
+      >>> from pytwitcasting.api import API, ThreadSafeSession
+      >>> api = API(access_token, requests_session=ThreadSafeSession(pool_maxsize=16))
+      >>> with ThreadPoolExecutor(max_workers=32) as executor:
+      ...     users = list(executor.map(api.get_user_info, user_ids))
+    """
+
+    _pytwitcasting_mounted = True
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, block=True, retries=3):
+        """
+        :param pool_connections: (optional) プールするホストの数
+        :type pool_connections: int
+        :param pool_maxsize: (optional) 1ホストあたりのコネクションの最大数
+        :type pool_maxsize: int
+        :param block: (optional) コネクションが空くまで待つかどうか
+        :type block: bool
+        :param retries: (optional) リトライ回数
+        :type retries: int
+        """
+        self._adapter = _retry_adapter(retries=retries,
+                                       pool_connections=pool_connections,
+                                       pool_maxsize=pool_maxsize,
+                                       pool_block=block)
+        self._local = threading.local()
+
+    @property
+    def session(self):
+        """ 今のスレッドの :class:`requests.Session <requests.Session>` """
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self._adapter)
+            session.mount('http://', self._adapter)
+            self._local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        return self.session.request(method, url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.session.head(url, **kwargs)
+
+    def close(self):
+        """ すべてのコネクションを閉じる """
+        self._adapter.close()
+
+
+def create_session(pool_connections=10, pool_maxsize=10, prewarm=0, retries=3):
+    """ 複数の :class:`API` で共有するためのセッションを作成する
+
+    アクセストークンごとに :class:`API` を作る場合に、このセッションを ``requests_session`` に渡すと
+    コネクションプールが共有され、TLS接続が使い回される
+
+    Usage::
+
+      >>> from pytwitcasting.api import API, create_session
+      >>> session = create_session(pool_maxsize=50, prewarm=10)
+      >>> apis = [API(access_token=token, requests_session=session) for token in tokens]
+
+    :param pool_connections: (optional) プールするホストの数
+    :type pool_connections: int
+    :param pool_maxsize: (optional) 1ホストあたりに保持するコネクションの最大数
+    :type pool_maxsize: int
+    :param prewarm: (optional) 作成時にあらかじめ接続しておくコネクションの数
+    :type prewarm: int
+    :param retries: (optional) リトライ回数
+    :type retries: int
+    :return: :class:`requests.Session <requests.Session>`
+    """
+    session = _requests_retry_session(retries=retries,
+                                      pool_connections=pool_connections,
+                                      pool_maxsize=pool_maxsize)
+
+    if prewarm:
+        # 並列に接続して、プールにコネクションを残しておく
+        def connect(_):
+            try:
+                session.head(API_BASE_URL, timeout=10).close()
+            except requests.RequestException:
+                pass
+
+        with ThreadPoolExecutor(max_workers=min(prewarm, pool_maxsize)) as executor:
+            list(executor.map(connect, range(prewarm)))
+
     return session
 
 
 class API(object):
-    """ APIにアクセスする """
+    """ APIにアクセスする
+
+    複数のスレッドから同時に使う場合は、 ``requests_session`` に :class:`ThreadSafeSession` を渡す。
+    それ以外の状態(レート制限など)はスレッドセーフ
+    """
 
     def __init__(self, access_token=None, requests_session=True, application_basis=None,
-                 accept_encoding=False, requests_timeout=None):
+                 accept_encoding=False, requests_timeout=None, retry_policy=None, circuit_breaker=None,
+                 hedge_policy=None, rate_limit=None, dispatcher=None):
         """
         :param access_token: アクセストークン
         :type  access_token: str
         :param requsts_session: セッションオブジェクト or セッションを使うかどうか
-        :type  requsts_session: :class:`requests.Session <requests.Session>` or bool
+        :type  requsts_session: :class:`requests.Session <requests.Session>` or :class:`ThreadSafeSession` or bool
         :param application_basis: (optional) TwitcastiongApplicationBasisオブジェクト
         :type  application_basis: :class:`TwitcastingApplicationBasis <pytwitcasting.auth.TwitcastingApplicationBasis>`
         :param accept_encoding: (optional) レスポンスサイズが一定以上だった場合に圧縮するか
         :type  accept_encoding: bool
         :param requests_timeout: (optional)タイムアウト時間
         :type  requests_timeout: int or float
+        :param retry_policy: (optional) リトライ方針。指定した場合、urllib3のリトライは行わない。
+                             :func:`create_session` などで作ったセッションでは、共有しているほかの :class:`API` でも無効になる
+        :type  retry_policy: :class:`RetryPolicy <pytwitcasting.resilience.RetryPolicy>`
+        :param circuit_breaker: (optional) エンドポイントごとのサーキットブレーカー
+        :type  circuit_breaker: :class:`CircuitBreaker <pytwitcasting.resilience.CircuitBreaker>`
+        :param hedge_policy: (optional) GETリクエストのヘッジ方針
+        :type  hedge_policy: :class:`HedgePolicy <pytwitcasting.resilience.HedgePolicy>`
+        :param rate_limit: (optional) レート制限の状態。複数のプロセスで共有する場合に指定する
+        :type  rate_limit: :class:`RateLimit <pytwitcasting.ratelimit.RateLimit>` or :class:`SharedRateLimit <pytwitcasting.ratelimit.SharedRateLimit>`
+        :param dispatcher: (optional) 優先度付きのディスパッチャー。優先度は :meth:`with_priority` で決める
+        :type  dispatcher: :class:`PriorityDispatcher <pytwitcasting.dispatch.PriorityDispatcher>`
         """
         self._access_token = access_token
         self.application_basis = application_basis
         self.accept_encoding = accept_encoding
         self.requests_timeout = requests_timeout
-
-        if isinstance(requests_session, requests.Session):
+        self.retry_policy = retry_policy
+        self.circuit_breaker = circuit_breaker
+        self.hedge_policy = hedge_policy
+        self.dispatcher = dispatcher
+        self.priority = 'normal'
+        self.queue_timeout = None
+        # このトークンのレート制限の状態
+        self.rate_limit = rate_limit or RateLimit()
+
+        if isinstance(requests_session, (requests.Session, ThreadSafeSession)):
             # Sessionオブジェクトが渡されていたら、それを使う
             session = requests_session
         else:
@@ -69,8 +254,62 @@ class API(object):
                 from requests import api
                 session = api
 
-        # リトライ用セッションの作成
-        self._session = _requests_retry_session(session=session)
+        if getattr(session, '_pytwitcasting_mounted', False) or not hasattr(session, 'mount'):
+            # create_session()などで設定済みのセッションや、requests.apiはそのまま使う
+            self._session = _without_retries(session) if retry_policy else session
+        else:
+            # リトライ用セッションの作成。retry_policyがあればリトライはそちらに任せる
+            retries = 0 if retry_policy else 3
+            self._session = _requests_retry_session(retries=retries, session=session)
+
+    def with_token(self, access_token=None, application_basis=None):
+        """ セッションと設定を共有した、別のトークン用の :class:`API` を返す
+
+        新しいセッションを作らないため、ユーザーごとに作っても接続は使い回される
+
+        :param access_token: (optional) アクセストークン
+        :type access_token: str
+        :param application_basis: (optional) TwitcastiongApplicationBasisオブジェクト
+        :type application_basis: :class:`TwitcastingApplicationBasis <pytwitcasting.auth.TwitcastingApplicationBasis>`
+        :return: :class:`API`
+        """
+        api = copy.copy(self)
+        api._access_token = access_token
+        api.application_basis = application_basis
+        token = access_token or (application_basis.client_id if application_basis else '')
+        api.rate_limit = self.rate_limit.for_token(token)
+        return api
+
+    def with_priority(self, priority, timeout=None):
+        """ 優先度を変えた :class:`API` を返す。セッションやトークンは共有する
+
+        ``dispatcher`` を指定していない場合は、優先度は使われない
+
+        :param priority: ``interactive`` or ``normal`` or ``bulk``
+        :type priority: str
+        :param timeout: (optional) 送信の順番を待つ秒数の上限。過ぎたら送信しない
+        :type timeout: float
+        :return: :class:`API`
+        """
+        api = copy.copy(self)
+        api.priority = priority
+        api.queue_timeout = timeout
+        return api
+
+    def snapshot_state(self):
+        """ :class:`Snapshot <pytwitcasting.snapshot.Snapshot>` で保存する状態を返す
+
+        再起動直後に残り回数を知らずに一斉にリクエストしないよう、レート制限の状態を保存する。
+        :class:`SharedRateLimit <pytwitcasting.ratelimit.SharedRateLimit>` はファイルに状態を持つため保存しない
+        """
+        if not hasattr(self.rate_limit, 'snapshot_state'):
+            return {}
+        return {'rate_limit': self.rate_limit.snapshot_state()}
+
+    def restore_state(self, state):
+        """ :meth:`snapshot_state` の状態に戻す """
+        if 'rate_limit' in state and hasattr(self.rate_limit, 'restore_state'):
+            self.rate_limit.restore_state(state['rate_limit'])
 
     def _auth_headers(self):
         """ 認可情報がついたヘッダー情報を返す
@@ -106,15 +345,37 @@ class API(object):
 
         # TODO: timeoutはどうするか
 
+        r = self._send(method, url, headers=self._request_headers(), **args)
+
+        try:
+            self._raise_for_status(r)
+        finally:
+            # 一応呼んでおく
+            r.close()
+
+        if r.text and r.text != 'null':
+            if r.headers['Content-Type'] in ['image/jpeg', 'image/png']:
+                # 拡張子の取得
+                file_ext = r.headers['Content-Type'].replace('image/', '')
+                ret = {'bytes_data': r.content,
+                       'file_ext': file_ext}
+                return ret
+            else:
+                return r.json()
+        else:
+            return None
+
+    def _request_headers(self):
+        """ リクエストに付けるヘッダー """
         headers = self._auth_headers()
         headers['X-Api-Version'] = '2.0'
         headers['Accept'] = 'application/json'
         if self.accept_encoding:
             headers['Accept-Encoding'] = 'gzip'
+        return headers
 
-        # リトライ処理を行ってくれる
-        r = self._session.request(method, url, headers=headers, **args)
-
+    def _raise_for_status(self, r):
+        """ エラーのレスポンスなら :class:`TwitcastingException <pytwitcasting.error.TwitcastingException>` を送出する """
         try:
             r.raise_for_status()
         except:
@@ -129,21 +390,100 @@ class API(object):
                 raise TwitcastingException(r.status_code, err['code'], f"{r.url}:\n {err['message']}{details}")
             else:
                 raise TwitcastingException(r.status_code, -1, f'{r.url}:\n error')
+
+    def _stream_call(self, url, params, key, meta=None):
+        """ GETリクエストを送信し、レスポンスの ``key`` の配列の要素を受信しながら1つずつ返す
+
+        :param url: 送信先
+        :param params: クエリ文字列の辞書
+        :param key: 配列のキー
+        :param meta: (optional) 配列以外のトップレベルの値を入れるdict
+        :return: 配列の要素(dict)を返すジェネレータ
+        """
+        if not url.startswith('http'):
+            url = API_BASE_URL + url
+
+        r = self._send('GET', url, headers=self._request_headers(), params=params,
+                       timeout=self.requests_timeout, stream=True)
+        try:
+            self._raise_for_status(r)
+            # gzipはiter_contentで展開される
+            yield from iter_array_items(r.iter_content(chunk_size=STREAM_CHUNK_SIZE), key, meta)
         finally:
-            # 一応呼んでおく
             r.close()
 
-        if r.text and r.text != 'null':
-            if r.headers['Content-Type'] in ['image/jpeg', 'image/png']:
-                # 拡張子の取得
-                file_ext = r.headers['Content-Type'].replace('image/', '')
-                ret = {'bytes_data': r.content,
-                       'file_ext': file_ext}
-                return ret
+    def _send(self, method, url, **kwargs):
+        """ リクエストを送信する
+
+        :param method: リクエストの種類
+        :param url: 送信先
+        :return: :class:`requests.Response <requests.Response>`
+        """
+        return self._send_with_retry(method, url, **kwargs)
+
+    def _dispatch(self, func):
+        """ ディスパッチャーがあれば、順番が来るまで待ってから ``func()`` を呼び出す """
+        if self.dispatcher:
+            return self.dispatcher.call(self.priority, func, timeout=self.queue_timeout)
+        return func()
+
+    def _send_with_retry(self, method, url, **kwargs):
+        """ リトライとサーキットブレーカーを通してリクエストを送信する
+
+        ディスパッチャーの順番は1回の送信ごとに待つ。リトライまでの待ち時間は送信枠を持たない
+
+        :param method: リクエストの種類
+        :param url: 送信先
+        :return: :class:`requests.Response <requests.Response>`
+        """
+        key = endpoint_key(method, url)
+
+        def send():
+            ticket = self.rate_limit.acquire()
+            try:
+                if self.hedge_policy and method == 'GET':
+                    r = self.hedge_policy.request(lambda: self._session.request(method, url, **kwargs),
+                                                  on_hedge=self.rate_limit.consume)
+                else:
+                    r = self._session.request(method, url, **kwargs)
+            except requests.RequestException:
+                self.rate_limit.release(ticket)
+                raise
+            self.rate_limit.release(ticket, r.headers)
+            return r
+
+        attempt = 0
+        while True:
+            if self.circuit_breaker:
+                self.circuit_breaker.before_call(key)
+
+            try:
+                r = self._dispatch(send)
+            except requests.RequestException:
+                if self.circuit_breaker:
+                    self.circuit_breaker.record_failure(key)
+                if not self.retry_policy or not self.retry_policy.should_retry(method, attempt):
+                    raise
+                delay = self.retry_policy.backoff(attempt)
             else:
-                return r.json()
-        else:
-            return None
+                throttled = r.status_code == 429
+                failed = throttled or r.status_code >= 500
+                if self.circuit_breaker:
+                    # 429はレート制限なので、エンドポイントの失敗には数えない
+                    if throttled:
+                        self.circuit_breaker.record_throttled(key)
+                    elif failed:
+                        self.circuit_breaker.record_failure(key)
+                    else:
+                        self.circuit_breaker.record_success(key)
+                if (not failed or not self.retry_policy
+                        or not self.retry_policy.should_retry(method, attempt, r.status_code)):
+                    return r
+                delay = self.retry_policy.backoff(attempt, r.headers.get('Retry-After'))
+                r.close()
+
+            attempt += 1
+            time.sleep(delay)
 
     def _get(self, url, args=None, payload=None, **kwargs):
         """ GETリクエスト送信 """
@@ -196,6 +536,74 @@ class API(object):
         res['broadcaster'] = parser.parse(self, payload=res['broadcaster'], parse_type='user', payload_list=False)
         return res
 
+    def get_movies_info(self, movie_ids, max_workers=8, users=None, refresh_live=False):
+        """ Get Movies Info
+
+        複数のライブの情報を並列で取得する
+
+        配信者の :class:`User <pytwitcasting.models.User>` はユーザのidごとに1つにまとめ、
+        同じ配信者のライブでは同じオブジェクトを返す。
+        ``users`` に前回のdictを渡すと、内容が変わっていない配信者はそのオブジェクトを使い回す
+
+        ``refresh_live`` が ``True`` の場合は、先に :meth:`snapshot_live_movies` で配信中のライブの一覧を1回だけ作り、
+        そこに含まれるライブはリクエストせずに一覧の値を使う
+
+        必須パーミッション: Read
+
+        :calls: `GET /movies/:movie_id <http://apiv2-doc.twitcasting.tv/#get-movie-info>`_
+        :param movie_ids: ライブIDの配列
+        :type movie_ids: list[str]
+        :param max_workers: (optional) 並列で送信するリクエストの数
+        :type max_workers: int
+        :param users: (optional) ユーザのidと :class:`User <pytwitcasting.models.User>` のdict。取得した配信者で更新される
+        :type users: dict
+        :param refresh_live: (optional) 配信中のライブを一覧から取得するかどうか
+        :type refresh_live: bool
+        :return: ``movie_ids`` の順に、ライブIDをキーとし、 ``movie`` , ``broadcaster`` , ``tags`` のdictか、
+                 失敗した場合は :class:`TwitcastingException <pytwitcasting.error.TwitcastingException>` などの例外を値とするdict
+        :rtype: dict
+        """
+        users = {} if users is None else users
+        lock = threading.Lock()
+        parser = ModelParser()
+
+        def intern(payload):
+            # 同じ内容の配信者はパースせずに使い回す
+            with lock:
+                user = users.get(str(payload['id']))
+                if user is not None and getattr(user, '_json', None) == payload:
+                    return user
+            user = parser.parse(self, payload=payload, parse_type='user', payload_list=False)
+            with lock:
+                users[str(user.id)] = user
+            return user
+
+        results = dict.fromkeys(str(movie_id) for movie_id in movie_ids)
+
+        if refresh_live:
+            for movie_id, live_movie in self.snapshot_live_movies(max_workers=max_workers).items():
+                if str(movie_id) in results:
+                    results[str(movie_id)] = {'movie': live_movie['movie'],
+                                              'broadcaster': intern(live_movie['broadcaster']._json),
+                                              'tags': live_movie.get('tags', [])}
+
+        def fetch(movie_id):
+            try:
+                res = self._get(f'/movies/{movie_id}')
+            except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException) as e:
+                # 1件の失敗でほかのライブの結果を失わないようにする
+                return movie_id, e
+            return movie_id, {'movie': parser.parse(self, payload=res['movie'], parse_type='movie', payload_list=False),
+                              'broadcaster': intern(res['broadcaster']),
+                              'tags': res.get('tags', [])}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = [movie_id for movie_id, res in results.items() if res is None]
+            for movie_id, res in executor.map(fetch, pending):
+                results[movie_id] = res
+
+        return results
+
     def verify_credentials(self):
         """ Verify Credentials
 
@@ -330,6 +738,54 @@ class API(object):
           # ex4) search_type='recommend'.(context none)
           >>> movies = api.search_live_movies(search_type='recommend')
         """
+        params = self._search_live_movies_params(search_type, context, limit, lang)
+
+        res = self._get('/search/lives', args=params)
+        parser = ModelParser()
+
+        for live_movie in res['movies']:
+            live_movie['movie'] = parser.parse(self, payload=live_movie['movie'],
+                                               parse_type='movie', payload_list=False)
+            live_movie['broadcaster'] = parser.parse(self, payload=live_movie['broadcaster'],
+                                                     parse_type='user', payload_list=False)
+
+        return res
+
+    def iter_live_movies(self, search_type='new', context=None, limit=100, lang='ja'):
+        """ Search Live Movies (streaming)
+
+        :meth:`search_live_movies` と同じ検索を行い、レスポンスを受信しながらライブを1件ずつ返す
+
+        必須パーミッション: Read
+
+        :calls: `GET /search/lives <http://apiv2-doc.twitcasting.tv/#search-live-movies>`_
+        :param search_type: (optional) 検索種別。 :meth:`search_live_movies` と同じ
+        :type search_type: str
+        :param context: (optional) 検索内容。 :meth:`search_live_movies` と同じ
+        :type context: list[str] or str or None
+        :param limit: (optional) 取得件数. min: ``1`` , max: ``100``
+        :type limit: int
+        :param lang: (optional) 検索対象のユーザの言語設定. 現在は ``ja`` のみ
+        :type lang: str
+        :return: - ``movie`` : :class:`Movie <pytwitcasting.models.Movie>`
+                 - ``broadcaster`` : :class:`User <pytwitcasting.models.User>`
+                 - ``tags`` : 設定されているタグの配列
+
+                 を1件ずつ返すジェネレータ
+        :rtype: generator
+        """
+        params = self._search_live_movies_params(search_type, context, limit, lang)
+        parser = ModelParser()
+
+        for live_movie in self._stream_call('/search/lives', params, 'movies'):
+            live_movie['movie'] = parser.parse(self, payload=live_movie['movie'],
+                                               parse_type='movie', payload_list=False)
+            live_movie['broadcaster'] = parser.parse(self, payload=live_movie['broadcaster'],
+                                                     parse_type='user', payload_list=False)
+            yield live_movie
+
+    def _search_live_movies_params(self, search_type, context, limit, lang):
+        """ Search Live Moviesのクエリ文字列の辞書を作る """
         params = {'type': search_type, 'limit': limit, 'lang': lang}
 
         # search_typeによってcontentを設定
@@ -350,16 +806,41 @@ class API(object):
                 # 追加しない
                 pass
 
-        res = self._get('/search/lives', args=params)
-        parser = ModelParser()
+        return params
 
-        for live_movie in res['movies']:
-            live_movie['movie'] = parser.parse(self, payload=live_movie['movie'],
-                                               parse_type='movie', payload_list=False)
-            live_movie['broadcaster'] = parser.parse(self, payload=live_movie['broadcaster'],
-                                                     parse_type='user', payload_list=False)
+    def snapshot_live_movies(self, lang='ja', max_workers=8):
+        """ Snapshot Live Movies
 
-        return res
+        配信中のライブがあるカテゴリを取得し、サブカテゴリごとのライブを並列で検索して、配信中のライブの一覧を作る
+
+        検索は1サブカテゴリあたり最大100件のため、それより多いサブカテゴリのライブはすべては含まれない
+
+        必須パーミッション: Read
+
+        :calls: `GET /categories <http://apiv2-doc.twitcasting.tv/#get-categories>`_ ,
+                `GET /search/lives <http://apiv2-doc.twitcasting.tv/#search-live-movies>`_
+        :param lang: (optional) 検索対象の言語. ``ja`` or ``en``
+        :type lang: str
+        :param max_workers: (optional) 並列で送信するリクエストの数
+        :type max_workers: int
+        :return: ライブIDをキーとし、 :meth:`iter_live_movies` が返すdictに ``sub_category`` (サブカテゴリID)を加えたものを値とするdict
+        :rtype: dict
+        """
+        sub_category_ids = [sub_category.id
+                            for category in self.get_categories(lang=lang)
+                            for sub_category in category.sub_categories]
+
+        def search(sub_category_id):
+            return sub_category_id, list(self.iter_live_movies(search_type='category', context=sub_category_id,
+                                                               limit=100, lang=lang))
+
+        snapshot = {}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for sub_category_id, live_movies in executor.map(search, sub_category_ids):
+                for live_movie in live_movies:
+                    live_movie['sub_category'] = sub_category_id
+                    snapshot.setdefault(live_movie['movie'].id, live_movie)
+        return snapshot
 
     def get_webhook_list(self, limit=50, offset=0, user_id=None):
         """ Get WebHook List
@@ -433,6 +914,74 @@ class API(object):
         params = {'user_id': user_id, 'events[]': events}
         return self._del('/webhooks', args=params)
 
+    def reconcile_webhooks(self, desired, prune=True, max_workers=8):
+        """ Reconcile WebHooks
+
+        アプリケーションに紐づくWebHookを ``desired`` の状態に揃える
+
+        現在の登録状況をoffsetごとに並列で取得して差分を計算し、必要な登録と削除だけを並列で行う。
+        毎回差分を計算するため、何度実行しても結果は同じになり、途中で失敗しても再実行すれば残りだけが反映される
+
+        *アプリケーション単位でのみ実行可能(Basic)*
+
+        :param desired: ユーザのidをキー、イベント種別の配列を値とするdict。 ``(user_id, event)`` のタプルの配列でもよい
+        :type desired: dict or list[tuple]
+        :param prune: (optional) ``desired`` に含まれないWebHookを削除するかどうか
+        :type prune: bool
+        :param max_workers: (optional) 並列で送信するリクエストの数
+        :type max_workers: int
+        :return: - ``registered`` : 登録したユーザのidとイベント種別の配列のdict
+                 - ``removed`` : 削除したユーザのidとイベント種別の配列のdict
+                 - ``failed`` : 失敗したユーザのidと、 ``action`` ( ``'registered'`` or ``'removed'`` )、
+                   ``events`` 、 ``error`` (例外)のdictの配列のdict
+                 - ``api_calls`` : 呼び出したAPIの回数
+        :rtype: dict
+        """
+        if isinstance(desired, dict):
+            desired = [(user_id, event) for user_id, events in desired.items() for event in events]
+        desired = {(str(user_id), event) for user_id, event in desired}
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # 1ページ目で総件数を取得し、残りのページは並列で取得する
+            limit = 100
+            first = self.get_webhook_list(limit=limit, offset=0)
+            api_calls = 1
+            webhooks = list(first['webhooks'])
+            offsets = range(limit, first['all_count'], limit)
+            for res in executor.map(lambda offset: self.get_webhook_list(limit=limit, offset=offset), offsets):
+                webhooks.extend(res['webhooks'])
+            api_calls += len(offsets)
+
+            current = {(str(webhook.user_id), webhook.event) for webhook in webhooks}
+
+            # ユーザごとにまとめて1回のリクエストにする
+            to_register = {}
+            for user_id, event in sorted(desired - current):
+                to_register.setdefault(user_id, []).append(event)
+            to_remove = {}
+            if prune:
+                for user_id, event in sorted(current - desired):
+                    to_remove.setdefault(user_id, []).append(event)
+
+            futures = {}
+            for user_id, events in to_register.items():
+                futures[executor.submit(self.register_webhook, user_id, events)] = ('registered', user_id, events)
+            for user_id, events in to_remove.items():
+                futures[executor.submit(self.remove_webhook, user_id, events)] = ('removed', user_id, events)
+
+            result = {'registered': {}, 'removed': {}, 'failed': {}}
+            for future, (kind, user_id, events) in futures.items():
+                try:
+                    future.result()
+                    result[kind][user_id] = events
+                except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException) as e:
+                    # 登録と削除の両方が失敗することがあるため、配列にする
+                    result['failed'].setdefault(user_id, []).append({'action': kind, 'events': events, 'error': e})
+            api_calls += len(futures)
+
+        result['api_calls'] = api_calls
+        return result
+
     def get_rtmp_url(self):
         """ Get RTMP Url
 
@@ -462,6 +1011,142 @@ class API(object):
         # (WebMってなに！？)
         return self._get('/webm_url')
 
+    def sync_movies(self, user, since_movie_id=None, since_time=None, limit=50):
+        """ Sync Movies
+
+        ユーザの過去ライブのうち、 ``since_movie_id`` より新しい(または ``since_time`` より後に作成された)ものだけを取得する
+
+        過去ライブは新しい順に返ってくるため、既知のライブに達した時点でページングをやめる。
+        差分が1ページに収まれば1回のリクエストで済む
+
+        必須パーミッション: Read
+
+        :calls: `GET /users/:user_id/movies <http://apiv2-doc.twitcasting.tv/#get-movies-by-user>`_
+        :param user: :class:`User <pytwitcasting.models.User>` かユーザのidかscreen_id
+        :type user: :class:`User <pytwitcasting.models.User>` or str
+        :param since_movie_id: (optional) 取得済みの最新のライブID
+        :type since_movie_id: str or int
+        :param since_time: (optional) 取得済みの最新のライブの作成日時
+        :type since_time: :class:`datetime.datetime` or int
+        :param limit: (optional) 1ページの件数. max: ``50``
+        :type limit: int
+        :return: :class:`Movie <pytwitcasting.models.Movie>` の配列(新しい順)
+        :rtype: list[ :class:`Movie <pytwitcasting.models.Movie>` ]
+        """
+        user_id = getattr(user, 'id', user)
+        if isinstance(since_time, (int, float)):
+            since_time = parse_datetime(since_time)
+
+        def known(movie):
+            if since_movie_id is not None and int(movie.id) <= int(since_movie_id):
+                return True
+            return since_time is not None and movie.created <= since_time
+
+        movies = []
+        offset = 0
+        while True:
+            res = self._get_movies_by_user(user_id, offset=offset, limit=limit)
+            for movie in res['movies']:
+                if known(movie):
+                    return movies
+                movies.append(movie)
+
+            offset += limit
+            if not res['movies'] or offset >= res['total_count']:
+                return movies
+
+    def backfill_comments(self, movie_id, max_workers=8, limit=50, overlap=5, progress=None):
+        """ Backfill Comments
+
+        ライブのすべてのコメントを、offsetの範囲を分割して並列に取得する
+
+        取得中に新しいコメントが投稿されると過去のコメントのoffsetがずれるため、
+        レスポンスの ``all_count`` の増減だけoffsetをずらし、ページを ``overlap`` 件ずつ重ねて取得する。
+        重複したコメントは取り除き、古い順に返す
+
+        必須パーミッション: Read
+
+        :calls: `GET /movies/:movie_id/comments <http://apiv2-doc.twitcasting.tv/#get-comments>`_
+        :param movie_id: ライブID
+        :type movie_id: str
+        :param max_workers: (optional) 並列に送信するリクエストの数
+        :type max_workers: int
+        :param limit: (optional) 1ページの件数. max: ``50``
+        :type limit: int
+        :param overlap: (optional) ページを重ねる件数
+        :type overlap: int
+        :param progress: (optional) ``progress(取得した件数, 総コメント数)`` の形で呼び出される関数
+        :return: :class:`Comment <pytwitcasting.models.Comment>` を古い順に返すジェネレータ
+        :rtype: generator
+        """
+        first = self._get_comments(movie_id, offset=0, limit=limit)
+        base_count = first['all_count']
+        state = {'count': base_count, 'fetched': len(first['comments'])}
+        lock = threading.Lock()
+        step = limit - overlap
+        if progress:
+            progress(min(state['fetched'], base_count), base_count)
+
+        def fetch_page(offset):
+            # 取得開始後に増えた(減った)コメントの分だけずらす
+            offset = max(offset + state['count'] - base_count, 0)
+            res = self._get_comments(movie_id, offset=offset, limit=limit)
+            with lock:
+                state['count'] = res['all_count']
+            return res['comments'], offset
+
+        def walk(offset, end=None, oldest_id=None, stop_id=None):
+            """ offsetから古い方へページをたどる。前のページと重ならなければ戻って取り直す """
+            comments = []
+            while end is None or offset < end:
+                page, requested = fetch_page(offset)
+                if not page:
+                    break
+                ids = [int(c.id) for c in page]
+                if oldest_id is not None and max(ids) < oldest_id and requested > 0:
+                    # 間のコメントを飛ばしている
+                    offset -= step
+                    continue
+
+                comments.extend(page)
+                oldest_id = min(ids)
+                with lock:
+                    state['fetched'] += len(page)
+                    fetched = state['fetched']
+                if progress:
+                    progress(min(fetched, base_count), base_count)
+                if stop_id is not None and oldest_id <= stop_id:
+                    break
+                offset += step
+            return comments
+
+        # 先頭(最新)のページは取得済み。残りをmax_workers個の連続した範囲に分ける
+        pages = -(-max(base_count - step, 0) // step)
+        size = -(-pages // max_workers) if pages else 1
+        ranges = [(step + i * step, step + (i + size) * step) for i in range(0, pages, size)]
+        if ranges:
+            # 最後の範囲は、ずれた分も含めて最後まで取得する
+            ranges[-1] = (ranges[-1][0], None)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            partitions = list(executor.map(lambda r: walk(*r), ranges))
+
+        # 並列に取得した範囲の境目が重なっていなければ、間を取り直す
+        results = [first['comments']]
+        for (start, _), comments in zip(ranges, partitions):
+            oldest_id = min(int(c.id) for comments in results for c in comments) if any(results) else None
+            if comments and oldest_id is not None and max(int(c.id) for c in comments) < oldest_id:
+                results.append(walk(start - step, oldest_id=oldest_id, stop_id=max(int(c.id) for c in comments)))
+            results.append(comments)
+
+        unique = {}
+        for comments in results:
+            for comment in comments:
+                unique.setdefault(comment.id, comment)
+
+        for comment in sorted(unique.values(), key=lambda c: int(c.id)):
+            yield comment
+
     def _get_live_thumbnail_image(self, user_id, size='small', position='latest'):
         return self._get(f'/users/{user_id}/live/thumbnail', size=size, position=position)
 
@@ -473,6 +1158,11 @@ class API(object):
 
         return res
 
+    def _iter_movies_by_user(self, user_id, offset=0, limit=20, meta=None):
+        parser = ModelParser()
+        for movie in self._stream_call(f'/users/{user_id}/movies', {'offset': offset, 'limit': limit}, 'movies', meta):
+            yield parser.parse(self, movie, parse_type='movie', payload_list=False)
+
     def _get_current_live(self, user_id):
         # TODO: ライブ中ではない場合、エラーを返すでよいのか
         res = self._get(f'/users/{user_id}/current_live')
@@ -493,6 +1183,16 @@ class API(object):
 
         return res
 
+    def _iter_comments(self, movie_id, offset=0, limit=10, slice_id=None, meta=None):
+        params = {'offset': offset, 'limit': limit}
+
+        if slice_id:
+            params['slice_id'] = slice_id
+
+        parser = ModelParser()
+        for comment in self._stream_call(f'/movies/{movie_id}/comments', params, 'comments', meta):
+            yield parser.parse(self, comment, parse_type='comment', payload_list=False)
+
     def _post_comment(self, movie_id, comment, sns='none'):
         data = {'comment': comment, 'sns': sns}
         res = self._post(f'/movies/{movie_id}/comments', payload=data)
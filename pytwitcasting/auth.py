@@ -2,8 +2,6 @@ import base64
 import urllib.parse
 import time
 
-import requests
-
 from pytwitcasting.error import TwitcastingError
 
 
@@ -209,6 +207,8 @@ class TwitcastingOauth(object):
 
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
 
+        # アクセストークンを取得するときだけ必要なため、ここでimportする
+        import requests
         res = requests.post(OAUTH_TOKEN_URL, data=payload, headers=headers)
 
         if res.status_code != 200:
@@ -0,0 +1,182 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+# 変化を追跡する User の属性
+TRACKED_FIELDS = ('level', 'supporter_count', 'supporting_count', 'is_live', 'last_movie_id')
+
+
+class UserDelta(object):
+    """ ユーザの属性の変化を表すオブジェクト """
+
+    def __init__(self, user_id, changes, timestamp):
+        """
+        :param user_id: ユーザのid
+        :type user_id: str
+        :param changes: 属性名をキー、 ``(変化前, 変化後)`` を値とするdict。初めて見たユーザは変化前が ``None``
+        :type changes: dict
+        :param timestamp: 検出したUNIX時間
+        :type timestamp: float
+        """
+        self.user_id = user_id
+        self.changes = changes
+        self.timestamp = timestamp
+
+    def to_dict(self):
+        """ JSONにできるdictに変換する
+
+        :rtype: dict
+        """
+        return {'user_id': self.user_id,
+                'timestamp': self.timestamp,
+                'changes': {k: list(v) for k, v in self.changes.items()}}
+
+    def __repr__(self):
+        return f'UserDelta({self.user_id!r}, {self.changes!r})'
+
+
+class UserChangeTracker(object):
+    """ ユーザの最新の状態を覚えておき、変化した属性だけを通知する
+
+    ユーザごとに追跡する属性の値のタプルだけを保持し、タプルが同じなら変化なしとしてすぐに返す
+
+    Usage::
+
+      >>> from pytwitcasting.changes import UserChangeTracker
+      >>> with open('deltas.ndjson', 'a') as f:
+      ...     tracker = UserChangeTracker(api, on_delta=lambda d: f.write(json.dumps(d.to_dict()) + '\\n'))
+      ...     tracker.load('users_state.json')
+      ...     tracker.poll(user_ids)
+      ...     tracker.save('users_state.json')
+    """
+
+    def __init__(self, api=None, fields=TRACKED_FIELDS, on_delta=None, emit_initial=True, max_workers=8):
+        """
+        :param api: (optional) :meth:`poll` で使う :class:`API <pytwitcasting.api.API>`
+        :param fields: (optional) 追跡する属性名
+        :type fields: tuple[str]
+        :param on_delta: (optional) :class:`UserDelta` を受け取る関数
+        :param emit_initial: (optional) 初めて見たユーザも通知するかどうか
+        :type emit_initial: bool
+        :param max_workers: (optional) :meth:`poll` で並列に送信するリクエスト数
+        :type max_workers: int
+        """
+        self.api = api
+        self.fields = tuple(fields)
+        self.on_delta = on_delta
+        self.emit_initial = emit_initial
+        self.max_workers = max_workers
+        # user_id -> 値のタプル
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._state)
+
+    def observe(self, user):
+        """ 取得した :class:`User <pytwitcasting.models.User>` と前回の状態を比べる
+
+        :param user: :class:`User <pytwitcasting.models.User>`
+        :return: 変化があれば :class:`UserDelta` 、なければ ``None``
+        """
+        values = tuple(getattr(user, field, None) for field in self.fields)
+        user_id = str(user.id)
+
+        with self._lock:
+            previous = self._state.get(user_id)
+            if previous == values:
+                return None
+            self._state[user_id] = values
+
+        if previous is None:
+            if not self.emit_initial:
+                return None
+            changes = {f: (None, v) for f, v in zip(self.fields, values)}
+        else:
+            changes = {f: (old, new) for f, old, new in zip(self.fields, previous, values) if old != new}
+
+        delta = UserDelta(user_id, changes, time.time())
+        if self.on_delta:
+            self.on_delta(delta)
+        return delta
+
+    def poll(self, user_ids):
+        """ ユーザ情報を並列に取得し、変化したユーザの :class:`UserDelta` を返す
+
+        :param user_ids: ユーザのidかscreen_idの配列
+        :type user_ids: list[str]
+        :return: - ``deltas`` : :class:`UserDelta` の配列
+                 - ``failed`` : 取得に失敗したユーザのidと例外のdict
+        :rtype: dict
+        """
+        def fetch(user_id):
+            try:
+                return user_id, self.api.get_user_info(user_id), None
+            except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException) as e:
+                return user_id, None, e
+
+        deltas = []
+        failed = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for user_id, user, error in executor.map(fetch, user_ids):
+                if error is not None:
+                    failed[user_id] = error
+                    continue
+                delta = self.observe(user)
+                if delta is not None:
+                    deltas.append(delta)
+
+        return {'deltas': deltas, 'failed': failed}
+
+    def forget(self, user_id):
+        """ ユーザの状態を捨てる
+
+        :param user_id: ユーザのid
+        :type user_id: str
+        """
+        with self._lock:
+            self._state.pop(str(user_id), None)
+
+    def save(self, path):
+        """ 最新の状態をJSONファイルに保存する
+
+        :param path: ファイルのパス
+        :type path: str
+        """
+        with self._lock:
+            data = {'fields': self.fields,
+                    'users': dict(self._state)}
+        # 書き込み途中で落ちても壊れないように、一時ファイルから置き換える
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, path)
+
+    def load(self, path):
+        """ :meth:`save` で保存した状態を読み込む。ファイルがなければ何もしない
+
+        :param path: ファイルのパス
+        :type path: str
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+
+        fields = tuple(data['fields'])
+        state = {}
+        for user_id, values in data['users'].items():
+            # 追跡する属性が変わっていても、共通の属性は引き継ぐ
+            saved = dict(zip(fields, values))
+            state[user_id] = tuple(saved.get(field) for field in self.fields)
+
+        with self._lock:
+            self._state.update(state)
@@ -0,0 +1,271 @@
+""" コマンドラインツール
+
+Usage::
+
+  $ export TWITCASTING_ACCESS_TOKEN=...
+  $ pytwitcasting comments 189037369 --format csv -o comments.csv
+  $ pytwitcasting lives --concurrency 16 > lives.ndjson
+  $ pytwitcasting users twitcasting_jp tamago324_pad --rate 60
+  $ pytwitcasting webhooks desired.json --client-id ... --client-secret ...
+
+データは ``--output`` (省略時は標準出力)に、進捗は標準エラー出力に書き込み、
+最後に集計結果を1行のJSONとして標準エラー出力に書き込む。
+すべて成功すれば終了コード ``0`` 、失敗したものがあれば ``1`` を返す
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.__version__ import __version__
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+class Progress(object):
+    """ 処理した件数とスループットを標準エラー出力に表示する """
+
+    def __init__(self, label, enabled=True, interval=1.0, stream=None):
+        self.label = label
+        self.enabled = enabled
+        self.interval = interval
+        self.stream = stream or sys.stderr
+        self.count = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self._shown = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def update(self, count=1, errors=0):
+        with self._lock:
+            self.count += count
+            self.errors += errors
+            now = time.monotonic()
+            if self.enabled and now - self._shown >= self.interval:
+                self._shown = now
+                self._show()
+
+    def _show(self, end=''):
+        rate = self.count / self.elapsed if self.elapsed else 0.0
+        self.stream.write(f'\r{self.label}: {self.count} ({rate:.1f}/s), errors: {self.errors}{end}')
+        self.stream.flush()
+
+    def finish(self):
+        if self.enabled:
+            with self._lock:
+                self._show(end='\n')
+
+    def summary(self):
+        elapsed = self.elapsed
+        return {'count': self.count, 'errors': self.errors, 'elapsed': round(elapsed, 3),
+                'per_second': round(self.count / elapsed, 3) if elapsed else None}
+
+
+def _writer(args, columns):
+    from pytwitcasting.export import WRITERS
+
+    if args.format == 'parquet' and args.output == '-':
+        raise TwitcastingError('--output is required for parquet')
+    return WRITERS[args.format](args.output, columns)
+
+
+def _read_ids(values):
+    """ 引数のIDの配列を返す。 ``-`` なら標準入力から1行に1つ読み込む """
+    for value in values:
+        if value == '-':
+            yield from (line.strip() for line in sys.stdin if line.strip())
+        else:
+            yield value
+
+
+def _comments(api, args, progress):
+    from pytwitcasting.export import COMMENT_COLUMNS, _row
+
+    writer = _writer(args, COMMENT_COLUMNS)
+    try:
+        rows = []
+        for comment in api.backfill_comments(args.movie_id, max_workers=args.concurrency):
+            rows.append(_row(comment._json, COMMENT_COLUMNS, {'movie_id': args.movie_id}))
+            if len(rows) >= args.batch_size:
+                writer.write_rows(rows)
+                progress.update(len(rows))
+                rows = []
+        if rows:
+            writer.write_rows(rows)
+            progress.update(len(rows))
+    finally:
+        writer.close()
+    return {'movie_id': args.movie_id}
+
+
+def _lives(api, args, progress):
+    from pytwitcasting.export import MOVIE_COLUMNS, _row
+
+    snapshot = api.snapshot_live_movies(lang=args.lang, max_workers=args.concurrency)
+    writer = _writer(args, MOVIE_COLUMNS)
+    try:
+        rows = [_row(live_movie['movie']._json, MOVIE_COLUMNS, {}) for live_movie in snapshot.values()]
+        for i in range(0, len(rows), args.batch_size):
+            writer.write_rows(rows[i:i + args.batch_size])
+        progress.update(len(rows))
+    finally:
+        writer.close()
+    return {}
+
+
+def _users(api, args, progress):
+    from pytwitcasting.export import USER_COLUMNS, _row
+
+    def resolve(user_id):
+        try:
+            return user_id, api.get_user_info(user_id), None
+        except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException) as e:
+            return user_id, None, e
+
+    failed = {}
+    writer = _writer(args, USER_COLUMNS)
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for user_id, user, error in executor.map(resolve, _read_ids(args.user_ids)):
+                if error is not None:
+                    failed[user_id] = str(error)
+                    progress.update(0, errors=1)
+                    continue
+                writer.write_rows([_row(user._json, USER_COLUMNS, {})])
+                progress.update()
+    finally:
+        writer.close()
+    return {'failed': failed}
+
+
+def _webhooks(api, args, progress):
+    if args.desired == '-':
+        desired = json.load(sys.stdin)
+    else:
+        with open(args.desired, encoding='utf-8') as f:
+            desired = json.load(f)
+
+    res = api.reconcile_webhooks(desired, prune=not args.no_prune, max_workers=args.concurrency)
+    progress.update(sum(len(events) for events in res['registered'].values()) +
+                    sum(len(events) for events in res['removed'].values()),
+                    errors=sum(len(failures) for failures in res['failed'].values()))
+    failed = {user_id: [{'action': failure['action'], 'events': failure['events'], 'error': str(failure['error'])}
+                        for failure in failures]
+              for user_id, failures in res['failed'].items()}
+    return {'registered': res['registered'], 'removed': res['removed'], 'failed': failed,
+            'api_calls': res['api_calls']}
+
+
+COMMANDS = {'comments': _comments, 'lives': _lives, 'users': _users, 'webhooks': _webhooks}
+
+
+def build_parser():
+    """ 引数のパーサーを作る
+
+    :return: :class:`argparse.ArgumentParser`
+    """
+    # 共通のオプションはサブコマンドの後に指定する
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--token', default=os.environ.get('TWITCASTING_ACCESS_TOKEN'),
+                        help='アクセストークン(環境変数 TWITCASTING_ACCESS_TOKEN)')
+    common.add_argument('--client-id', default=os.environ.get('TWITCASTING_CLIENT_ID'),
+                        help='ClientID(環境変数 TWITCASTING_CLIENT_ID)')
+    common.add_argument('--client-secret', default=os.environ.get('TWITCASTING_CLIENT_SECRET'),
+                        help='ClientSecret(環境変数 TWITCASTING_CLIENT_SECRET)')
+    common.add_argument('-c', '--concurrency', type=int, default=8, help='並列に送信するリクエスト数')
+    common.add_argument('--rate', type=float, default=None, help='1分あたりのリクエスト数の上限')
+    common.add_argument('-f', '--format', choices=('ndjson', 'csv', 'parquet'), default='ndjson', help='出力形式')
+    common.add_argument('-o', '--output', default='-', help='出力先のファイル。省略時は標準出力')
+    common.add_argument('--batch-size', type=int, default=1000, help='まとめて書き込む行数')
+    common.add_argument('-q', '--quiet', action='store_true', help='進捗を表示しない')
+
+    parser = argparse.ArgumentParser(prog='pytwitcasting', description='TwitcastingのAPIv2を使った一括処理')
+    parser.add_argument('--version', action='version', version=f'%(prog)s {__version__}')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subparsers.required = True
+
+    comments = subparsers.add_parser('comments', parents=[common], help='ライブのすべてのコメントを書き出す')
+    comments.add_argument('movie_id', help='ライブID')
+
+    lives = subparsers.add_parser('lives', parents=[common], help='配信中のライブの一覧を書き出す')
+    lives.add_argument('--lang', default='ja', help='検索対象の言語')
+
+    users = subparsers.add_parser('users', parents=[common], help='ユーザの情報を書き出す')
+    users.add_argument('user_ids', nargs='+', help='ユーザのidかscreen_id。 - なら標準入力から1行に1つ読み込む')
+
+    webhooks = subparsers.add_parser('webhooks', parents=[common], help='WebHookを指定した状態に揃える')
+    webhooks.add_argument('desired', help='ユーザのidをキー、イベント種別の配列を値とするJSONファイル。 - なら標準入力')
+    webhooks.add_argument('--no-prune', action='store_true', help='指定されていないWebHookを削除しない')
+
+    return parser
+
+
+def _create_api(args):
+    from pytwitcasting.api import API, ThreadSafeSession
+    from pytwitcasting.auth import TwitcastingApplicationBasis
+    from pytwitcasting.dispatch import PriorityDispatcher
+
+    application_basis = None
+    if args.client_id and args.client_secret:
+        application_basis = TwitcastingApplicationBasis(args.client_id, args.client_secret)
+    token = args.token
+    if args.command == 'webhooks':
+        # WebHookのAPIはアプリケーション単位の認証(Basic)でしか使えない
+        if not application_basis:
+            raise TwitcastingError('--client-id and --client-secret are required for webhooks')
+        token = None
+    elif not token and not application_basis:
+        raise TwitcastingError('--token or --client-id and --client-secret are required')
+
+    dispatcher = None
+    if args.rate:
+        dispatcher = PriorityDispatcher(rate=args.rate, per=60.0, concurrency={'bulk': args.concurrency})
+
+    api = API(token, requests_session=ThreadSafeSession(pool_maxsize=args.concurrency),
+              application_basis=application_basis, dispatcher=dispatcher)
+    return api.with_priority('bulk') if dispatcher else api
+
+
+def main(argv=None):
+    """ コマンドラインツールのエントリーポイント
+
+    :param argv: (optional) 引数の配列。省略時は ``sys.argv[1:]``
+    :type argv: list[str]
+    :return: 終了コード
+    :rtype: int
+    """
+    args = build_parser().parse_args(argv)
+    progress = Progress(args.command, enabled=not args.quiet)
+    summary = {'command': args.command}
+    try:
+        api = _create_api(args)
+        summary.update(COMMANDS[args.command](api, args, progress))
+        status = 1 if progress.errors else 0
+    except (TwitcastingError, TwitcastingException, requests.exceptions.RequestException,
+            OSError, ValueError) as e:
+        # ファイルが開けない、JSONが壊れているなども、集計結果を出力して終了する
+        summary['error'] = str(e)
+        status = 1
+    except KeyboardInterrupt:
+        summary['error'] = 'interrupted'
+        status = 130
+    except Exception as e:
+        # 想定外の例外でも集計結果は出力する
+        summary['error'] = f'{type(e).__name__}: {e}'
+        status = 1
+    progress.finish()
+
+    summary.update(progress.summary())
+    if 'error' not in summary:
+        rate_limit = api.rate_limit
+        summary['rate_limit'] = {'limit': rate_limit.limit, 'remaining': rate_limit.remaining, 'reset': rate_limit.reset}
+    sys.stderr.write(json.dumps(summary, ensure_ascii=False) + '\n')
+    return status
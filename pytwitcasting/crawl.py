@@ -0,0 +1,407 @@
+import json
+import multiprocessing
+import os
+import time
+import uuid
+
+from pytwitcasting.error import TwitcastingException
+from pytwitcasting.storage import SQLiteStore
+
+
+# ジョブの状態
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+DEAD = 'dead'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    visible_at REAL NOT NULL,
+    error TEXT,
+    lease_token TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_visible ON jobs (status, visible_at);
+CREATE TABLE IF NOT EXISTS budget (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+class Job(object):
+    """ キューから取り出したジョブ """
+
+    def __init__(self, key, kind, payload, attempts, lease_token=None):
+        self.key = key
+        self.kind = kind
+        self.payload = payload
+        self.attempts = attempts
+        # 取り出したワーカーを識別する。期限切れで別のワーカーに取り出されると一致しなくなる
+        self.lease_token = lease_token
+
+    def __repr__(self):
+        return f'Job({self.key!r}, attempts={self.attempts})'
+
+
+class CrawlQueue(SQLiteStore):
+    """ 複数のプロセスで共有できる、SQLiteを使ったジョブキュー
+
+    - 取り出したジョブは ``visibility_timeout`` 秒の間ほかのワーカーから見えなくなり、
+      その間に :meth:`complete` されなければ再び取り出せるようになる。
+      期限が切れたジョブの :meth:`complete` と :meth:`fail` は無視される
+    - 期限切れで ``max_attempts`` 回に達したジョブは再び取り出さずに ``dead`` にする
+    - 同じキーのジョブは一度しか登録されない
+    - ``rate`` を指定すると、全プロセスで ``per`` 秒あたり ``rate`` 回までに :meth:`acquire` を制限する
+
+    Usage::
+
+      >>> from pytwitcasting.crawl import CrawlQueue
+      >>> queue = CrawlQueue('crawl.db', rate=55, per=60)
+      >>> queue.enqueue('user', {'user_id': 'twitcasting_jp'}, key='user:twitcasting_jp')
+      True
+    """
+
+    def __init__(self, path, visibility_timeout=60.0, max_attempts=5, retry_delay=10.0, rate=None, per=60.0):
+        """
+        :param path: SQLiteのファイルのパス
+        :type path: str
+        :param visibility_timeout: (optional) 取り出したジョブをほかのワーカーから隠す秒数
+        :type visibility_timeout: float
+        :param max_attempts: (optional) 失敗したジョブを実行する最大回数
+        :type max_attempts: int
+        :param retry_delay: (optional) 失敗したジョブを再び取り出せるようにするまでの秒数
+        :type retry_delay: float
+        :param rate: (optional) ``per`` 秒あたりのリクエスト数の上限。 ``None`` なら制限しない
+        :type rate: int or None
+        :param per: (optional) ``rate`` の期間(秒)
+        :type per: float
+        """
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.rate = rate
+        self.per = per
+
+        conn = self._init_store(path, SCHEMA)
+        # lease_tokenがない古いファイル
+        if 'lease_token' not in [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]:
+            conn.execute('ALTER TABLE jobs ADD COLUMN lease_token TEXT')
+
+    def enqueue(self, kind, payload, key=None):
+        """ ジョブを登録する
+
+        :param kind: ジョブの種類
+        :type kind: str
+        :param payload: ジョブの引数。JSONにできるdict
+        :type payload: dict
+        :param key: (optional) 重複を判定するキー。省略時は ``kind`` と ``payload`` から作る
+        :type key: str
+        :return: 登録したかどうか。すでに同じキーがあれば ``False``
+        :rtype: bool
+        """
+        data = json.dumps(payload, sort_keys=True)
+        key = key or f'{kind}:{data}'
+        cur = self._connect().execute(
+            'INSERT OR IGNORE INTO jobs (key, kind, payload, status, visible_at) VALUES (?, ?, ?, ?, ?)',
+            (key, kind, data, PENDING, time.time()))
+        return cur.rowcount == 1
+
+    def lease(self):
+        """ 実行できるジョブを1つ取り出す
+
+        :return: :class:`Job` 。実行できるジョブがなければ ``None``
+        """
+        def lease(conn):
+            now = time.time()
+            while True:
+                row = conn.execute(
+                    'SELECT key, kind, payload, status, attempts FROM jobs WHERE status IN (?, ?) AND visible_at <= ? '
+                    'ORDER BY visible_at LIMIT 1', (PENDING, LEASED, now)).fetchone()
+                if row is None:
+                    return None
+                key, kind, payload, status, attempts = row
+                if status == LEASED and attempts >= self.max_attempts:
+                    # 実行中に期限が切れ続けるジョブは諦める
+                    conn.execute('UPDATE jobs SET status = ?, visible_at = ?, error = ?, lease_token = NULL '
+                                 'WHERE key = ?', (DEAD, now, 'lease expired', key))
+                    continue
+                token = uuid.uuid4().hex
+                conn.execute('UPDATE jobs SET status = ?, attempts = ?, visible_at = ?, lease_token = ? WHERE key = ?',
+                             (LEASED, attempts + 1, now + self.visibility_timeout, token, key))
+                return Job(key, kind, json.loads(payload), attempts + 1, token)
+
+        return self._transaction(lease)
+
+    def complete(self, job):
+        """ ジョブを完了にする
+
+        :param job: :meth:`lease` で取り出したジョブ
+        :type job: :class:`Job`
+        :return: 完了にできたかどうか。期限が切れてほかのワーカーに取り出されていれば ``False``
+        :rtype: bool
+        """
+        cur = self._connect().execute(
+            'UPDATE jobs SET status = ?, error = NULL, lease_token = NULL WHERE key = ? AND lease_token = ?',
+            (DONE, job.key, job.lease_token))
+        return cur.rowcount == 1
+
+    def fail(self, job, error, retry=True):
+        """ ジョブを失敗にする。実行回数が ``max_attempts`` に達していなければ、後で再実行する
+
+        :param job: :meth:`lease` で取り出したジョブ
+        :type job: :class:`Job`
+        :param error: 失敗の内容
+        :type error: str
+        :param retry: (optional) 再実行するかどうか
+        :type retry: bool
+        :return: 失敗にできたかどうか。期限が切れてほかのワーカーに取り出されていれば ``False``
+        :rtype: bool
+        """
+        if retry and job.attempts < self.max_attempts:
+            status, visible_at = PENDING, time.time() + self.retry_delay * job.attempts
+        else:
+            status, visible_at = DEAD, time.time()
+        cur = self._connect().execute(
+            'UPDATE jobs SET status = ?, visible_at = ?, error = ?, lease_token = NULL '
+            'WHERE key = ? AND lease_token = ?',
+            (status, visible_at, str(error), job.key, job.lease_token))
+        return cur.rowcount == 1
+
+    def acquire(self, block=True):
+        """ 全プロセスで共有するリクエスト枠を1つ取る(トークンバケット)
+
+        :param block: (optional) 枠が空くまで待つかどうか
+        :type block: bool
+        :return: 枠を取れたかどうか
+        :rtype: bool
+        """
+        if self.rate is None:
+            return True
+
+        def take(conn):
+            now = time.time()
+            row = conn.execute('SELECT tokens, updated FROM budget WHERE id = 0').fetchone()
+            tokens, updated = row if row else (float(self.rate), now)
+            tokens = min(float(self.rate), tokens + (now - updated) * self.rate / self.per)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) * self.per / self.rate
+            conn.execute('INSERT OR REPLACE INTO budget (id, tokens, updated) VALUES (0, ?, ?)', (tokens, now))
+            return wait
+
+        while True:
+            wait = self._transaction(take)
+            if not wait:
+                return True
+            if not block:
+                return False
+            time.sleep(wait)
+
+    def release(self):
+        """ :meth:`acquire` で取った枠を使わなかったときに返す """
+        if self.rate is None:
+            return
+
+        def give_back(conn):
+            conn.execute('UPDATE budget SET tokens = MIN(tokens + 1, ?) WHERE id = 0', (float(self.rate),))
+
+        self._transaction(give_back)
+
+    def stats(self):
+        """ 状態ごとのジョブ数
+
+        :return: 状態をキー、ジョブ数を値とするdict
+        :rtype: dict
+        """
+        rows = self._connect().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall()
+        return dict(rows)
+
+    def pending(self):
+        """ 未完了のジョブがあるかどうか
+
+        :rtype: bool
+        """
+        row = self._connect().execute('SELECT 1 FROM jobs WHERE status IN (?, ?) LIMIT 1',
+                                      (PENDING, LEASED)).fetchone()
+        return row is not None
+
+    def next_visible_at(self):
+        """ 未完了のジョブが次に取り出せるようになるUNIX時間。未完了のジョブがなければ ``None``
+
+        :rtype: float or None
+        """
+        row = self._connect().execute('SELECT MIN(visible_at) FROM jobs WHERE status IN (?, ?)',
+                                      (PENDING, LEASED)).fetchone()
+        return row[0]
+
+
+class Crawler(object):
+    """ :class:`CrawlQueue` からジョブを取り出して実行する
+
+    ジョブの種類
+
+    - ``user`` : ``{'user_id': ...}`` ユーザ情報を取得し、過去ライブの1ページ目を登録する
+    - ``movies`` : ``{'user_id': ..., 'offset': ...}`` 過去ライブを1ページ取得し、次のページと各ライブのコメントの1ページ目を登録する
+    - ``comments`` : ``{'movie_id': ..., 'offset': ...}`` コメントを1ページ取得し、次のページを登録する
+
+    取得した結果は ``on_result(kind, payload, result)`` に渡される
+    """
+
+    def __init__(self, api, queue, on_result=None, movies_limit=50, comments_limit=50, crawl_comments=True):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param queue: :class:`CrawlQueue`
+        :param on_result: (optional) 取得した結果を受け取る関数
+        :param movies_limit: (optional) 過去ライブの1ページの件数
+        :type movies_limit: int
+        :param comments_limit: (optional) コメントの1ページの件数
+        :type comments_limit: int
+        :param crawl_comments: (optional) コメントも取得するかどうか
+        :type crawl_comments: bool
+        """
+        self.api = api
+        self.queue = queue
+        self.on_result = on_result
+        self.movies_limit = movies_limit
+        self.comments_limit = comments_limit
+        self.crawl_comments = crawl_comments
+
+    def enqueue_user(self, user_id):
+        """ ユーザのクロールを登録する
+
+        :param user_id: ユーザのidかscreen_id
+        :type user_id: str
+        :return: 登録したかどうか
+        :rtype: bool
+        """
+        return self.queue.enqueue('user', {'user_id': user_id}, key=f'user:{user_id}')
+
+    def _enqueue_movies(self, user_id, offset):
+        self.queue.enqueue('movies', {'user_id': user_id, 'offset': offset}, key=f'movies:{user_id}:{offset}')
+
+    def _enqueue_comments(self, movie_id, offset):
+        self.queue.enqueue('comments', {'movie_id': movie_id, 'offset': offset},
+                           key=f'comments:{movie_id}:{offset}')
+
+    def handle(self, job):
+        """ ジョブを1つ実行する
+
+        :param job: :class:`Job`
+        """
+        payload = job.payload
+        if job.kind == 'user':
+            result = self.api.get_user_info(payload['user_id'])
+            self._enqueue_movies(result.id, 0)
+        elif job.kind == 'movies':
+            offset = payload['offset']
+            result = self.api._get_movies_by_user(payload['user_id'], offset=offset, limit=self.movies_limit)
+            if result['movies'] and offset + self.movies_limit < result['total_count']:
+                self._enqueue_movies(payload['user_id'], offset + self.movies_limit)
+            if self.crawl_comments:
+                for movie in result['movies']:
+                    self._enqueue_comments(movie.id, 0)
+        elif job.kind == 'comments':
+            offset = payload['offset']
+            result = self.api._get_comments(payload['movie_id'], offset=offset, limit=self.comments_limit)
+            if result['comments'] and offset + self.comments_limit < result['all_count']:
+                self._enqueue_comments(payload['movie_id'], offset + self.comments_limit)
+        else:
+            raise ValueError(f'Unknown job kind: {job.kind}')
+
+        if self.on_result:
+            self.on_result(job.kind, payload, result)
+
+    def run(self, max_jobs=None, idle_timeout=5.0, max_sleep=5.0):
+        """ ジョブがなくなるまで実行する
+
+        再実行を待っているジョブや、ほかのワーカーが実行中のジョブがある間は、
+        次に取り出せるようになるまで(最大 ``max_sleep`` 秒ずつ)待って続ける
+
+        :param max_jobs: (optional) 実行するジョブの最大数
+        :type max_jobs: int
+        :param idle_timeout: (optional) 未完了のジョブがない状態がこの秒数続いたら終了する
+        :type idle_timeout: float
+        :param max_sleep: (optional) ジョブが取り出せるようになるのを1回に待つ最大の秒数
+        :type max_sleep: float
+        :return: 実行したジョブの数
+        :rtype: int
+        """
+        done = 0
+        idle_since = None
+        while max_jobs is None or done < max_jobs:
+            # 枠を取ってから取り出す。逆だと枠を待つ間にジョブの期限が切れる
+            self.queue.acquire()
+            job = self.queue.lease()
+            if job is None:
+                self.queue.release()
+                now = time.time()
+                visible_at = self.queue.next_visible_at()
+                if visible_at is not None:
+                    # 再実行待ちか、ほかのワーカーが実行中
+                    idle_since = None
+                    time.sleep(min(max(visible_at - now, 0.01), max_sleep))
+                    continue
+                # ほかのワーカーやプロセスがジョブを登録するのを待つ
+                idle_since = idle_since or now
+                if now - idle_since >= idle_timeout:
+                    break
+                time.sleep(min(0.5, idle_timeout))
+                continue
+            idle_since = None
+
+            try:
+                self.handle(job)
+            except TwitcastingException as e:
+                # 429と5xx以外は再実行しても結果が変わらない
+                self.queue.fail(job, e, retry=e.http_status == 429 or e.http_status >= 500)
+            except Exception as e:
+                self.queue.fail(job, e)
+            else:
+                self.queue.complete(job)
+            done += 1
+
+        return done
+
+
+def _run_worker(api_factory, queue, on_result, kwargs):
+    """ ワーカープロセスで実行する """
+    crawler = Crawler(api_factory(), queue, on_result=on_result, **kwargs)
+    return crawler.run()
+
+
+def run_workers(queue, api_factory, processes=None, on_result=None, **kwargs):
+    """ 複数のプロセスで :class:`Crawler` を実行する
+
+    ``api_factory`` と ``on_result`` はほかのプロセスに渡すため、モジュールのトップレベルの関数にする
+
+    Usage::
+
+      >>> from pytwitcasting.api import API
+      >>> from pytwitcasting.crawl import CrawlQueue, Crawler, run_workers
+      >>> def make_api():
+      ...     return API(access_token=os.environ['ACCESS_TOKEN'])
+      >>> queue = CrawlQueue('crawl.db', rate=55, per=60)
+      >>> Crawler(None, queue).enqueue_user('twitcasting_jp')
+      >>> run_workers(queue, make_api, processes=4)
+
+    :param queue: :class:`CrawlQueue`
+    :param api_factory: :class:`API <pytwitcasting.api.API>` を返す関数
+    :param processes: (optional) プロセス数。省略時はCPU数
+    :type processes: int
+    :param on_result: (optional) 取得した結果を受け取る関数
+    :param kwargs: (optional) :class:`Crawler` に渡す引数
+    :return: 実行したジョブの数
+    :rtype: int
+    """
+    processes = processes or os.cpu_count() or 1
+    with multiprocessing.Pool(processes) as pool:
+        counts = pool.starmap(_run_worker, [(api_factory, queue, on_result, kwargs)] * processes)
+    return sum(counts)
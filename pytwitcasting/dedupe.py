@@ -0,0 +1,242 @@
+import collections
+import hashlib
+import math
+import os
+import pickle
+import threading
+
+
+def _hashes(key, k, size):
+    """ ダブルハッシュでk個のビット位置を返す """
+    digest = hashlib.blake2b(str(key).encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little') | 1
+    return [(h1 + i * h2) % size for i in range(k)]
+
+
+def _nbytes(capacity, error_rate):
+    """ 容量と偽陽性率からビット配列のバイト数を求める """
+    return (max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8) + 7) // 8
+
+
+class BloomFilter(object):
+    """ 固定容量のブルームフィルタ
+
+    ``capacity`` 件まで追加したときの偽陽性率が ``error_rate`` になるようにビット数とハッシュ数を決める
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        """
+        :param capacity: 追加する件数
+        :type capacity: int
+        :param error_rate: (optional) 偽陽性率
+        :type error_rate: float
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = _nbytes(capacity, error_rate) * 8
+        self.k = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, key):
+        bits = self._bits
+        return all(bits[i >> 3] & (1 << (i & 7)) for i in _hashes(key, self.k, self.size))
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        """ ビット配列のバイト数 """
+        return len(self._bits)
+
+    def add(self, key):
+        """ キーを追加する
+
+        :param key: キー
+        :return: 新しいキーだったかどうか(偽陽性の場合は ``False`` )
+        :rtype: bool
+        """
+        added = False
+        for i in _hashes(key, self.k, self.size):
+            mask = 1 << (i & 7)
+            if not self._bits[i >> 3] & mask:
+                self._bits[i >> 3] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+
+class ScalableBloomFilter(object):
+    """ 件数に応じて大きくなるブルームフィルタ
+
+    いっぱいになると、容量を ``growth`` 倍、偽陽性率を ``tightening`` 倍にしたフィルタを追加するため、
+    全体の偽陽性率は ``error_rate`` 程度に保たれる。
+    ``max_bytes`` を超える場合は古いフィルタから捨てる(古いキーを忘れる)
+    """
+
+    def __init__(self, initial_capacity=100000, error_rate=0.001, growth=2, tightening=0.5, max_bytes=None):
+        """
+        :param initial_capacity: (optional) 最初のフィルタの容量
+        :type initial_capacity: int
+        :param error_rate: (optional) 全体の偽陽性率
+        :type error_rate: float
+        :param growth: (optional) 次のフィルタの容量の倍率
+        :type growth: int
+        :param tightening: (optional) 次のフィルタの偽陽性率の倍率
+        :type tightening: float
+        :param max_bytes: (optional) 全フィルタのバイト数の上限
+        :type max_bytes: int
+        """
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.max_bytes = max_bytes
+        # 最初のフィルタの偽陽性率。等比級数の和がerror_rateになるようにする
+        self._first_error_rate = error_rate * (1 - tightening)
+        self.filters = [BloomFilter(initial_capacity, self._first_error_rate)]
+
+    def __contains__(self, key):
+        return any(key in f for f in reversed(self.filters))
+
+    def __len__(self):
+        return sum(len(f) for f in self.filters)
+
+    @property
+    def nbytes(self):
+        """ 全フィルタのバイト数 """
+        return sum(f.nbytes for f in self.filters)
+
+    def add(self, key):
+        """ キーを追加する
+
+        :param key: キー
+        :return: 新しいキーだったかどうか
+        :rtype: bool
+        """
+        if key in self:
+            return False
+
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            capacity = current.capacity * self.growth
+            error_rate = current.error_rate * self.tightening
+            if self.max_bytes and self.nbytes + _nbytes(capacity, error_rate) > self.max_bytes:
+                # 上限に達したら大きくせず、古いフィルタを捨てて同じ大きさのフィルタを追加する
+                capacity, error_rate = current.capacity, current.error_rate
+            current = BloomFilter(capacity, error_rate)
+            self.filters.append(current)
+            while self.max_bytes and self.nbytes > self.max_bytes and len(self.filters) > 1:
+                del self.filters[0]
+        return current.add(key)
+
+
+class SeenSet(object):
+    """ 処理済みのIDを覚えておき、重複を取り除く
+
+    直近の ``window`` 件は正確な集合で、それより古いものは :class:`ScalableBloomFilter` で判定する。
+    古いIDは偽陽性率 ``error_rate`` で「処理済み」と誤判定されることがある
+
+    Usage::
+
+      >>> from pytwitcasting.dedupe import SeenSet
+      >>> seen = SeenSet.load('seen.bin')
+      >>> new_comments = [c for c in res['comments'] if seen.add(c.id)]
+      >>> seen.save('seen.bin')
+    """
+
+    def __init__(self, window=100000, error_rate=0.001, initial_capacity=100000, max_bytes=None):
+        """
+        :param window: (optional) 正確に判定する直近の件数
+        :type window: int
+        :param error_rate: (optional) 古いIDの偽陽性率
+        :type error_rate: float
+        :param initial_capacity: (optional) ブルームフィルタの最初の容量
+        :type initial_capacity: int
+        :param max_bytes: (optional) ブルームフィルタのバイト数の上限
+        :type max_bytes: int
+        """
+        self.window = window
+        self._recent = collections.OrderedDict()
+        self._filter = ScalableBloomFilter(initial_capacity=initial_capacity, error_rate=error_rate,
+                                           max_bytes=max_bytes)
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        key = str(key)
+        with self._lock:
+            return key in self._recent or key in self._filter
+
+    def __len__(self):
+        with self._lock:
+            return len(self._recent) + len(self._filter)
+
+    def add(self, key):
+        """ IDを追加する
+
+        :param key: コメントIDやライブIDなど
+        :return: まだ見ていないIDだったかどうか
+        :rtype: bool
+        """
+        key = str(key)
+        with self._lock:
+            if key in self._recent or key in self._filter:
+                return False
+            self._recent[key] = None
+            if len(self._recent) > self.window:
+                old, _ = self._recent.popitem(last=False)
+                self._filter.add(old)
+            return True
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def snapshot_state(self):
+        """ :class:`Snapshot <pytwitcasting.snapshot.Snapshot>` で保存する状態を返す """
+        with self._lock:
+            return self.__getstate__()
+
+    def restore_state(self, state):
+        """ :meth:`snapshot_state` の状態に戻す """
+        with self._lock:
+            self.__dict__.update(state)
+
+    def save(self, path):
+        """ ファイルに保存する。一時ファイルから置き換えるため、途中で落ちても前回のファイルは壊れない
+
+        :param path: ファイルのパス
+        :type path: str
+        """
+        with self._lock:
+            data = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """ :meth:`save` で保存したファイルから読み込む。ファイルがなければ新しく作る
+
+        :param path: ファイルのパス
+        :type path: str
+        :param kwargs: (optional) 新しく作る場合に渡す引数
+        :return: :class:`SeenSet`
+        """
+        try:
+            with open(path, 'rb') as f:
+                seen = pickle.load(f)
+        except FileNotFoundError:
+            return cls(**kwargs)
+        if not isinstance(seen, cls):
+            raise TypeError(f'{path} is not a {cls.__name__}')
+        return seen
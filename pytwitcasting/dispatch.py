@@ -0,0 +1,168 @@
+import collections
+import threading
+import time
+
+from pytwitcasting.error import TwitcastingDeadlineError
+
+
+# 優先度
+INTERACTIVE = 'interactive'
+NORMAL = 'normal'
+BULK = 'bulk'
+
+DEFAULT_WEIGHTS = {INTERACTIVE: 8, NORMAL: 3, BULK: 1}
+DEFAULT_CONCURRENCY = {INTERACTIVE: 8, NORMAL: 4, BULK: 2}
+
+
+class _Ticket(object):
+    """ 送信待ちのリクエスト """
+
+    __slots__ = ('priority', 'deadline', 'granted', 'dropped')
+
+    def __init__(self, priority, deadline):
+        self.priority = priority
+        self.deadline = deadline
+        self.granted = False
+        self.dropped = False
+
+
+class PriorityDispatcher(object):
+    """ 優先度ごとにリクエストの送信順を決める
+
+    ``interactive`` , ``normal`` , ``bulk`` の3つの優先度があり、送信枠は ``weights`` の比率で重み付けして公平に配分する。
+    優先度ごとに同時に送信できる数は ``concurrency`` まで。
+    ``rate`` を指定すると、全体で ``per`` 秒あたり ``rate`` 回までに制限する。
+    期限までに順番が来なかったリクエストは送信せずに
+    :class:`TwitcastingDeadlineError <pytwitcasting.error.TwitcastingDeadlineError>` を送出する
+
+    Usage::
+
+      >>> from pytwitcasting.api import API
+      >>> from pytwitcasting.dispatch import PriorityDispatcher
+      >>> api = API(access_token, dispatcher=PriorityDispatcher(rate=60, per=60))
+      >>> dashboard = api.with_priority('interactive', timeout=2)
+      >>> crawler = api.with_priority('bulk')
+    """
+
+    def __init__(self, rate=None, per=60.0, weights=None, concurrency=None):
+        """
+        :param rate: (optional) ``per`` 秒あたりの送信数の上限。 ``None`` なら制限しない
+        :type rate: int or None
+        :param per: (optional) ``rate`` の期間(秒)
+        :type per: float
+        :param weights: (optional) 優先度ごとの送信枠の重み
+        :type weights: dict
+        :param concurrency: (optional) 優先度ごとの同時送信数の上限
+        :type concurrency: dict
+        """
+        self.rate = rate
+        self.per = per
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.concurrency = dict(DEFAULT_CONCURRENCY, **(concurrency or {}))
+        self._queues = {priority: collections.deque() for priority in self.weights}
+        self._running = dict.fromkeys(self.weights, 0)
+        # 重み付き公平キューの仮想時間。小さいものから送信する
+        self._pass = dict.fromkeys(self.weights, 0.0)
+        # 最後に送信枠を与えたときの仮想時間
+        self._virtual_time = 0.0
+        self._sent = dict.fromkeys(self.weights, 0)
+        self._dropped = dict.fromkeys(self.weights, 0)
+        self._tokens = float(rate) if rate else 0.0
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(float(self.rate), self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    def _schedule(self):
+        """ 送信できるリクエストに順番を与える。ロックを取った状態で呼び出す """
+        now = time.monotonic()
+        self._refill(now)
+
+        # 期限切れを取り除く
+        for priority, queue in self._queues.items():
+            for ticket in [t for t in queue if t.deadline is not None and t.deadline <= now]:
+                queue.remove(ticket)
+                ticket.dropped = True
+                self._dropped[priority] += 1
+
+        while True:
+            if self.rate and self._tokens < 1:
+                break
+            candidates = [p for p, q in self._queues.items() if q and self._running[p] < self.concurrency[p]]
+            if not candidates:
+                break
+            priority = min(candidates, key=lambda p: self._pass[p])
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1.0 / self.weights[priority]
+
+            ticket = self._queues[priority].popleft()
+            ticket.granted = True
+            self._running[priority] += 1
+            self._sent[priority] += 1
+            if self.rate:
+                self._tokens -= 1
+
+        self._cond.notify_all()
+
+    def _enqueue(self, ticket):
+        """ 送信待ちに加える。ロックを取った状態で呼び出す """
+        if not self._queues[ticket.priority]:
+            # 待っていなかった優先度が、たまっていた分をまとめて使わないように仮想時間まで進める
+            self._pass[ticket.priority] = max(self._pass[ticket.priority], self._virtual_time)
+        self._queues[ticket.priority].append(ticket)
+
+    def _wait_time(self):
+        """ 次に送信枠が増えるまでの秒数 """
+        if self.rate and self._tokens < 1:
+            return (1 - self._tokens) * self.per / self.rate
+        return None
+
+    def call(self, priority, func, timeout=None):
+        """ 順番が来るまで待ってから ``func()`` を呼び出す
+
+        :param priority: 優先度。 ``interactive`` or ``normal`` or ``bulk``
+        :type priority: str
+        :param func: リクエストを送信する関数
+        :param timeout: (optional) 順番を待つ秒数の上限
+        :type timeout: float
+        :return: ``func()`` の戻り値
+        :raises: :class:`TwitcastingDeadlineError <pytwitcasting.error.TwitcastingDeadlineError>`
+        """
+        if priority not in self._queues:
+            raise ValueError(f'Unknown priority: {priority}')
+
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        ticket = _Ticket(priority, deadline)
+        with self._cond:
+            self._enqueue(ticket)
+            self._schedule()
+            while not ticket.granted:
+                if ticket.dropped:
+                    raise TwitcastingDeadlineError(priority)
+                wait = self._wait_time()
+                if deadline is not None:
+                    remaining = max(deadline - time.monotonic(), 0)
+                    wait = remaining if wait is None else min(wait, remaining)
+                self._cond.wait(wait)
+                self._schedule()
+
+        try:
+            return func()
+        finally:
+            with self._cond:
+                self._running[priority] -= 1
+                self._schedule()
+
+    def metrics(self):
+        """ 優先度ごとの統計
+
+        :return: 優先度をキーとし、 ``queued`` , ``running`` , ``sent`` , ``dropped`` を値とするdict
+        :rtype: dict
+        """
+        with self._cond:
+            return {p: {'queued': len(self._queues[p]), 'running': self._running[p],
+                        'sent': self._sent[p], 'dropped': self._dropped[p]}
+                    for p in self._queues}
@@ -12,3 +12,25 @@ class TwitcastingException(Exception):
     def __str__(self):
         return f'http status: {self.http_status}, code: {self.code} {self.msg}'
 
+
+class TwitcastingCircuitOpenError(TwitcastingError):
+    """ サーキットブレーカーが開いているため、リクエストを送信しなかった """
+
+    def __init__(self, endpoint, retry_at):
+        super().__init__(endpoint, retry_at)
+        self.endpoint = endpoint
+        self.retry_at = retry_at
+
+    def __str__(self):
+        return f'circuit open: {self.endpoint}'
+
+
+class TwitcastingDeadlineError(TwitcastingError):
+    """ 期限までに送信の順番が来なかったため、リクエストを送信しなかった """
+
+    def __init__(self, priority):
+        super().__init__(priority)
+        self.priority = priority
+
+    def __str__(self):
+        return f'deadline exceeded before dispatch: {self.priority}'
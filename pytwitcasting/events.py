@@ -0,0 +1,540 @@
+import collections
+import hmac
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+from pytwitcasting.parsers import ModelParser
+from pytwitcasting.resilience import RetryPolicy
+
+
+# トピック
+COMMENT = 'comment'
+LIVE_START = 'live_start'
+LIVE_END = 'live_end'
+
+# 溢れたときの方針
+BLOCK = 'block'
+DROP_OLDEST = 'drop_oldest'
+SAMPLE = 'sample'
+
+
+class Event(object):
+    """ バスに流れるイベント """
+
+    __slots__ = ('topic', 'data', 'timestamp')
+
+    def __init__(self, topic, data, timestamp=None):
+        """
+        :param topic: トピック
+        :type topic: str
+        :param data: :class:`Comment <pytwitcasting.models.Comment>` などのデータ
+        :param timestamp: (optional) 発行したUNIX時間
+        :type timestamp: float
+        """
+        self.topic = topic
+        self.data = data
+        self.timestamp = time.time() if timestamp is None else timestamp
+
+    def __repr__(self):
+        return f'Event({self.topic!r}, {self.data!r})'
+
+
+class Subscription(object):
+    """ 購読者ごとのキュー
+
+    キューがいっぱいのときの方針
+
+    - ``block`` : 空くまで発行側を待たせる( ``block_timeout`` 秒を過ぎたら捨てる)
+    - ``drop_oldest`` : 最も古いイベントを捨てる
+    - ``sample`` : ``sample_every`` 件に1件だけ、最も古いイベントと入れ替える
+    """
+
+    def __init__(self, bus, topics, maxsize, policy, block_timeout=None, sample_every=10):
+        self._bus = bus
+        self.topics = set(topics) if topics else None
+        self.maxsize = maxsize
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.sample_every = sample_every
+        self._queue = collections.deque()
+        self._cond = threading.Condition()
+        self._overflowed = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.closed = False
+
+    def __iter__(self):
+        while True:
+            event = self.get()
+            if event is None:
+                return
+            yield event
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _put(self, event):
+        """ イベントを入れる。バスから呼び出される """
+        with self._cond:
+            if self.closed:
+                return
+            if len(self._queue) >= self.maxsize:
+                if self.policy == BLOCK:
+                    deadline = None if self.block_timeout is None else time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.maxsize and not self.closed:
+                        remaining = None if deadline is None else deadline - time.monotonic()
+                        if remaining is not None and remaining <= 0:
+                            self.dropped += 1
+                            return
+                        self._cond.wait(remaining)
+                    if self.closed:
+                        return
+                elif self.policy == DROP_OLDEST:
+                    self._queue.popleft()
+                    self.dropped += 1
+                elif self.policy == SAMPLE:
+                    self._overflowed += 1
+                    self.dropped += 1
+                    if self._overflowed % self.sample_every:
+                        return
+                    self._queue.popleft()
+                else:
+                    raise ValueError(f'Unknown policy: {self.policy}')
+            self._queue.append(event)
+            self._cond.notify_all()
+
+    def get(self, timeout=None):
+        """ 次のイベントを取り出す
+
+        :param timeout: (optional) 待つ秒数
+        :type timeout: float
+        :return: :class:`Event` 。タイムアウトしたか、購読をやめた場合は ``None``
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._queue or self.closed, timeout):
+                return None
+            if not self._queue:
+                return None
+            event = self._queue.popleft()
+            self.delivered += 1
+            self._cond.notify_all()
+            return event
+
+    def close(self):
+        """ 購読をやめる """
+        self._bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def metrics(self):
+        """ 購読者の遅れの統計
+
+        :return: - ``queued`` : 未処理のイベント数
+                 - ``lag`` : 最も古い未処理のイベントの経過秒数
+                 - ``delivered`` : 取り出したイベント数
+                 - ``dropped`` : 捨てたイベント数
+        :rtype: dict
+        """
+        with self._cond:
+            lag = time.time() - self._queue[0].timestamp if self._queue else 0.0
+            return {'queued': len(self._queue), 'lag': lag, 'delivered': self.delivered, 'dropped': self.dropped}
+
+
+class EventBus(object):
+    """ プロセス内のイベントの発行・購読
+
+    コメントの取得やライブの監視、WebHookの受信で得たモデルを1度だけ発行し、
+    複数の購読者(保存、モデレーション、メトリクスなど)がそれぞれのキューで受け取る
+
+    Usage::
+
+      >>> from pytwitcasting.events import EventBus, CommentTailer
+      >>> bus = EventBus()
+      >>> moderation = bus.subscribe(['comment'], maxsize=10000, policy='drop_oldest')
+      >>> tailer = CommentTailer(api, bus)
+      >>> tailer.add('189037369')
+      >>> threading.Thread(target=tailer.run, daemon=True).start()
+      >>> for event in moderation:
+      ...     print(event.data.message)
+    """
+
+    def __init__(self):
+        self._subscriptions = []
+        self._lock = threading.Lock()
+        self.published = collections.Counter()
+
+    def subscribe(self, topics=None, maxsize=1000, policy=BLOCK, block_timeout=None, sample_every=10):
+        """ 購読する
+
+        :param topics: (optional) 購読するトピックの配列。省略時はすべて
+        :type topics: list[str]
+        :param maxsize: (optional) キューの最大長
+        :type maxsize: int
+        :param policy: (optional) キューがいっぱいのときの方針。 ``block`` or ``drop_oldest`` or ``sample``
+        :type policy: str
+        :param block_timeout: (optional) ``block`` のときに待つ秒数の上限
+        :type block_timeout: float
+        :param sample_every: (optional) ``sample`` のときに何件に1件残すか
+        :type sample_every: int
+        :return: :class:`Subscription`
+        """
+        if policy not in (BLOCK, DROP_OLDEST, SAMPLE):
+            raise ValueError(f'Unknown policy: {policy}')
+        subscription = Subscription(self, topics, maxsize, policy, block_timeout, sample_every)
+        with self._lock:
+            self._subscriptions.append(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """ 購読をやめる
+
+        :param subscription: :class:`Subscription`
+        """
+        with self._lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+
+    def publish(self, topic, data):
+        """ イベントを発行する
+
+        :param topic: トピック
+        :type topic: str
+        :param data: モデルなどのデータ
+        :return: 配送した購読者の数
+        :rtype: int
+        """
+        event = Event(topic, data)
+        with self._lock:
+            subscriptions = [s for s in self._subscriptions if s.topics is None or topic in s.topics]
+            self.published[topic] += 1
+        for subscription in subscriptions:
+            subscription._put(event)
+        return len(subscriptions)
+
+    def publish_webhook(self, body, api=None, signature=None):
+        """ 受信したWebHookのリクエストボディを解析して発行する
+
+        ``movie.is_live`` が ``True`` なら ``live_start`` 、そうでなければ ``live_end`` として発行する
+
+        :param body: WebHookのリクエストボディ
+        :type body: bytes or str or dict
+        :param api: (optional) モデルに渡す :class:`API <pytwitcasting.api.API>`
+        :param signature: (optional) アプリケーションのSignature。指定した場合は一致しなければ例外を送出する
+        :type signature: str
+        :return: - ``movie`` : :class:`Movie <pytwitcasting.models.Movie>`
+                 - ``broadcaster`` : :class:`User <pytwitcasting.models.User>`
+        :rtype: dict
+        """
+        if isinstance(body, (bytes, str)):
+            body = json.loads(body)
+        if signature is not None and not hmac.compare_digest(str(body.get('signature', '')), signature):
+            raise TwitcastingError('Invalid WebHook signature')
+
+        parser = ModelParser()
+        res = {'movie': parser.parse(api, body['movie'], parse_type='movie', payload_list=False),
+               'broadcaster': parser.parse(api, body['broadcaster'], parse_type='user', payload_list=False)}
+        self.publish(LIVE_START if res['movie'].is_live else LIVE_END, res)
+        return res
+
+    def metrics(self):
+        """ 購読者ごとの統計
+
+        :return: :meth:`Subscription.metrics` の配列
+        :rtype: list[dict]
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        return [s.metrics() for s in subscriptions]
+
+
+# 取得に失敗しても監視を続ける例外
+_POLL_ERRORS = (TwitcastingException, TwitcastingError, requests.exceptions.RequestException)
+
+
+class _Backoff(object):
+    """ 取得に失敗し続けている対象を、失敗した回数に応じて間隔をあけてから取得する """
+
+    def __init__(self, base, cap):
+        self.policy = RetryPolicy(base=base, cap=cap)
+        # key -> (連続して失敗した回数, 次に取得できるmonotonic時間)
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def ready(self, key, now):
+        with self._lock:
+            return self._failures.get(key, (0, 0.0))[1] <= now
+
+    def failed(self, key, now):
+        with self._lock:
+            count = self._failures.get(key, (0, 0.0))[0]
+            self._failures[key] = (count + 1, now + self.policy.base + self.policy.backoff(count))
+
+    def succeeded(self, key):
+        with self._lock:
+            self._failures.pop(key, None)
+
+
+class CommentTailer(object):
+    """ ライブの新しいコメントを取得し、 ``comment`` トピックに古い順に発行する
+
+    発行する :class:`Comment <pytwitcasting.models.Comment>` には ``movie_id`` 属性を加える
+
+    ライブごとに最後に取得したコメントID( ``positions`` )を覚えておき、 ``slice_id`` で差分だけを取得する。
+    取得に失敗したライブは、失敗が続くほど間隔をあけて( ``max_backoff`` 秒まで)取得し直す
+    """
+
+    def __init__(self, api, bus, interval=5.0, max_workers=8, max_backoff=300.0):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param bus: :class:`EventBus`
+        :param interval: (optional) 取得する間隔(秒)
+        :type interval: float
+        :param max_workers: (optional) 並列に送信するリクエスト数
+        :type max_workers: int
+        :param max_backoff: (optional) 失敗したライブを取得し直すまでの最大の秒数
+        :type max_backoff: float
+        """
+        self.api = api
+        self.bus = bus
+        self.interval = interval
+        self.max_workers = max_workers
+        # movie_id -> 最後に取得したコメントID(まだなければNone)
+        self.positions = {}
+        self._lock = threading.Lock()
+        self._backoff = _Backoff(interval, max_backoff)
+
+    def add(self, movie_id, slice_id=None):
+        """ ライブを対象に追加する
+
+        :param movie_id: ライブID
+        :type movie_id: str
+        :param slice_id: (optional) このコメントIDより後から取得する
+        :type slice_id: int
+        """
+        with self._lock:
+            self.positions.setdefault(str(movie_id), slice_id)
+
+    def remove(self, movie_id):
+        """ ライブを対象から外す
+
+        :param movie_id: ライブID
+        :type movie_id: str
+        """
+        with self._lock:
+            self.positions.pop(str(movie_id), None)
+
+    def snapshot_state(self):
+        """ :class:`Snapshot <pytwitcasting.snapshot.Snapshot>` で保存する状態を返す """
+        with self._lock:
+            return dict(self.positions)
+
+    def restore_state(self, state):
+        """ :meth:`snapshot_state` の状態に戻す。取得済みの位置は、より新しい方を使う """
+        with self._lock:
+            for movie_id, slice_id in state.items():
+                current = self.positions.get(movie_id)
+                if current is None or (slice_id is not None and slice_id > current):
+                    self.positions[movie_id] = slice_id
+
+    def _poll_movie(self, movie_id, slice_id):
+        comments = []
+        offset = 0
+        while True:
+            res = self.api._get_comments(movie_id, offset=offset, limit=50, slice_id=slice_id)
+            comments.extend(res['comments'])
+            # 初回は最新の1ページだけ。以降はslice_idより新しいものをすべて
+            if slice_id is None or len(res['comments']) < 50:
+                return comments
+            offset += 50
+
+    def poll(self):
+        """ すべての対象のライブを1回ずつ取得して発行する
+
+        :return: 発行したコメント数
+        :rtype: int
+        """
+        now = time.monotonic()
+        with self._lock:
+            targets = [(movie_id, slice_id) for movie_id, slice_id in self.positions.items()
+                       if self._backoff.ready(movie_id, now)]
+
+        def poll(target):
+            movie_id, slice_id = target
+            try:
+                comments = self._poll_movie(movie_id, slice_id)
+            except _POLL_ERRORS:
+                self._backoff.failed(movie_id, time.monotonic())
+                return movie_id, []
+            self._backoff.succeeded(movie_id)
+            return movie_id, comments
+
+        count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for movie_id, comments in executor.map(poll, targets):
+                if not comments:
+                    continue
+                comments.sort(key=lambda c: int(c.id))
+                with self._lock:
+                    if movie_id in self.positions:
+                        self.positions[movie_id] = int(comments[-1].id)
+                for comment in comments:
+                    # 購読者がどのライブのコメントか分かるように
+                    comment.movie_id = movie_id
+                    self.bus.publish(COMMENT, comment)
+                count += len(comments)
+        return count
+
+    def run(self, stop_event=None):
+        """ ``interval`` 秒ごとに :meth:`poll` を呼び出す
+
+        :param stop_event: (optional) 止めるための :class:`threading.Event`
+        :type stop_event: :class:`threading.Event`
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            started = time.monotonic()
+            self.poll()
+            stop_event.wait(max(self.interval - (time.monotonic() - started), 0))
+
+
+class LiveMonitor(object):
+    """ ユーザの配信状態を監視し、配信の開始と終了を発行する
+
+    ``live_start`` , ``live_end`` トピックに ``{'movie': ..., 'broadcaster': ...}`` を発行する。
+    ``live_end`` の ``movie`` は終了したライブを取得し直したもので、取得できなければ最後に見た :class:`Movie <pytwitcasting.models.Movie>`
+    (どちらもなければ ``None`` )。
+    ユーザごとに最後に見た状態( ``states`` )を覚えておき、取得に失敗したユーザは失敗が続くほど間隔をあけて取得し直す
+    """
+
+    def __init__(self, api, bus, interval=30.0, max_workers=8, max_backoff=300.0):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param bus: :class:`EventBus`
+        :param interval: (optional) 取得する間隔(秒)
+        :type interval: float
+        :param max_workers: (optional) 並列に送信するリクエスト数
+        :type max_workers: int
+        :param max_backoff: (optional) 失敗したユーザを取得し直すまでの最大の秒数
+        :type max_backoff: float
+        """
+        self.api = api
+        self.bus = bus
+        self.interval = interval
+        self.max_workers = max_workers
+        # user_id -> {'is_live': bool, 'last_movie_id': str}
+        self.states = {}
+        # user_id -> 配信中に最後に見た Movie
+        self._movies = {}
+        self._lock = threading.Lock()
+        self._backoff = _Backoff(interval, max_backoff)
+
+    def add(self, user_id):
+        """ ユーザを監視対象に追加する
+
+        :param user_id: ユーザのidかscreen_id
+        :type user_id: str
+        """
+        with self._lock:
+            self.states.setdefault(user_id, None)
+
+    def remove(self, user_id):
+        """ ユーザを監視対象から外す
+
+        :param user_id: ユーザのidかscreen_id
+        :type user_id: str
+        """
+        with self._lock:
+            self.states.pop(user_id, None)
+            self._movies.pop(user_id, None)
+
+    def snapshot_state(self):
+        """ :class:`Snapshot <pytwitcasting.snapshot.Snapshot>` で保存する状態を返す """
+        with self._lock:
+            return dict(self.states)
+
+    def restore_state(self, state):
+        """ :meth:`snapshot_state` の状態に戻す。まだ状態を見ていないユーザだけ反映する """
+        with self._lock:
+            for user_id, user_state in state.items():
+                if self.states.get(user_id) is None:
+                    self.states[user_id] = user_state
+
+    def _ended_movie(self, user_id, previous):
+        """ 終了したライブの :class:`Movie <pytwitcasting.models.Movie>` を返す """
+        with self._lock:
+            movie = self._movies.pop(user_id, None)
+        movie_id = getattr(movie, 'id', None) or previous.get('last_movie_id')
+        if movie_id:
+            try:
+                return self.api.get_movie_info(movie_id)['movie']
+            except _POLL_ERRORS:
+                pass
+        return movie
+
+    def poll(self):
+        """ すべての監視対象を1回ずつ取得し、状態が変わったユーザを発行する
+
+        :return: 発行したイベント数
+        :rtype: int
+        """
+        now = time.monotonic()
+        with self._lock:
+            user_ids = [user_id for user_id in self.states if self._backoff.ready(user_id, now)]
+
+        def fetch(user_id):
+            try:
+                user = self.api.get_user_info(user_id)
+            except _POLL_ERRORS:
+                self._backoff.failed(user_id, time.monotonic())
+                return user_id, None
+            self._backoff.succeeded(user_id)
+            return user_id, user
+
+        count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for user_id, user in executor.map(fetch, user_ids):
+                if user is None:
+                    continue
+                state = {'is_live': bool(user.is_live), 'last_movie_id': user.last_movie_id}
+                with self._lock:
+                    if user_id not in self.states:
+                        continue
+                    previous, self.states[user_id] = self.states[user_id], state
+                if previous is None or previous['is_live'] == state['is_live']:
+                    # 初回は状態を覚えるだけ
+                    continue
+
+                if state['is_live']:
+                    try:
+                        res = self.api._get_current_live(user_id)
+                    except _POLL_ERRORS:
+                        # 次回また開始として検出できるように戻す
+                        with self._lock:
+                            if user_id in self.states:
+                                self.states[user_id] = previous
+                        continue
+                    with self._lock:
+                        self._movies[user_id] = res['movie']
+                    self.bus.publish(LIVE_START, {'movie': res['movie'], 'broadcaster': res['broadcaster']})
+                else:
+                    self.bus.publish(LIVE_END, {'movie': self._ended_movie(user_id, previous), 'broadcaster': user})
+                count += 1
+        return count
+
+    def run(self, stop_event=None):
+        """ ``interval`` 秒ごとに :meth:`poll` を呼び出す
+
+        :param stop_event: (optional) 止めるための :class:`threading.Event`
+        :type stop_event: :class:`threading.Event`
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            started = time.monotonic()
+            self.poll()
+            stop_event.wait(max(self.interval - (time.monotonic() - started), 0))
@@ -0,0 +1,306 @@
+import csv
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+# 出力する列と型。日時はUNIX時間(int)のまま出力する
+MOVIE_COLUMNS = [
+    ('id', 'str'), ('user_id', 'str'), ('title', 'str'), ('subtitle', 'str'),
+    ('last_owner_comment', 'str'), ('category', 'str'), ('link', 'str'),
+    ('is_live', 'bool'), ('is_recorded', 'bool'), ('comment_count', 'int'),
+    ('large_thumbnail', 'str'), ('small_thumbnail', 'str'), ('country', 'str'),
+    ('duration', 'int'), ('created', 'int'), ('is_collabo', 'bool'), ('is_protected', 'bool'),
+    ('max_view_count', 'int'), ('current_view_count', 'int'), ('total_view_count', 'int'),
+    ('hls_url', 'str'),
+]
+
+COMMENT_COLUMNS = [
+    ('id', 'str'), ('movie_id', 'str'), ('message', 'str'), ('created', 'int'),
+    ('from_user.id', 'str'), ('from_user.screen_id', 'str'), ('from_user.name', 'str'),
+]
+
+SUPPORTER_COLUMNS = [
+    ('id', 'str'), ('supported_user_id', 'str'), ('screen_id', 'str'), ('name', 'str'),
+    ('level', 'int'), ('supported', 'int'), ('point', 'int'), ('total_point', 'int'),
+]
+
+USER_COLUMNS = [
+    ('id', 'str'), ('screen_id', 'str'), ('name', 'str'), ('image', 'str'), ('profile', 'str'),
+    ('level', 'int'), ('last_movie_id', 'str'), ('is_live', 'bool'),
+    ('supporter_count', 'int'), ('supporting_count', 'int'), ('created', 'int'),
+]
+
+COLUMNS = {'movies': MOVIE_COLUMNS, 'comments': COMMENT_COLUMNS, 'supporters': SUPPORTER_COLUMNS}
+
+# エンドポイントごとの1回に取得できる件数の上限
+PAGE_LIMITS = {'movies': 50, 'comments': 50, 'supporters': 20}
+
+# レスポンスの総数のキー
+TOTAL_KEYS = {'movies': 'total_count', 'comments': 'all_count', 'supporters': 'total'}
+
+FORMATS = ('ndjson', 'csv', 'parquet')
+
+
+def _row(item, columns, extra):
+    """ APIレスポンスの要素を列の順のtupleにする。 ``from_user.id`` のようなネストした列も取り出す """
+    row = []
+    for name, _ in columns:
+        if name in extra:
+            row.append(extra[name])
+            continue
+        value = item
+        for key in name.split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        row.append(value)
+    return tuple(row)
+
+
+def _open(path):
+    """ 書き込み用に開く。 ``'-'`` なら標準出力(閉じない) """
+    if path == '-':
+        return sys.stdout, False
+    return open(path, 'w', encoding='utf-8', newline=''), True
+
+
+class NDJSONWriter(object):
+    """ 1行に1つのJSONオブジェクトを書き込む。 ``path`` が ``'-'`` なら標準出力に書き込む """
+
+    def __init__(self, path, columns):
+        self.names = [name for name, _ in columns]
+        self._file, self._close = _open(path)
+
+    def write_rows(self, rows):
+        self._file.writelines(json.dumps(dict(zip(self.names, row)), ensure_ascii=False) + '\n' for row in rows)
+
+    def close(self):
+        if self._close:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class CSVWriter(object):
+    """ ヘッダ付きのCSVを書き込む。 ``path`` が ``'-'`` なら標準出力に書き込む """
+
+    def __init__(self, path, columns):
+        self._file, self._close = _open(path)
+        self._writer = csv.writer(self._file)
+        self._writer.writerow([name for name, _ in columns])
+
+    def write_rows(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        if self._close:
+            self._file.close()
+        else:
+            self._file.flush()
+
+
+class ParquetWriter(object):
+    """ 1回の書き込みを1つのRow Groupとして、Parquetを書き込む。 `pyarrow` が必要 """
+
+    def __init__(self, path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise TwitcastingError('pyarrow is required to export Parquet files')
+
+        types = {'str': pyarrow.string(), 'int': pyarrow.int64(), 'bool': pyarrow.bool_()}
+        self._pyarrow = pyarrow
+        self.schema = pyarrow.schema([(name, types[type_]) for name, type_ in columns])
+        self._writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write_rows(self, rows):
+        arrays = [list(column) for column in zip(*rows)]
+        self._writer.write_table(self._pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {'ndjson': NDJSONWriter, 'csv': CSVWriter, 'parquet': ParquetWriter}
+
+EXTENSIONS = {'ndjson': 'ndjson', 'csv': 'csv', 'parquet': 'parquet'}
+
+
+class _Sink(object):
+    """ 複数のスレッドから行をためて、 ``batch_size`` ごとにまとめて書き込む """
+
+    def __init__(self, writer, columns, batch_size):
+        self.writer = writer
+        self.columns = columns
+        self.batch_size = batch_size
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def batch(self):
+        return _Batch(self)
+
+    def flush(self, rows):
+        if not rows:
+            return
+        with self._lock:
+            self.writer.write_rows(rows)
+            self.count += len(rows)
+
+
+class _Batch(object):
+    """ スレッドごとの書き込み待ちの行 """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.rows = []
+
+    def add(self, item, **extra):
+        self.rows.append(_row(item, self.sink.columns, extra))
+        if len(self.rows) >= self.sink.batch_size:
+            self.flush()
+
+    def flush(self):
+        rows, self.rows = self.rows, []
+        self.sink.flush(rows)
+
+
+class Exporter(object):
+    """ ユーザの過去ライブ、サポーター、コメントをファイルに書き出す
+
+    ページングされたエンドポイントをストリーミングで読み込み、モデルを作らずに
+    レスポンスの値をそのまま行にして ``batch_size`` 件ごとに書き込むため、
+    件数に関係なくメモリの使用量は一定になる。
+    ユーザは ``max_workers`` 並列に取得し、種類ごとに1つのファイル( ``movies`` , ``supporters`` , ``comments`` )に書き込む
+
+    Usage::
+
+      >>> from pytwitcasting.export import Exporter
+      >>> exporter = Exporter(api, 'out', format='parquet')
+      >>> exporter.export(['twitcasting_jp', 'tamago324_pad'])
+      {'movies': 1234, 'supporters': 56, 'comments': 78901, 'errors': {}}
+    """
+
+    def __init__(self, api, directory, format='ndjson', batch_size=1000, max_workers=8, page_size=50):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param directory: 出力するディレクトリ
+        :type directory: str
+        :param format: (optional) ``'ndjson'`` or ``'csv'`` or ``'parquet'``
+        :type format: str
+        :param batch_size: (optional) まとめて書き込む行数
+        :type batch_size: int
+        :param max_workers: (optional) 並列に取得するユーザ数
+        :type max_workers: int
+        :param page_size: (optional) 1回のリクエストで取得する件数. max:50(サポーターは20)
+        :type page_size: int
+        """
+        if format not in FORMATS:
+            raise ValueError(f'Unknown format: {format}')
+        self.api = api
+        self.directory = directory
+        self.format = format
+        self.batch_size = batch_size
+        self.max_workers = max_workers
+        self.page_size = page_size
+
+    def _pages(self, url, key, params=None, drain=False):
+        """ ``offset`` を進めながら、すべてのページの要素を1つずつ返す
+
+        1回に取得する件数はエンドポイントごとの上限( :data:`PAGE_LIMITS` )までにする。
+        空のページが返るか、レスポンスの総数( :data:`TOTAL_KEYS` )に達したら終わる
+
+        ``drain`` が ``True`` なら、ページを最後まで受信してコネクションを返してから要素を返す。
+        要素ごとに別のリクエストを送る場合に、1つのユーザでコネクションを2つ使わないようにするため
+        """
+        limit = min(self.page_size, PAGE_LIMITS[key])
+        total_key = TOTAL_KEYS[key]
+        offset = 0
+        while True:
+            count = 0
+            meta = {}
+            items = self.api._stream_call(url, dict(params or {}, offset=offset, limit=limit), key, meta)
+            if drain:
+                items = list(items)
+            for item in items:
+                count += 1
+                yield item
+            offset += count
+            total = meta.get(total_key)
+            if count == 0 or (isinstance(total, int) and offset >= total):
+                return
+
+    def _export_user(self, user_id, sinks):
+        movies = sinks.get('movies')
+        supporters = sinks.get('supporters')
+        comments = sinks.get('comments')
+
+        if supporters:
+            batch = supporters.batch()
+            for supporter in self._pages(f'/users/{user_id}/supporters', 'supporters', {'sort': 'new'}):
+                batch.add(supporter, supported_user_id=user_id)
+            batch.flush()
+
+        if movies or comments:
+            movie_batch = movies.batch() if movies else None
+            comment_batch = comments.batch() if comments else None
+            # コメントを取得する前に過去ライブのページを読み切る。ThreadSafeSession(block=True)で
+            # 全ユーザがコネクションを持ったままコメントの分を待ち、詰まらないように
+            for movie in self._pages(f'/users/{user_id}/movies', 'movies', drain=bool(comment_batch)):
+                if movie_batch:
+                    movie_batch.add(movie)
+                if comment_batch and movie.get('comment_count', 1):
+                    for comment in self._pages(f'/movies/{movie["id"]}/comments', 'comments'):
+                        comment_batch.add(comment, movie_id=movie['id'])
+            if movie_batch:
+                movie_batch.flush()
+            if comment_batch:
+                comment_batch.flush()
+
+    def export(self, user_ids, include=('movies', 'supporters', 'comments'), progress=None):
+        """ ユーザを並列に書き出す
+
+        :param user_ids: ユーザのidかscreen_idの配列
+        :type user_ids: list[str]
+        :param include: (optional) 書き出す種類。 ``'movies'`` , ``'supporters'`` , ``'comments'``
+        :type include: tuple[str]
+        :param progress: (optional) ユーザを1人書き出すごとに ``progress(user_id, error)`` で呼び出す
+        :return: - 種類ごとの書き出した行数
+                 - ``errors`` : 失敗したユーザのidと例外のdict
+        :rtype: dict
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        sinks = {}
+        try:
+            for kind in include:
+                path = os.path.join(self.directory, f'{kind}.{EXTENSIONS[self.format]}')
+                sinks[kind] = _Sink(WRITERS[self.format](path, COLUMNS[kind]), COLUMNS[kind], self.batch_size)
+
+            def export_user(user_id):
+                try:
+                    self._export_user(user_id, sinks)
+                except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException,
+                        ValueError) as e:
+                    # 通信エラーやレスポンスの解析の失敗でも、ほかのユーザは書き出す
+                    return user_id, e
+                return user_id, None
+
+            errors = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for user_id, error in executor.map(export_user, user_ids):
+                    if error is not None:
+                        errors[user_id] = error
+                    if progress:
+                        progress(user_id, error)
+        finally:
+            for sink in sinks.values():
+                sink.writer.close()
+
+        res = {kind: sink.count for kind, sink in sinks.items()}
+        res['errors'] = errors
+        return res
@@ -0,0 +1,304 @@
+import sqlite3
+import threading
+import unicodedata
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    movie_id TEXT NOT NULL,
+    comment_id TEXT NOT NULL UNIQUE,
+    message TEXT
+);
+CREATE TABLE IF NOT EXISTS postings (
+    gram TEXT NOT NULL,
+    block INTEGER NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (gram, block)
+) WITHOUT ROWID;
+"""
+
+
+# 検索で1回に読み込むコメント数
+SEARCH_BATCH_SIZE = 500
+
+
+def normalize(text):
+    """ 全角・半角と大文字・小文字の違いをなくす
+
+    :param text: 文字列。 ``None`` なら空文字列
+    :type text: str
+    :rtype: str
+    """
+    if not text:
+        return ''
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def ngrams(text, n=2):
+    """ 文字単位のn-gramに分割する。 ``n`` 文字未満の場合はそのまま返す
+
+    :param text: 正規化済みの文字列
+    :type text: str
+    :param n: (optional) 1つのgramの文字数
+    :type n: int
+    :rtype: set[str]
+    """
+    text = ''.join(text.split())
+    if len(text) < n:
+        return {text} if text else set()
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def encode_postings(doc_ids):
+    """ 昇順のdoc_idの配列を、差分をvarintで並べたbytesにする
+
+    :param doc_ids: 昇順のdoc_idの配列
+    :type doc_ids: list[int]
+    :rtype: bytes
+    """
+    out = bytearray()
+    previous = 0
+    for doc_id in doc_ids:
+        delta = doc_id - previous
+        previous = doc_id
+        while delta >= 0x80:
+            out.append((delta & 0x7f) | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+
+def decode_postings(data):
+    """ :func:`encode_postings` の逆変換
+
+    :param data: :func:`encode_postings` で作ったbytes
+    :type data: bytes
+    :rtype: list[int]
+    """
+    doc_ids = []
+    previous = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        previous += value
+        doc_ids.append(previous)
+        value = 0
+        shift = 0
+    return doc_ids
+
+
+class CommentIndex(object):
+    """ コメントの全文検索用の転置インデックス
+
+    正規化したコメントを文字n-gramに分割し、gramごとのdoc_idの配列(差分とvarintで圧縮)をSQLiteのファイルに保存する。
+    追加したコメントはメモリにためておき、 ``flush_size`` 件ごとに新しいブロックとして書き込む。
+    書き込み前のコメントも検索できる
+
+    ``store_messages`` が ``False`` の場合、n-gramがすべて含まれていれば一致とみなすため、
+    ``n`` 文字より長い検索語では、語が連続していないコメントも含まれることがある
+
+    Usage::
+
+      >>> from pytwitcasting.index import CommentIndex
+      >>> index = CommentIndex('comments.idx')
+      >>> res = movie.get_comments(limit=50)
+      >>> index.add_comments(movie.id, res['comments'])
+      >>> index.search('こんにちは')
+      [('189037369', '7134775954'), ...]
+    """
+
+    def __init__(self, path, n=2, flush_size=10000, store_messages=True):
+        """
+        :param path: インデックスのファイルのパス
+        :type path: str
+        :param n: (optional) n-gramの文字数
+        :type n: int
+        :param flush_size: (optional) メモリにためておくコメント数
+        :type flush_size: int
+        :param store_messages: (optional) コメント本文も保存し、検索結果を本文で確認するかどうか
+        :type store_messages: bool
+        """
+        self.path = path
+        self.n = n
+        self.flush_size = flush_size
+        self.store_messages = store_messages
+        self._buffer = []
+        # 書き込み前のコメントID
+        self._buffered_ids = set()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+        row = self._conn.execute('SELECT MAX(block) FROM postings').fetchone()
+        self._next_block = (row[0] or 0) + 1
+
+    def add(self, movie_id, comment_id, message):
+        """ コメントを追加する。すでに追加したコメントIDは無視する
+
+        :param movie_id: ライブID
+        :type movie_id: str
+        :param comment_id: コメントID
+        :type comment_id: str
+        :param message: コメント本文
+        :type message: str
+        """
+        comment_id = str(comment_id)
+        with self._lock:
+            if comment_id in self._buffered_ids:
+                return
+            self._buffered_ids.add(comment_id)
+            self._buffer.append((str(movie_id), comment_id, message))
+            if len(self._buffer) >= self.flush_size:
+                self.flush()
+
+    def add_comments(self, movie_id, comments):
+        """ :class:`Comment <pytwitcasting.models.Comment>` の配列を追加する
+
+        :param movie_id: ライブID
+        :type movie_id: str
+        :param comments: :class:`Comment <pytwitcasting.models.Comment>` の配列
+        :type comments: list[ :class:`Comment <pytwitcasting.models.Comment>` ]
+        """
+        for comment in comments:
+            self.add(movie_id, comment.id, comment.message)
+
+    def flush(self):
+        """ メモリにためているコメントをファイルに書き込む """
+        with self._lock:
+            if not self._buffer:
+                return
+            buffer, self._buffer = self._buffer, []
+            self._buffered_ids = set()
+
+            postings = {}
+            with self._conn:
+                for movie_id, comment_id, message in buffer:
+                    cur = self._conn.execute(
+                        'INSERT OR IGNORE INTO docs (movie_id, comment_id, message) VALUES (?, ?, ?)',
+                        (movie_id, comment_id, message if self.store_messages else None))
+                    if cur.rowcount != 1:
+                        continue
+                    for gram in ngrams(normalize(message), self.n):
+                        postings.setdefault(gram, []).append(cur.lastrowid)
+
+                block = self._next_block
+                self._conn.executemany('INSERT INTO postings (gram, block, data) VALUES (?, ?, ?)',
+                                       ((gram, block, encode_postings(doc_ids))
+                                        for gram, doc_ids in postings.items()))
+            self._next_block += 1
+
+    def compact(self):
+        """ gramごとのブロックを1つにまとめる。検索が速くなる """
+        with self._lock:
+            self.flush()
+            with self._conn:
+                grams = [row[0] for row in self._conn.execute(
+                    'SELECT gram FROM postings GROUP BY gram HAVING COUNT(*) > 1')]
+                for gram in grams:
+                    doc_ids = self._doc_ids(gram)
+                    self._conn.execute('DELETE FROM postings WHERE gram = ?', (gram,))
+                    self._conn.execute('INSERT INTO postings (gram, block, data) VALUES (?, 0, ?)',
+                                       (gram, encode_postings(doc_ids)))
+
+    def _doc_ids(self, gram):
+        """ gramを含むdoc_idの昇順の配列 """
+        doc_ids = []
+        for (data,) in self._conn.execute('SELECT data FROM postings WHERE gram = ? ORDER BY block', (gram,)):
+            doc_ids.extend(decode_postings(data))
+        return doc_ids
+
+    def _prefix_doc_ids(self, prefix):
+        """ ``prefix`` で始まるgramを含むdoc_idの集合。 ``n`` 文字未満の検索語に使う """
+        doc_ids = set()
+        rows = self._conn.execute('SELECT data FROM postings WHERE gram >= ? AND gram < ?',
+                                  (prefix, prefix + '\U0010ffff'))
+        for (data,) in rows:
+            doc_ids.update(decode_postings(data))
+        return doc_ids
+
+    def _gram_doc_ids(self, grams):
+        """ すべてのgramを含むdoc_idの集合
+
+        gramごとの転置リストの大きさをSQLで比べ、小さいものから展開して絞り込む。
+        本文を保存している場合は、一番小さいものだけを展開し、残りは本文で確認する
+        """
+        grams = list(grams)
+        sizes = dict(self._conn.execute(
+            f'SELECT gram, SUM(LENGTH(data)) FROM postings WHERE gram IN ({",".join("?" * len(grams))}) '
+            f'GROUP BY gram', grams))
+        if len(sizes) < len(grams):
+            # 一度も出てこないgramがある
+            return set()
+
+        ordered = sorted(grams, key=sizes.get)
+        candidates = set(self._doc_ids(ordered[0]))
+        if self.store_messages:
+            return candidates
+        for gram in ordered[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(self._doc_ids(gram))
+        return candidates
+
+    def search(self, query, movie_id=None, limit=100):
+        """ 検索語を含むコメントを探す
+
+        :param query: 検索語
+        :type query: str
+        :param movie_id: (optional) 対象のライブID
+        :type movie_id: str
+        :param limit: (optional) 最大件数
+        :type limit: int
+        :return: ``(ライブID, コメントID)`` の配列。新しく追加した順
+        :rtype: list[tuple]
+        """
+        needle = ''.join(normalize(query).split())
+        if not needle:
+            return []
+
+        with self._lock:
+            results = []
+            # 書き込み済みのコメントをもう一度追加した場合に、同じコメントを2回返さないように
+            seen = set()
+            # 書き込み前のコメント
+            for m_id, comment_id, message in reversed(self._buffer):
+                if (movie_id is None or m_id == str(movie_id)) and needle in ''.join(normalize(message).split()):
+                    seen.add(comment_id)
+                    results.append((m_id, comment_id))
+
+            if len(needle) < self.n:
+                candidates = self._prefix_doc_ids(needle)
+            else:
+                candidates = self._gram_doc_ids(ngrams(needle, self.n))
+
+            candidates = sorted(candidates, reverse=True)
+            for i in range(0, len(candidates), SEARCH_BATCH_SIZE):
+                if len(results) >= limit:
+                    break
+                batch = candidates[i:i + SEARCH_BATCH_SIZE]
+                sql = (f'SELECT doc_id, movie_id, comment_id, message FROM docs '
+                       f'WHERE doc_id IN ({",".join("?" * len(batch))})')
+                params = list(batch)
+                if movie_id is not None:
+                    sql += ' AND movie_id = ?'
+                    params.append(str(movie_id))
+                for _, m_id, comment_id, message in sorted(self._conn.execute(sql, params), reverse=True):
+                    if message is not None and needle not in ''.join(normalize(message).split()):
+                        continue
+                    if comment_id in seen:
+                        continue
+                    seen.add(comment_id)
+                    results.append((m_id, comment_id))
+
+            return results[:limit]
+
+    def close(self):
+        """ 書き込んでからファイルを閉じる """
+        with self._lock:
+            self.flush()
+            self._conn.close()
@@ -1,5 +1,4 @@
 from pytwitcasting.utils import parse_datetime
-from pprint import pprint
 
 
 class Model(object):
@@ -91,6 +90,23 @@ class User(Model):
         """
         return self._api._get_movies_by_user(user_id=self.id, **kwargs)
 
+    def iter_movies(self, **kwargs):
+        """ Get Movies by User (streaming)
+
+        :meth:`get_movies` と同じく過去ライブを取得し、レスポンスを受信しながら1件ずつ返す
+
+        :calls: `GET /users/:user_id/movies <http://apiv2-doc.twitcasting.tv/#get-movies-by-user>`_
+        :param offset: (optional) 先頭からの位置. default: ``0``, min: ``0``
+        :type offset: int
+        :param limit: (optional) 最大取得件数. default: ``20`` , min: ``1`` , max: ``50``
+        :type limit: int
+        :param meta: (optional) ``total_count`` などを入れるdict
+        :type meta: dict
+        :return: :class:`Movie <pytwitcasting.models.Movie>` を返すジェネレータ
+        :rtype: generator
+        """
+        return self._api._iter_movies_by_user(user_id=self.id, **kwargs)
+
     def get_current_live(self):
         """ Get Current Live
 
@@ -200,6 +216,25 @@ class Movie(Model):
         """
         return self._api._get_comments(movie_id=self.id, **kwargs)
 
+    def iter_comments(self, **kwargs):
+        """ Get Comments (streaming)
+
+        :meth:`get_comments` と同じくコメントを取得し、レスポンスを受信しながら1件ずつ返す
+
+        :calls: `GET /movies/:movie_id/comments <http://apiv2-doc.twitcasting.tv/#get-comments>`_
+        :param offset: (optional) 先頭からの位置. min:0
+        :type offset: int
+        :param limit: (optional) 取得件数. min:1, max:50
+        :type limit: int
+        :param slice_id: (optional) このコメントID以降のコメントを取得する
+        :type slice_id: int
+        :param meta: (optional) ``all_count`` などを入れるdict
+        :type meta: dict
+        :return: :class:`Comment <pytwitcasting.models.Comment>` を返すジェネレータ
+        :rtype: generator
+        """
+        return self._api._iter_comments(movie_id=self.id, **kwargs)
+
     def post_comment(self, comment, **kwargs):
         """ Post Comment
 
@@ -0,0 +1,310 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+from pytwitcasting.index import normalize
+
+
+# カタカナをひらがなにする変換表
+_KANA = {code: code - 0x60 for code in range(ord('ァ'), ord('ヶ') + 1)}
+
+
+def fold(text, fold_kana=True):
+    """ 全角・半角、大文字・小文字(と、カタカナ・ひらがな)の違いをなくす
+
+    :param text: 文字列
+    :type text: str
+    :param fold_kana: (optional) カタカナをひらがなにするかどうか
+    :type fold_kana: bool
+    :rtype: str
+    """
+    text = normalize(text)
+    return text.translate(_KANA) if fold_kana else text
+
+
+class KeywordMatcher(object):
+    """ Aho-Corasick法で、複数のキーワードを1回の走査で探す
+
+    キーワードの数に関係なく、文字列の長さに比例する時間で探せる。
+    キーワードも文字列も :func:`fold` で正規化してから比較する
+
+    Usage::
+
+      >>> from pytwitcasting.moderation import KeywordMatcher
+      >>> matcher = KeywordMatcher(['ばか', 'NG'])
+      >>> matcher.search('ﾊﾞｶじゃないの？ ｎｇ')
+      ['ばか', 'NG']
+    """
+
+    def __init__(self, words, fold_kana=True):
+        """
+        :param words: キーワードの配列
+        :type words: list[str]
+        :param fold_kana: (optional) カタカナとひらがなを区別しないかどうか
+        :type fold_kana: bool
+        """
+        self.fold_kana = fold_kana
+        # 状態ごとの遷移先、失敗時の遷移先、見つかったキーワード
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        self.words = []
+
+        for word in words:
+            key = fold(word, fold_kana)
+            if not key:
+                continue
+            state = 0
+            for char in key:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                state = next_state
+            if not self._out[state]:
+                self._out[state] = (word,)
+                self.words.append(word)
+        self._build()
+
+    def __len__(self):
+        return len(self.words)
+
+    def _build(self):
+        """ 幅優先で失敗時の遷移先を作り、接尾辞のキーワードも見つかったキーワードに加える """
+        goto, fail, out = self._goto, self._fail, self._out
+        queue = collections.deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                f = fail[state]
+                while f and char not in goto[f]:
+                    f = fail[f]
+                f = goto[f].get(char, 0)
+                fail[next_state] = f
+                if out[f]:
+                    out[next_state] = out[next_state] + out[f]
+
+    def _scan(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for char in fold(text, self.fold_kana):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                yield out[state]
+
+    def search(self, text):
+        """ 文字列に含まれるキーワードを返す
+
+        :param text: 文字列
+        :type text: str
+        :return: 見つかったキーワード(元の表記)の配列。見つかった順で重複なし
+        :rtype: list[str]
+        """
+        found = {}
+        for words in self._scan(text):
+            found.update(dict.fromkeys(words))
+        return list(found)
+
+    def first(self, text):
+        """ 最初に見つかったキーワードを返す。見つかった時点で走査をやめる
+
+        :param text: 文字列
+        :type text: str
+        :return: キーワード。なければ ``None``
+        :rtype: str or None
+        """
+        for words in self._scan(text):
+            return words[0]
+        return None
+
+
+class Moderator(object):
+    """ コメントを監視し、NGワードを含むコメントを削除する
+
+    NGワードは :class:`KeywordMatcher` にまとめて、コメント1件を1回の走査で判定する。
+    削除は ``batch_size`` 件か ``flush_interval`` 秒ごとにまとめて ``max_workers`` 並列で行い、
+    1回にまとめる件数はアクセストークンの残り回数から ``reserve`` を引いた数までにする(残りは次回に回す)
+
+    削除するにはコメント投稿者か、ライブ配信者に紐づくアクセストークンが必要
+
+    Usage::
+
+      >>> from pytwitcasting.events import EventBus, CommentTailer
+      >>> from pytwitcasting.moderation import Moderator
+      >>> bus = EventBus()
+      >>> moderator = Moderator(api, ng_words)
+      >>> threading.Thread(target=moderator.run, args=(bus.subscribe(['comment'], maxsize=10000),)).start()
+    """
+
+    def __init__(self, api, words, max_workers=8, batch_size=50, flush_interval=0.5, reserve=10,
+                 on_delete=None, dry_run=False, fold_kana=True):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param words: NGワードの配列か :class:`KeywordMatcher`
+        :type words: list[str] or :class:`KeywordMatcher`
+        :param max_workers: (optional) 並列に送信する削除リクエストの数
+        :type max_workers: int
+        :param batch_size: (optional) この件数たまったら削除する
+        :type batch_size: int
+        :param flush_interval: (optional) 最後に削除してからこの秒数が経ったら削除する
+        :type flush_interval: float
+        :param reserve: (optional) 削除に使わずに残しておくAPIの残り回数
+        :type reserve: int
+        :param on_delete: (optional) 削除するたびに ``on_delete(movie_id, comment, word, error)`` で呼び出す
+        :param dry_run: (optional) ``True`` なら削除せずに ``on_delete`` だけ呼び出す
+        :type dry_run: bool
+        :param fold_kana: (optional) カタカナとひらがなを区別しないかどうか
+        :type fold_kana: bool
+        """
+        self.api = api
+        self.matcher = words if isinstance(words, KeywordMatcher) else KeywordMatcher(words, fold_kana)
+        self.max_workers = max_workers
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.reserve = reserve
+        self.on_delete = on_delete
+        self.dry_run = dry_run
+        # (movie_id, comment, word) の削除待ち
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+        self._flushed_at = time.monotonic()
+        # 再試行する削除があるときは、この時刻までflushしない
+        self._retry_at = 0.0
+
+    def check(self, comment):
+        """ コメントがNGワードを含むか判定する
+
+        :param comment: :class:`Comment <pytwitcasting.models.Comment>` か本文
+        :type comment: :class:`Comment <pytwitcasting.models.Comment>` or str
+        :return: 最初に見つかったNGワード。なければ ``None``
+        :rtype: str or None
+        """
+        return self.matcher.first(getattr(comment, 'message', comment) or '')
+
+    def submit(self, comment, movie_id=None):
+        """ コメントを判定し、NGワードを含むなら削除待ちにする
+
+        :param comment: :class:`Comment <pytwitcasting.models.Comment>`
+        :param movie_id: (optional) ライブID。省略時は ``comment.movie_id``
+        :type movie_id: str
+        :return: 見つかったNGワード。なければ ``None``
+        :rtype: str or None
+        """
+        word = self.check(comment)
+        with self._lock:
+            self._counts['checked'] += 1
+            if word is not None:
+                self._counts['matched'] += 1
+                self._pending.append((movie_id or comment.movie_id, comment, word))
+        return word
+
+    def _delete(self, item):
+        movie_id, comment, word = item
+        error = None
+        if not self.dry_run:
+            try:
+                self.api._delete_comment(movie_id, comment.id)
+            except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException) as e:
+                error = e
+        return item, error
+
+    @staticmethod
+    def _retryable(error):
+        """ 時間をおけば削除できるかもしれない失敗かどうか """
+        if isinstance(error, TwitcastingException):
+            return error.http_status == 429 or error.http_status >= 500
+        return True
+
+    def flush(self):
+        """ 削除待ちのコメントを並列で削除する
+
+        ネットワークエラーや429、5xxで失敗したコメントは削除待ちに戻し、 ``flush_interval`` 秒後に再試行する
+
+        :return: 削除を試みた件数
+        :rtype: int
+        """
+        with self._lock:
+            self._flushed_at = time.monotonic()
+            budget = self.api.rate_limit.available() - self.reserve
+            count = int(max(min(len(self._pending), budget), 0))
+            if count < len(self._pending):
+                self._counts['deferred'] += len(self._pending) - count
+            items = [self._pending.popleft() for _ in range(count)]
+        if not items:
+            return 0
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(items))) as executor:
+            for item, error in executor.map(self._delete, items):
+                movie_id, comment, word = item
+                with self._lock:
+                    if error is None:
+                        self._counts['deleted'] += 1
+                    elif getattr(error, 'http_status', None) == 404:
+                        # すでに削除されている
+                        self._counts['gone'] += 1
+                    elif self._retryable(error):
+                        self._counts['retried'] += 1
+                        self._pending.append(item)
+                        self._retry_at = time.monotonic() + self.flush_interval
+                        continue
+                    else:
+                        self._counts['failed'] += 1
+                if self.on_delete:
+                    self.on_delete(movie_id, comment, word, error)
+        return len(items)
+
+    def _due(self):
+        with self._lock:
+            if time.monotonic() < self._retry_at:
+                return False
+            return (len(self._pending) >= self.batch_size or
+                    (self._pending and time.monotonic() - self._flushed_at >= self.flush_interval))
+
+    def run(self, events, stop_event=None):
+        """ コメントのイベントを受け取りながら判定と削除を行う
+
+        :param events: :class:`Subscription <pytwitcasting.events.Subscription>` など、
+                       ``get(timeout)`` で :class:`Event <pytwitcasting.events.Event>` を返すもの
+        :param stop_event: (optional) 止めるための :class:`threading.Event`
+        :type stop_event: :class:`threading.Event`
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            event = events.get(timeout=self.flush_interval)
+            if event is not None:
+                self.submit(event.data)
+            elif getattr(events, 'closed', False):
+                break
+            if self._due():
+                self.flush()
+        self.flush()
+
+    def metrics(self):
+        """ 判定と削除の統計
+
+        :return: - ``checked`` : 判定したコメント数
+                 - ``matched`` : NGワードを含んでいたコメント数
+                 - ``deleted`` : 削除したコメント数
+                 - ``gone`` : 削除しようとしたがすでになかったコメント数
+                 - ``failed`` : 削除に失敗したコメント数
+                 - ``retried`` : 一時的な失敗で削除待ちに戻した延べ件数
+                 - ``deferred`` : 残り回数が足りず、次回に回した延べ件数
+                 - ``pending`` : 削除待ちのコメント数
+        :rtype: dict
+        """
+        with self._lock:
+            res = {key: self._counts[key] for key in ('checked', 'matched', 'deleted', 'gone', 'failed', 'retried',
+                                                         'deferred')}
+            res['pending'] = len(self._pending)
+            return res
@@ -0,0 +1,347 @@
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+from pytwitcasting.resilience import RetryPolicy
+
+
+# 配信の状態
+PENDING = 'pending'
+SENT = 'sent'
+FAILED = 'failed'
+
+
+class Delivery(object):
+    """ 送信待ちのコメント。 :meth:`CommentSender.send` が返す """
+
+    def __init__(self, movie_id, message, sns='none'):
+        self.movie_id = str(movie_id)
+        self.message = message
+        self.sns = sns
+        self.status = PENDING
+        # 投稿した :class:`Comment <pytwitcasting.models.Comment>`
+        self.comment = None
+        self.error = None
+        self.attempts = 0
+        # 曖昧な失敗の後、コメント一覧から投稿済みであることを確認したかどうか
+        self.recovered = False
+        self.enqueued_at = time.monotonic()
+        self.sent_at = None
+        self._created_after = None
+        self._done = threading.Event()
+
+    def __repr__(self):
+        return f'Delivery({self.movie_id!r}, {self.message!r}, status={self.status!r})'
+
+    @property
+    def latency(self):
+        """ キューに入れてから投稿できるまでの秒数。まだなら ``None`` """
+        return None if self.sent_at is None else self.sent_at - self.enqueued_at
+
+    def wait(self, timeout=None):
+        """ 投稿が終わる(成功か失敗する)まで待つ
+
+        :param timeout: (optional) 待つ秒数
+        :type timeout: float
+        :return: 終わったかどうか
+        :rtype: bool
+        """
+        return self._done.wait(timeout)
+
+
+class CommentSender(object):
+    """ コメントを投稿するキュー
+
+    ライブごとに ``per_movie_interval`` 秒の間隔をあけて、キューに入れた順に1件ずつ投稿する。
+    ``rate`` を指定すると、全体で ``per`` 秒あたり ``rate`` 件までに制限する。
+    複数のライブには ``max_workers`` 並列で投稿する
+
+    投稿(POST)は冪等ではないため、次のように扱う
+
+    - 429や接続できなかった場合など、処理されていないことが明らかな失敗はそのままリトライする
+    - 5xxやタイムアウトなど、投稿されたかどうか分からない失敗の後は、コメント一覧を取得し、
+      自分が同じ本文で投稿したコメントがあれば成功として扱い、なければリトライする
+    - それ以外の4xxはリトライせずに失敗とする
+
+    Usage::
+
+      >>> from pytwitcasting.outbound import CommentSender
+      >>> with CommentSender(api, per_movie_interval=3, rate=30, per=60) as sender:
+      ...     deliveries = [sender.send(movie_id, 'お知らせです') for movie_id in movie_ids]
+      >>> sender.metrics()
+    """
+
+    def __init__(self, api, per_movie_interval=3.0, rate=None, per=60.0, max_workers=8,
+                 retry_policy=None, verify_limit=50, clock_skew=30.0):
+        """
+        :param api: ユーザ単位の :class:`API <pytwitcasting.api.API>`
+        :param per_movie_interval: (optional) 同じライブに投稿する間隔(秒)
+        :type per_movie_interval: float
+        :param rate: (optional) ``per`` 秒あたりの投稿数の上限。 ``None`` なら制限しない
+        :type rate: int or None
+        :param per: (optional) ``rate`` の期間(秒)
+        :type per: float
+        :param max_workers: (optional) 並列に投稿するライブの数
+        :type max_workers: int
+        :param retry_policy: (optional) リトライ方針
+        :type retry_policy: :class:`RetryPolicy <pytwitcasting.resilience.RetryPolicy>`
+        :param verify_limit: (optional) 投稿済みかどうかを確認するときに取得するコメント数. max:50
+        :type verify_limit: int
+        :param clock_skew: (optional) 投稿済みかどうかを確認するときに許容する、サーバとの時刻のずれ(秒)
+        :type clock_skew: float
+        """
+        self.api = api
+        self.per_movie_interval = per_movie_interval
+        self.rate = rate
+        self.per = per
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=5)
+        self.verify_limit = verify_limit
+        self.clock_skew = clock_skew
+
+        # movie_id -> 送信待ちのDeliveryのdeque
+        self._queues = collections.OrderedDict()
+        # movie_id -> 次に投稿できる時刻
+        self._next_at = {}
+        self._in_flight = set()
+        # movie_id -> 投稿したコメントIDの集合(重複の確認で同じコメントを2回使わないため)
+        self._posted_ids = collections.defaultdict(set)
+        self._tokens = float(rate) if rate else 0.0
+        self._updated = time.monotonic()
+        self._user_id = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._counts = collections.Counter()
+        self._latencies = collections.deque(maxlen=1000)
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._scheduler = threading.Thread(target=self._schedule, name='CommentSender', daemon=True)
+        self._scheduler.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def send(self, movie_id, message, sns='none'):
+        """ コメントをキューに入れる
+
+        :param movie_id: ライブID
+        :type movie_id: str
+        :param message: 投稿するコメント
+        :type message: str
+        :param sns: (optional) SNSへの同時投稿。 :meth:`Movie.post_comment <pytwitcasting.models.Movie.post_comment>` と同じ
+        :type sns: str
+        :return: :class:`Delivery`
+        """
+        delivery = Delivery(movie_id, message, sns)
+        with self._cond:
+            if self._closed:
+                raise TwitcastingError('CommentSender is closed')
+            self._queues.setdefault(delivery.movie_id, collections.deque()).append(delivery)
+            self._counts['enqueued'] += 1
+            self._cond.notify_all()
+        return delivery
+
+    def join(self, timeout=None):
+        """ キューが空になるまで待つ
+
+        :param timeout: (optional) 待つ秒数
+        :type timeout: float
+        :return: 空になったかどうか
+        :rtype: bool
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queues and not self._in_flight, timeout)
+
+    def close(self, wait=True):
+        """ 新しいコメントの受け付けをやめる
+
+        :param wait: (optional) キューに残っているコメントを投稿し終わるまで待つかどうか
+        :type wait: bool
+        """
+        if wait:
+            self.join()
+        with self._cond:
+            self._closed = True
+            for queue in self._queues.values():
+                for delivery in queue:
+                    self._finish(delivery, FAILED, TwitcastingError('CommentSender is closed'))
+            self._queues.clear()
+            self._cond.notify_all()
+        self._scheduler.join()
+        self._executor.shutdown(wait=wait)
+
+    def _refill(self, now):
+        if self.rate:
+            self._tokens = min(float(self.rate), self._tokens + (now - self._updated) * self.rate / self.per)
+        self._updated = now
+
+    def _next_ready(self, now):
+        """ 投稿できるライブを探す。ロックを取った状態で呼び出す
+
+        :return: ``(movie_id, 待つ秒数)`` 。投稿できるライブがなければmovie_idは ``None``
+        """
+        wait = None
+        for movie_id in self._queues:
+            if movie_id in self._in_flight:
+                continue
+            delay = self._next_at.get(movie_id, 0.0) - now
+            if delay <= 0:
+                return movie_id, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    def _schedule(self):
+        """ 投稿できるライブから順に、ワーカーに投稿させる """
+        with self._cond:
+            while not self._closed:
+                now = time.monotonic()
+                self._refill(now)
+                movie_id, wait = self._next_ready(now)
+                if movie_id is not None and self.rate and self._tokens < 1:
+                    wait = (1 - self._tokens) * self.per / self.rate
+                    movie_id = None
+                if movie_id is None:
+                    self._cond.wait(wait)
+                    continue
+
+                if self.rate:
+                    self._tokens -= 1
+                delivery = self._queues[movie_id].popleft()
+                # 公平にするため、投稿したライブは後ろに回す
+                queue = self._queues.pop(movie_id)
+                if queue:
+                    self._queues[movie_id] = queue
+                self._in_flight.add(movie_id)
+                self._executor.submit(self._deliver, delivery)
+
+    def _requeue(self, delivery, delay):
+        """ 待ってから先頭に戻す。ロックを取った状態で呼び出す """
+        queue = self._queues.setdefault(delivery.movie_id, collections.deque())
+        queue.appendleft(delivery)
+        self._next_at[delivery.movie_id] = time.monotonic() + delay
+
+    def _finish(self, delivery, status, error=None):
+        """ 投稿を終える。ロックを取った状態で呼び出す """
+        delivery.status = status
+        delivery.error = error
+        self._counts[status] += 1
+        if status == SENT:
+            delivery.sent_at = time.monotonic()
+            self._latencies.append(delivery.latency)
+        delivery._done.set()
+
+    def _own_user_id(self):
+        if self._user_id is None:
+            self._user_id = str(self.api.verify_credentials()['user'].id)
+        return self._user_id
+
+    def _find_posted(self, delivery):
+        """ 曖昧な失敗の後、コメント一覧から投稿済みのコメントを探す
+
+        :return: 見つかった :class:`Comment <pytwitcasting.models.Comment>` 。なければ ``None``
+        """
+        user_id = self._own_user_id()
+        res = self.api._get_comments(delivery.movie_id, limit=self.verify_limit)
+        with self._cond:
+            posted_ids = self._posted_ids[delivery.movie_id]
+            for comment in reversed(res['comments']):
+                if (str(comment.from_user.id) == user_id and comment.message == delivery.message
+                        and comment.id not in posted_ids
+                        and comment.created.timestamp() >= delivery._created_after):
+                    return comment
+        return None
+
+    def _post(self, delivery):
+        """ 1回投稿する
+
+        :return: ``(状態, 待つ秒数, 例外)`` 。状態は ``SENT`` , ``FAILED`` , リトライするなら ``PENDING``
+        """
+        attempt = delivery.attempts
+        delivery.attempts += 1
+
+        if delivery._created_after is not None:
+            # 前回の失敗が曖昧だったため、投稿済みでないか確認する
+            comment = self._find_posted(delivery)
+            if comment is not None:
+                delivery.comment = comment
+                delivery.recovered = True
+                return SENT, 0.0, None
+        else:
+            delivery._created_after = time.time() - self.clock_skew
+
+        try:
+            delivery.comment = self.api._post_comment(delivery.movie_id, delivery.message, sns=delivery.sns)['comment']
+            return SENT, 0.0, None
+        except TwitcastingException as e:
+            if e.http_status != 429 and e.http_status < 500:
+                return FAILED, 0.0, e
+            if e.http_status == 429:
+                # 処理されていないため、次は確認しなくてよい
+                delivery._created_after = None
+            error = e
+        except requests.exceptions.RequestException as e:
+            if isinstance(e, requests.exceptions.ConnectTimeout):
+                # 接続できていないため、次は確認しなくてよい
+                delivery._created_after = None
+            error = e
+
+        if attempt >= self.retry_policy.max_retries:
+            return FAILED, 0.0, error
+        return PENDING, self.retry_policy.backoff(attempt), error
+
+    def _deliver(self, delivery):
+        # 想定外の例外で抜けても、ライブを送信中のままにしないよう失敗にする
+        status, delay, error = FAILED, 0.0, None
+        try:
+            status, delay, error = self._post(delivery)
+        except Exception as e:
+            # 投稿済みかどうかの確認の失敗や、サーキットブレーカー・期限切れ(TwitcastingError)などは
+            # 確認からやり直す
+            if delivery.attempts > self.retry_policy.max_retries:
+                status, delay, error = FAILED, 0.0, e
+            else:
+                status, delay, error = PENDING, self.retry_policy.backoff(delivery.attempts - 1), e
+        finally:
+            with self._cond:
+                self._in_flight.discard(delivery.movie_id)
+                if status == PENDING and not self._closed:
+                    self._counts['retries'] += 1
+                    self._requeue(delivery, delay)
+                else:
+                    if status == SENT:
+                        self._posted_ids[delivery.movie_id].add(delivery.comment.id)
+                        if delivery.recovered:
+                            self._counts['recovered'] += 1
+                        self._next_at[delivery.movie_id] = time.monotonic() + self.per_movie_interval
+                    self._finish(delivery, FAILED if status == PENDING else status, error)
+                self._cond.notify_all()
+
+    def metrics(self):
+        """ 投稿の統計
+
+        :return: - ``enqueued`` : キューに入れた数
+                 - ``sent`` : 投稿した数
+                 - ``failed`` : 失敗した数
+                 - ``retries`` : リトライした回数
+                 - ``recovered`` : 曖昧な失敗の後、投稿済みであることを確認した数(重複投稿を防いだ数)
+                 - ``pending`` : 送信待ちの数
+                 - ``latency`` : キューに入れてから投稿するまでの秒数の ``p50`` , ``p95`` , ``max``
+        :rtype: dict
+        """
+        with self._cond:
+            latencies = sorted(self._latencies)
+            res = {key: self._counts[key] for key in ('enqueued', SENT, FAILED, 'retries', 'recovered')}
+            res['pending'] = sum(len(queue) for queue in self._queues.values()) + len(self._in_flight)
+
+        def percentile(p):
+            return latencies[min(int(len(latencies) * p), len(latencies) - 1)] if latencies else None
+
+        res['latency'] = {'p50': percentile(0.5), 'p95': percentile(0.95),
+                          'max': latencies[-1] if latencies else None}
+        return res
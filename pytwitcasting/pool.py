@@ -0,0 +1,139 @@
+import threading
+import time
+
+from pytwitcasting.api import API, create_session
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+# どのトークンで呼び出しても結果が変わらない読み込み系のメソッド
+READ_METHODS = ('get_user_info', 'get_movie_info', 'get_categories', 'search_users', 'search_live_movies')
+
+# 認可エラーとして一時的に使用を止めるHTTPステータス
+AUTH_ERROR_STATUSES = (401, 403)
+
+
+class APIPool(object):
+    """ 複数のアクセストークンにリクエストを分散する
+
+    読み込み系のメソッド( ``READ_METHODS`` )は残りの利用可能回数が最も多いトークンで呼び出す。
+    書き込み系の操作は :meth:`api_for` でトークンに紐づく :class:`API <pytwitcasting.api.API>` を取り出して呼び出す。
+    認可エラーになったトークンは ``bench_seconds`` 秒の間使わない
+
+    Usage::
+
+      >>> from pytwitcasting.pool import APIPool
+      >>> pool = APIPool(access_tokens=[token1, token2], application_basis=app_basis)
+      >>> pool.get_user_info('twitcasting_jp').name
+      'ツイキャス公式'
+      >>> pool.api_for(token1).support_user(['twitcasting_jp'])
+      1
+    """
+
+    def __init__(self, access_tokens=(), application_basis=None, bench_seconds=60, **kwargs):
+        """
+        :param access_tokens: (optional) アクセストークンの配列
+        :type access_tokens: list[str]
+        :param application_basis: (optional) TwitcastiongApplicationBasisオブジェクト
+        :type application_basis: :class:`TwitcastingApplicationBasis <pytwitcasting.auth.TwitcastingApplicationBasis>`
+        :param bench_seconds: (optional) 認可エラーになったトークンを使わない秒数
+        :type bench_seconds: int or float
+        :param kwargs: (optional) :class:`API <pytwitcasting.api.API>` に渡す引数
+        """
+        self.bench_seconds = bench_seconds
+        self._apis = []
+        self._benched_until = {}
+        self._lock = threading.Lock()
+
+        # トークン間でコネクションプールを共有する
+        kwargs.setdefault('requests_session', create_session())
+        for access_token in access_tokens:
+            self.add(API(access_token=access_token, **kwargs))
+        if application_basis:
+            self.add(API(application_basis=application_basis, **kwargs))
+
+    @property
+    def apis(self):
+        """ プールに含まれる :class:`API <pytwitcasting.api.API>` の配列 """
+        return list(self._apis)
+
+    def add(self, api):
+        """ プールに :class:`API <pytwitcasting.api.API>` を追加する
+
+        :param api: 追加するAPI
+        :type api: :class:`API <pytwitcasting.api.API>`
+        """
+        with self._lock:
+            self._apis.append(api)
+
+    def api_for(self, access_token=None, application_basis=None):
+        """ トークンに紐づく :class:`API <pytwitcasting.api.API>` を返す
+
+        書き込み系の操作はトークンの持ち主が決まっているため、これで取り出したAPIで呼び出す
+
+        :param access_token: (optional) アクセストークン
+        :type access_token: str
+        :param application_basis: (optional) TwitcastiongApplicationBasisオブジェクト
+        :type application_basis: :class:`TwitcastingApplicationBasis <pytwitcasting.auth.TwitcastingApplicationBasis>`
+        :return: :class:`API <pytwitcasting.api.API>`
+        """
+        for api in self._apis:
+            if access_token and api._access_token == access_token:
+                return api
+            if application_basis and api.application_basis is application_basis:
+                return api
+        raise TwitcastingError('No API for this token in the pool')
+
+    def bench(self, api, seconds=None):
+        """ 一定時間、そのAPIを振り分け先から外す
+
+        :param api: 外すAPI
+        :type api: :class:`API <pytwitcasting.api.API>`
+        :param seconds: (optional) 外す秒数。省略時は ``bench_seconds``
+        :type seconds: int or float
+        """
+        seconds = self.bench_seconds if seconds is None else seconds
+        with self._lock:
+            self._benched_until[api] = time.time() + seconds
+
+    def _choose(self, exclude=()):
+        """ 残りの利用可能回数が最も多いAPIを選ぶ """
+        now = time.time()
+        with self._lock:
+            candidates = [api for api in self._apis
+                          if api not in exclude and self._benched_until.get(api, 0) <= now]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda api: api.rate_limit.available(now))
+
+    def _call(self, name, *args, **kwargs):
+        """ 振り分け先を選んで呼び出す。認可エラーとレート制限のときは別のトークンで呼び出し直す """
+        tried = []
+        while True:
+            api = self._choose(exclude=tried)
+            if api is None:
+                if tried:
+                    raise error
+                raise TwitcastingError('No available token in the pool')
+
+            try:
+                return getattr(api, name)(*args, **kwargs)
+            except TwitcastingException as e:
+                if e.http_status in AUTH_ERROR_STATUSES:
+                    self.bench(api)
+                elif e.http_status == 429:
+                    # リセット時刻まで外す
+                    reset = api.rate_limit.reset
+                    self.bench(api, seconds=max(reset - time.time(), 1) if reset else None)
+                else:
+                    raise
+                error = e
+                tried.append(api)
+
+    def __getattr__(self, name):
+        if name in READ_METHODS:
+            def method(*args, **kwargs):
+                return self._call(name, *args, **kwargs)
+            method.__name__ = name
+            method.__doc__ = getattr(API, name).__doc__
+            return method
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
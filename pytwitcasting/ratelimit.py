@@ -0,0 +1,288 @@
+import hashlib
+import threading
+import time
+
+from pytwitcasting.storage import SQLiteStore
+
+
+def _parse_headers(headers):
+    """ レスポンスヘッダーから ``(limit, remaining, reset)`` を取り出す。ヘッダーがなければ ``None`` """
+    try:
+        return (int(headers['X-RateLimit-Limit']),
+                int(headers['X-RateLimit-Remaining']),
+                int(headers['X-RateLimit-Reset']))
+    except (KeyError, TypeError, ValueError):
+        # レート制限のヘッダーがないレスポンス
+        return None
+
+
+class RateLimit(object):
+    """ アクセストークンごとのAPIの利用可能回数を表す
+
+    レスポンスヘッダーの ``X-RateLimit-Limit`` , ``X-RateLimit-Remaining`` , ``X-RateLimit-Reset`` から更新する
+
+    http://apiv2-doc.twitcasting.tv/#rate-limit
+    """
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset = None
+        self._lock = threading.Lock()
+
+    def for_token(self, token):
+        """ 別のトークン用の状態を返す
+
+        :param token: アクセストークンなど
+        :type token: str
+        :return: :class:`RateLimit`
+        """
+        return RateLimit()
+
+    def acquire(self):
+        """ リクエストを送信する前に呼び出す
+
+        :return: :meth:`release` に渡す値
+        """
+        self.consume()
+
+    def release(self, ticket, headers=None):
+        """ レスポンスを受け取った後(失敗した場合も)に呼び出す
+
+        :param ticket: :meth:`acquire` の戻り値
+        :param headers: (optional) レスポンスヘッダー
+        :type headers: dict
+        """
+        if headers is not None:
+            self.update(headers)
+
+    def update(self, headers):
+        """ レスポンスヘッダーから状態を更新する
+
+        :param headers: レスポンスヘッダー
+        :type headers: dict
+        """
+        parsed = _parse_headers(headers)
+        if parsed is None:
+            return
+        limit, remaining, reset = parsed
+
+        with self._lock:
+            self.limit = limit
+            self.remaining = remaining
+            self.reset = reset
+
+    def snapshot_state(self):
+        """ :class:`Snapshot <pytwitcasting.snapshot.Snapshot>` で保存する状態を返す """
+        with self._lock:
+            return {'limit': self.limit, 'remaining': self.remaining, 'reset': self.reset}
+
+    def restore_state(self, state):
+        """ :meth:`snapshot_state` の状態に戻す。まだレスポンスを受け取っていない場合だけ反映する """
+        with self._lock:
+            if self.remaining is None:
+                self.limit, self.remaining, self.reset = state['limit'], state['remaining'], state['reset']
+
+    def consume(self):
+        """ リクエストを1回送信する分だけ残り回数を減らす
+
+        次のレスポンスでサーバーの値に上書きされるまでの見込み値
+        """
+        with self._lock:
+            if self.remaining is not None:
+                self.remaining = max(self.remaining - 1, 0)
+
+    def available(self, now=None):
+        """ 現在利用できる回数の見込みを返す
+
+        まだ一度もレスポンスを受け取っていない場合は ``float('inf')``
+
+        :param now: (optional) 現在のUNIX時間
+        :type now: float
+        :return: 利用できる回数
+        :rtype: int or float
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self.remaining is None:
+                return float('inf')
+            if self.reset is not None and now >= self.reset:
+                # リセット時刻を過ぎていれば上限まで回復している
+                return self.limit
+            return self.remaining
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    lim INTEGER NOT NULL,
+    remaining INTEGER NOT NULL,
+    reset INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS in_flight (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    started REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS in_flight_key ON in_flight (key);
+"""
+
+
+class SharedRateLimit(SQLiteStore):
+    """ 同じホストの複数のプロセスで共有するレート制限の状態
+
+    トークンごとの残り回数、リセット時刻、送信中のリクエスト数をSQLiteのファイルに保存し、
+    すべてのプロセスの :class:`API <pytwitcasting.api.API>` が送信前に確認する。
+    残り回数から送信中の数と ``margin`` を引いた分がなくなったら、リセット時刻まで待つ
+
+    Usage::
+
+      >>> from pytwitcasting.api import API
+      >>> from pytwitcasting.ratelimit import SharedRateLimit
+      >>> api = API(access_token, rate_limit=SharedRateLimit('/var/run/twitcasting-rate.db', access_token))
+    """
+
+    def __init__(self, path, token, margin=1, in_flight_timeout=60.0, initial_concurrency=1):
+        """
+        :param path: SQLiteのファイルのパス
+        :type path: str
+        :param token: アクセストークンなど、レート制限の単位になる文字列。ファイルにはハッシュ値を保存する
+        :type token: str
+        :param margin: (optional) 使わずに残しておく回数
+        :type margin: int
+        :param in_flight_timeout: (optional) 送信中のまま、この秒数を過ぎたリクエストは数えない(プロセスが落ちた場合など)
+        :type in_flight_timeout: float
+        :param initial_concurrency: (optional) まだ状態がわからないときに同時に送信してよい数
+        :type initial_concurrency: int
+        """
+        self.key = hashlib.sha256(token.encode('utf-8')).hexdigest()[:32]
+        self.margin = margin
+        self.in_flight_timeout = in_flight_timeout
+        self.initial_concurrency = initial_concurrency
+
+        self._init_store(path, SCHEMA)
+
+    def _state(self, conn, now):
+        """ ``(limit, remaining, reset, in_flight)`` を返す。リセット時刻を過ぎていれば残り回数を戻す """
+        conn.execute('DELETE FROM in_flight WHERE started < ?', (now - self.in_flight_timeout,))
+        in_flight = conn.execute('SELECT COUNT(*) FROM in_flight WHERE key = ?', (self.key,)).fetchone()[0]
+        row = conn.execute('SELECT lim, remaining, reset FROM rate_limits WHERE key = ?', (self.key,)).fetchone()
+        if row is None:
+            return None, None, None, in_flight
+        limit, remaining, reset = row
+        if now >= reset:
+            remaining = limit
+        return limit, remaining, reset, in_flight
+
+    def for_token(self, token):
+        """ 同じファイルを使う、別のトークン用の状態を返す
+
+        :param token: アクセストークンなど
+        :type token: str
+        :return: :class:`SharedRateLimit`
+        """
+        return SharedRateLimit(self.path, token, margin=self.margin, in_flight_timeout=self.in_flight_timeout,
+                               initial_concurrency=self.initial_concurrency)
+
+    def acquire(self, block=True):
+        """ 送信できるまで待ち、送信中のリクエストとして登録する
+
+        :param block: (optional) 待つかどうか。 ``False`` で送信できない場合は ``None`` を返す
+        :type block: bool
+        :return: :meth:`release` に渡す値
+        """
+        def take(conn):
+            now = time.time()
+            limit, remaining, reset, in_flight = self._state(conn, now)
+            if remaining is None:
+                # 最初のレスポンスで状態がわかるまでは少しずつ送信する
+                wait = 0.0 if in_flight < self.initial_concurrency else 0.05
+            elif remaining - in_flight - self.margin > 0:
+                wait = 0.0
+            elif in_flight and remaining - self.margin > 0:
+                # 送信中のリクエストが返ってきて状態が更新されるのを待つ
+                wait = 0.05
+            else:
+                wait = max(reset - now, 0.05)
+
+            if wait:
+                return None, wait
+            cur = conn.execute('INSERT INTO in_flight (key, started) VALUES (?, ?)', (self.key, now))
+            return cur.lastrowid, 0.0
+
+        while True:
+            ticket, wait = self._transaction(take)
+            if ticket is not None or not block:
+                return ticket
+            time.sleep(wait)
+
+    def release(self, ticket, headers=None):
+        """ 送信中のリクエストから外し、レスポンスヘッダーから状態を更新する
+
+        :param ticket: :meth:`acquire` の戻り値
+        :param headers: (optional) レスポンスヘッダー
+        :type headers: dict
+        """
+        parsed = _parse_headers(headers) if headers is not None else None
+
+        def release(conn):
+            if ticket is not None:
+                conn.execute('DELETE FROM in_flight WHERE id = ?', (ticket,))
+            if parsed is not None:
+                self._store(conn, *parsed)
+
+        self._transaction(release)
+
+    def _store(self, conn, limit, remaining, reset):
+        row = conn.execute('SELECT remaining, reset FROM rate_limits WHERE key = ?', (self.key,)).fetchone()
+        if row is not None and row[1] == reset:
+            # 同じ期間のレスポンスは順不同で返ってくるため、少ない方を正とする
+            remaining = min(remaining, row[0])
+        elif row is not None and row[1] > reset:
+            # 古い期間のレスポンス
+            return
+        conn.execute('INSERT OR REPLACE INTO rate_limits (key, lim, remaining, reset) VALUES (?, ?, ?, ?)',
+                     (self.key, limit, remaining, reset))
+
+    def update(self, headers):
+        """ レスポンスヘッダーから状態を更新する
+
+        :param headers: レスポンスヘッダー
+        :type headers: dict
+        """
+        self.release(None, headers)
+
+    def consume(self):
+        """ 残り回数を1回減らす """
+        def consume(conn):
+            conn.execute('UPDATE rate_limits SET remaining = MAX(remaining - 1, 0) WHERE key = ?', (self.key,))
+
+        self._transaction(consume)
+
+    def available(self, now=None):
+        """ 現在利用できる回数の見込みを返す
+
+        まだ一度もレスポンスを受け取っていない場合は ``float('inf')``
+
+        :param now: (optional) 現在のUNIX時間
+        :type now: float
+        :return: 利用できる回数
+        :rtype: int or float
+        """
+        now = time.time() if now is None else now
+        limit, remaining, reset, in_flight = self._transaction(lambda conn: self._state(conn, now))
+        if remaining is None:
+            return float('inf')
+        return max(remaining - in_flight, 0)
+
+    @property
+    def limit(self):
+        return self._transaction(lambda conn: self._state(conn, time.time()))[0]
+
+    @property
+    def remaining(self):
+        return self._transaction(lambda conn: self._state(conn, time.time()))[1]
+
+    @property
+    def reset(self):
+        return self._transaction(lambda conn: self._state(conn, time.time()))[2]
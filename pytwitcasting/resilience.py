@@ -0,0 +1,403 @@
+import collections
+import email.utils
+import random
+import threading
+import time
+import urllib.parse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from pytwitcasting.error import TwitcastingCircuitOpenError
+
+
+# URLのうち、IDが入る部分の直前のパス
+ID_PARENTS = ('users', 'movies', 'comments')
+
+
+def endpoint_key(method, url):
+    """ URLからIDを取り除いたエンドポイント名を返す
+
+    ``GET https://apiv2.twitcasting.tv/users/tamago324_pad/movies`` は ``GET /users/:id/movies`` になる
+
+    :param method: リクエストの種類
+    :param url: 送信先
+    :return: エンドポイント名
+    :rtype: str
+    """
+    path = urllib.parse.urlsplit(url).path.strip('/').split('/')
+    for i in range(1, len(path)):
+        if path[i - 1] in ID_PARENTS:
+            path[i] = ':id'
+    return f"{method} /{'/'.join(path)}"
+
+
+def parse_retry_after(value):
+    """ ``Retry-After`` ヘッダーを秒数に変換する
+
+    :param value: 秒数かHTTP日付の文字列
+    :type value: str or None
+    :return: 待つ秒数。解析できない場合は ``None``
+    :rtype: float or None
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class RetryPolicy(object):
+    """ 指数バックオフとFull Jitterによるリトライ方針
+
+    待ち時間は ``0`` から ``min(cap, base * 2 ** attempt)`` の間のランダムな値になり、
+    多数のワーカーが同時にリトライしないようにする。
+    ``Retry-After`` ヘッダーがあれば、その秒数を待つ
+
+    Usage::
+
+      >>> from pytwitcasting.api import API
+      >>> from pytwitcasting.resilience import RetryPolicy, CircuitBreaker
+      >>> api = API(access_token, retry_policy=RetryPolicy(max_retries=5), circuit_breaker=CircuitBreaker())
+    """
+
+    def __init__(self, max_retries=3, base=0.5, cap=30.0,
+                 status_forcelist=(429, 500, 502, 503, 504),
+                 idempotent_methods=('GET', 'PUT', 'DELETE')):
+        """
+        :param max_retries: (optional) 最大リトライ回数
+        :type max_retries: int
+        :param base: (optional) 待ち時間の基準(秒)
+        :type base: float
+        :param cap: (optional) 待ち時間の上限(秒)
+        :type cap: float
+        :param status_forcelist: (optional) リトライするHTTPステータス
+        :type status_forcelist: tuple[int]
+        :param idempotent_methods: (optional) 429以外の失敗でもリトライしてよいリクエストの種類
+        :type idempotent_methods: tuple[str]
+        """
+        self.max_retries = max_retries
+        self.base = base
+        self.cap = cap
+        self.status_forcelist = status_forcelist
+        self.idempotent_methods = idempotent_methods
+        self._retries = 0
+        self._lock = threading.Lock()
+
+    def should_retry(self, method, attempt, status=None):
+        """ リトライするかどうか
+
+        :param method: リクエストの種類
+        :param attempt: これまでのリトライ回数
+        :param status: (optional) HTTPステータス。接続エラーの場合は ``None``
+        :rtype: bool
+        """
+        if attempt >= self.max_retries:
+            return False
+        if status == 429:
+            # 処理されていないため、POSTでもリトライしてよい
+            return True
+        if method not in self.idempotent_methods:
+            return False
+        return status is None or status in self.status_forcelist
+
+    def backoff(self, attempt, retry_after=None):
+        """ 次のリトライまでの待ち時間を返す
+
+        :param attempt: これまでのリトライ回数
+        :param retry_after: (optional) ``Retry-After`` ヘッダーの値
+        :return: 待つ秒数
+        :rtype: float
+        """
+        with self._lock:
+            self._retries += 1
+
+        seconds = parse_retry_after(retry_after)
+        if seconds is not None:
+            return seconds
+        return random.uniform(0, min(self.cap, self.base * 2 ** attempt))
+
+    def metrics(self):
+        """ リトライの統計
+
+        :return: - ``retries`` : リトライした回数
+        :rtype: dict
+        """
+        return {'retries': self._retries}
+
+
+class CircuitBreaker(object):
+    """ エンドポイントごとのサーキットブレーカー
+
+    ``failure_threshold`` 回連続で失敗したエンドポイントはOPENになり、 ``recovery_timeout`` 秒の間
+    リクエストを送信せずに :class:`TwitcastingCircuitOpenError <pytwitcasting.error.TwitcastingCircuitOpenError>` を送出する。
+    その後HALF_OPENになり、試しに送信したリクエストが成功すればCLOSEDに戻る
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0, half_open_max_calls=1):
+        """
+        :param failure_threshold: (optional) OPENにする連続失敗回数
+        :type failure_threshold: int
+        :param recovery_timeout: (optional) OPENにしてからHALF_OPENにするまでの秒数
+        :type recovery_timeout: float
+        :param half_open_max_calls: (optional) HALF_OPENのときに同時に送信できるリクエスト数
+        :type half_open_max_calls: int
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self._circuits = {}
+        self._lock = threading.Lock()
+
+    def _circuit(self, key):
+        circuit = self._circuits.get(key)
+        if circuit is None:
+            circuit = {'state': self.CLOSED, 'failures': 0, 'opened_at': None,
+                       'half_open_calls': 0, 'rejected': 0}
+            self._circuits[key] = circuit
+        return circuit
+
+    def before_call(self, key):
+        """ 送信してよいか確認する。送信できない場合は例外を送出する
+
+        :param key: エンドポイント名
+        :raises: :class:`TwitcastingCircuitOpenError <pytwitcasting.error.TwitcastingCircuitOpenError>`
+        """
+        with self._lock:
+            circuit = self._circuit(key)
+            if circuit['state'] == self.OPEN:
+                retry_at = circuit['opened_at'] + self.recovery_timeout
+                if time.time() < retry_at:
+                    circuit['rejected'] += 1
+                    raise TwitcastingCircuitOpenError(key, retry_at)
+                circuit['state'] = self.HALF_OPEN
+                circuit['half_open_calls'] = 0
+
+            if circuit['state'] == self.HALF_OPEN:
+                if circuit['half_open_calls'] >= self.half_open_max_calls:
+                    circuit['rejected'] += 1
+                    raise TwitcastingCircuitOpenError(key, time.time() + self.recovery_timeout)
+                circuit['half_open_calls'] += 1
+
+    def record_success(self, key):
+        """ 成功を記録する
+
+        :param key: エンドポイント名
+        """
+        with self._lock:
+            circuit = self._circuit(key)
+            circuit['state'] = self.CLOSED
+            circuit['failures'] = 0
+            circuit['opened_at'] = None
+
+    def record_throttled(self, key):
+        """ レート制限(429)を記録する
+
+        エンドポイントの障害ではないため、成功にも失敗にも数えない。
+        HALF_OPENのときは、試しの送信枠を返す
+
+        :param key: エンドポイント名
+        """
+        with self._lock:
+            circuit = self._circuit(key)
+            if circuit['state'] == self.HALF_OPEN and circuit['half_open_calls'] > 0:
+                circuit['half_open_calls'] -= 1
+
+    def record_failure(self, key):
+        """ 失敗を記録する
+
+        :param key: エンドポイント名
+        """
+        with self._lock:
+            circuit = self._circuit(key)
+            circuit['failures'] += 1
+            if circuit['state'] == self.HALF_OPEN or circuit['failures'] >= self.failure_threshold:
+                circuit['state'] = self.OPEN
+                circuit['opened_at'] = time.time()
+
+    def state(self, key):
+        """ エンドポイントの状態を返す
+
+        :param key: エンドポイント名
+        :return: ``closed`` or ``open`` or ``half_open``
+        :rtype: str
+        """
+        with self._lock:
+            return self._circuit(key)['state']
+
+    def metrics(self):
+        """ エンドポイントごとの状態
+
+        :return: エンドポイント名をキーとし、 ``state`` , ``failures`` , ``rejected`` を値とするdict
+        :rtype: dict
+        """
+        with self._lock:
+            return {key: {'state': c['state'], 'failures': c['failures'], 'rejected': c['rejected']}
+                    for key, c in self._circuits.items()}
+
+
+class HedgePolicy(object):
+    """ GETリクエストのヘッジ方針
+
+    最初のリクエストが、これまでのレイテンシの ``percentile`` パーセンタイルを過ぎても返ってこない場合、
+    同じリクエストをもう1つ別のコネクションで送信し、先に返ってきた方を使う。
+    レイテンシと待ち時間は、スレッドプールの空きを待つ時間を除き、実際に送信を始めてから計る。
+    ヘッジしたリクエストの数は、全リクエストの ``max_extra`` の割合までに抑える。
+    スレッドプールに空きがないときはヘッジせず、最初のリクエストを待つ
+
+    Usage::
+
+      >>> from pytwitcasting.api import API, create_session
+      >>> from pytwitcasting.resilience import HedgePolicy
+      >>> api = API(access_token, requests_session=create_session(pool_maxsize=20),
+      ...           hedge_policy=HedgePolicy(percentile=95, max_extra=0.05))
+    """
+
+    def __init__(self, percentile=95, max_extra=0.05, initial_delay=1.0, min_delay=0.05,
+                 window=1000, max_workers=16):
+        """
+        :param percentile: (optional) ヘッジするまでの待ち時間にするレイテンシのパーセンタイル
+        :type percentile: float
+        :param max_extra: (optional) ヘッジしてよいリクエストの割合
+        :type max_extra: float
+        :param initial_delay: (optional) レイテンシが集まるまでの待ち時間(秒)
+        :type initial_delay: float
+        :param min_delay: (optional) 待ち時間の下限(秒)
+        :type min_delay: float
+        :param window: (optional) パーセンタイルの計算に使う直近のレイテンシの数
+        :type window: int
+        :param max_workers: (optional) リクエストを送信するスレッドの数
+        :type max_workers: int
+        """
+        self.percentile = percentile
+        self.max_extra = max_extra
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self._latencies = collections.deque(maxlen=window)
+        self._delay = initial_delay
+        self._requests = 0
+        self._hedged = 0
+        self._hedge_wins = 0
+        self._skipped = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 空いているスレッドの数。ヘッジは空きがあるときだけ送信する
+        self._slots = threading.BoundedSemaphore(max_workers)
+
+    def delay(self):
+        """ ヘッジするまでの待ち時間
+
+        :rtype: float
+        """
+        return self._delay
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+            # 毎回ソートしないよう、ある程度たまるごとに計算し直す
+            if len(self._latencies) >= 20 and len(self._latencies) % 10 == 0:
+                latencies = sorted(self._latencies)
+                index = min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)
+                self._delay = max(latencies[index], self.min_delay)
+
+    def _try_hedge(self):
+        with self._lock:
+            if self._hedged + 1 > self._requests * self.max_extra:
+                return False
+            self._hedged += 1
+            return True
+
+    def request(self, send, on_hedge=None):
+        """ ``send`` を呼び出し、遅い場合はもう一度呼び出して先に返ってきた結果を返す
+
+        :param send: リクエストを送信する関数
+        :param on_hedge: (optional) ヘッジしたときに呼び出す関数
+        :return: 先に返ってきた ``send`` の戻り値
+        """
+        with self._lock:
+            self._requests += 1
+
+        def submit(blocking=True):
+            # スレッドプールの空き待ちはレイテンシに含めず、実際に送信を始めた時刻から計る
+            if not self._slots.acquire(blocking=blocking):
+                return None
+            started = threading.Event()
+            sent_at = []
+
+            def timed():
+                sent_at.append(time.monotonic())
+                started.set()
+                try:
+                    return send()
+                finally:
+                    self._slots.release()
+
+            future = self._executor.submit(timed)
+            started.wait()
+            return future, sent_at[0]
+
+        first, first_sent_at = submit()
+        done, _ = wait([first], timeout=max(self._delay - (time.monotonic() - first_sent_at), 0))
+        hedge = None
+        if not done and self._try_hedge():
+            hedge = submit(blocking=False)
+            if hedge is None:
+                # 空きを待つとヘッジの意味がないため、やめる
+                with self._lock:
+                    self._hedged -= 1
+                    self._skipped += 1
+        if hedge is None:
+            result = first.result()
+            self._record(time.monotonic() - first_sent_at)
+            return result
+
+        if on_hedge:
+            on_hedge()
+        second, second_sent_at = hedge
+        sent_at = {first: first_sent_at, second: second_sent_at}
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                for loser in pending:
+                    # 送信済みのリクエストは止められないため、返ってきたら閉じる
+                    if not loser.cancel():
+                        loser.add_done_callback(_close_response)
+                if future is second:
+                    with self._lock:
+                        self._hedge_wins += 1
+                self._record(time.monotonic() - sent_at[future])
+                return future.result()
+        raise error
+
+    def metrics(self):
+        """ ヘッジの統計
+
+        :return: - ``requests`` : リクエスト数
+                 - ``hedged`` : ヘッジしたリクエスト数
+                 - ``hedge_wins`` : ヘッジしたリクエストの方が先に返ってきた数
+                 - ``skipped`` : スレッドプールに空きがなくヘッジしなかった数
+                 - ``delay`` : 現在の待ち時間(秒)
+        :rtype: dict
+        """
+        with self._lock:
+            return {'requests': self._requests, 'hedged': self._hedged,
+                    'hedge_wins': self._hedge_wins, 'skipped': self._skipped, 'delay': self._delay}
+
+
+def _close_response(future):
+    """ 使わなかったレスポンスを閉じる """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
@@ -0,0 +1,278 @@
+import collections
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+# 1サンプルの値
+FIELDS = ('timestamp', 'current_view_count', 'total_view_count', 'comment_count', 'max_view_count')
+
+
+class RingBuffer(object):
+    """ 視聴者数のサンプルを保持する固定長のリングバッファ
+
+    値は列ごとに :class:`array.array` に格納するため、 :class:`Movie <pytwitcasting.models.Movie>` を残しておくより小さい。
+    いっぱいになったら古いサンプルから上書きする
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: 保持するサンプル数
+        :type capacity: int
+        """
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._counts = [array('q', bytes(8 * capacity)) for _ in FIELDS[1:]]
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, timestamp, current_view_count, total_view_count, comment_count, max_view_count=0):
+        """ サンプルを追加する
+
+        :param timestamp: UNIX時間
+        :type timestamp: float
+        :param current_view_count: 現在の同時閲覧者数
+        :type current_view_count: int
+        :param total_view_count: 総視聴者数
+        :type total_view_count: int
+        :param comment_count: 総コメント数
+        :type comment_count: int
+        :param max_view_count: (optional) 最大同時閲覧者数
+        :type max_view_count: int
+        """
+        index = (self._start + self._size) % self.capacity
+        self._timestamps[index] = timestamp
+        for column, value in zip(self._counts, (current_view_count, total_view_count, comment_count,
+                                               max_view_count)):
+            column[index] = value or 0
+
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def _ordered(self, column):
+        """ 古い順に並べた配列を返す """
+        end = self._start + self._size
+        if end <= self.capacity:
+            return column[self._start:end]
+        return column[self._start:] + column[:end - self.capacity]
+
+    def columns(self):
+        """ 古い順に並べた列ごとの配列
+
+        :return: ``FIELDS`` をキー、 :class:`array.array` を値とするdict
+        :rtype: dict
+        """
+        columns = [self._timestamps] + self._counts
+        return {field: self._ordered(column) for field, column in zip(FIELDS, columns)}
+
+    def downsample(self, step):
+        """ ``step`` 件ごとに1件だけ取り出す
+
+        :param step: 間引く間隔
+        :type step: int
+        :return: ``FIELDS`` をキー、 :class:`array.array` を値とするdict
+        :rtype: dict
+        """
+        return {field: column[::step] for field, column in self.columns().items()}
+
+    def rollup(self, seconds=60, field='current_view_count'):
+        """ ``seconds`` 秒ごとに集計する
+
+        :param seconds: (optional) 集計する間隔(秒)
+        :type seconds: int
+        :param field: (optional) 集計する値
+        :type field: str
+        :return: - ``timestamp`` : 期間の開始時刻
+                 - ``min`` : 最小値
+                 - ``max`` : 最大値
+                 - ``avg`` : 平均値
+        :rtype: dict
+        """
+        columns = self.columns()
+        result = {'timestamp': array('d'), 'min': array('q'), 'max': array('q'), 'avg': array('d')}
+        bucket = None
+        for timestamp, value in zip(columns['timestamp'], columns[field]):
+            start = timestamp - timestamp % seconds
+            if start != bucket:
+                if bucket is not None:
+                    result['avg'].append(total / count)
+                bucket, total, count = start, 0, 0
+                result['timestamp'].append(start)
+                result['min'].append(value)
+                result['max'].append(value)
+            result['min'][-1] = min(result['min'][-1], value)
+            result['max'][-1] = max(result['max'][-1], value)
+            total += value
+            count += 1
+        if bucket is not None:
+            result['avg'].append(total / count)
+        return result
+
+    def to_numpy(self):
+        """ NumPyの構造化配列に変換する。NumPyが必要
+
+        :return: ``FIELDS`` を列に持つ :class:`numpy.ndarray`
+        """
+        import numpy as np
+
+        columns = self.columns()
+        dtype = [('timestamp', 'f8')] + [(field, 'i8') for field in FIELDS[1:]]
+        result = np.empty(self._size, dtype=dtype)
+        for field, column in columns.items():
+            # array.arrayはバッファプロトコルに対応しているため、コピーせずに読み込める
+            result[field] = np.frombuffer(column, dtype=dtype[FIELDS.index(field)][1])
+        return result
+
+
+class ViewCountSampler(object):
+    """ 配信中のライブの視聴者数を一定間隔で記録する
+
+    ライブIDを指定した場合は :meth:`API.get_movie_info <pytwitcasting.api.API.get_movie_info>` 、
+    ユーザを指定した場合は現在のライブを取得し、ライブごとの :class:`RingBuffer` に追加する
+
+    Usage::
+
+      >>> from pytwitcasting.sampler import ViewCountSampler
+      >>> sampler = ViewCountSampler(api, interval=5)
+      >>> sampler.add_movie('189037369')
+      >>> sampler.add_user('twitcasting_jp')
+      >>> sampler.run(duration=600)
+      >>> sampler.buffers['189037369'].rollup(60)
+    """
+
+    def __init__(self, api, capacity=4320, interval=5.0, max_workers=8, drop_ended=True):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param capacity: (optional) ライブごとに保持するサンプル数
+        :type capacity: int
+        :param interval: (optional) 取得する間隔(秒)
+        :type interval: float
+        :param max_workers: (optional) 並列に送信するリクエスト数
+        :type max_workers: int
+        :param drop_ended: (optional) 終了したライブを取得対象から外すかどうか
+        :type drop_ended: bool
+        """
+        self.api = api
+        self.capacity = capacity
+        self.interval = interval
+        self.max_workers = max_workers
+        self.drop_ended = drop_ended
+        self.buffers = {}
+        self._movie_ids = set()
+        self._user_ids = set()
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+
+    def add_movie(self, movie_id):
+        """ ライブIDを取得対象に追加する
+
+        :param movie_id: ライブID
+        :type movie_id: str
+        """
+        with self._lock:
+            self._movie_ids.add(str(movie_id))
+
+    def add_user(self, user_id):
+        """ ユーザの現在のライブを取得対象に追加する
+
+        :param user_id: ユーザのidかscreen_id
+        :type user_id: str
+        """
+        with self._lock:
+            self._user_ids.add(user_id)
+
+    def remove(self, id):
+        """ 取得対象から外す。記録済みのサンプルは残す
+
+        :param id: ライブIDかユーザのid
+        :type id: str
+        """
+        with self._lock:
+            self._movie_ids.discard(str(id))
+            self._user_ids.discard(id)
+
+    def _buffer(self, movie_id):
+        with self._lock:
+            buffer = self.buffers.get(movie_id)
+            if buffer is None:
+                buffer = self.buffers[movie_id] = RingBuffer(self.capacity)
+            return buffer
+
+    def _fetch(self, kind, id):
+        try:
+            if kind == 'movie':
+                return kind, id, self.api.get_movie_info(id)['movie']
+            return kind, id, self.api._get_current_live(id)['movie']
+        except TwitcastingException as e:
+            if e.http_status != 404:
+                with self._lock:
+                    self._counts['errors'] += 1
+            # ユーザが配信していない場合など
+            return kind, id, None
+        except (TwitcastingError, requests.exceptions.RequestException):
+            # 一時的な失敗でほかのライブの記録を止めないように、次回また取得する
+            with self._lock:
+                self._counts['errors'] += 1
+            return kind, id, None
+
+    def sample(self):
+        """ すべての取得対象を1回ずつ取得して記録する
+
+        :return: 記録したサンプル数
+        :rtype: int
+        """
+        with self._lock:
+            targets = [('movie', id) for id in self._movie_ids] + [('user', id) for id in self._user_ids]
+
+        count = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for kind, id, movie in executor.map(lambda target: self._fetch(*target), targets):
+                if movie is None:
+                    continue
+                if kind == 'movie' and self.drop_ended and not movie.is_live:
+                    self.remove(id)
+                    continue
+                self._buffer(str(movie.id)).append(time.time(), movie.current_view_count,
+                                                   movie.total_view_count, movie.comment_count,
+                                                   getattr(movie, 'max_view_count', 0))
+                count += 1
+        with self._lock:
+            self._counts['samples'] += count
+        return count
+
+    def metrics(self):
+        """ 記録の統計
+
+        :return: - ``samples`` : 記録したサンプル数
+                 - ``errors`` : 取得に失敗した回数(配信していないユーザは含まない)
+        :rtype: dict
+        """
+        with self._lock:
+            return {key: self._counts[key] for key in ('samples', 'errors')}
+
+    def run(self, duration=None, stop_event=None):
+        """ ``interval`` 秒ごとに :meth:`sample` を呼び出す
+
+        :param duration: (optional) 実行する秒数。省略時は ``stop_event`` がセットされるまで
+        :type duration: float
+        :param stop_event: (optional) 止めるための :class:`threading.Event`
+        :type stop_event: :class:`threading.Event`
+        """
+        stop_event = stop_event or threading.Event()
+        deadline = time.monotonic() + duration if duration is not None else None
+        while not stop_event.is_set():
+            started = time.monotonic()
+            self.sample()
+            if deadline is not None and started + self.interval >= deadline:
+                break
+            stop_event.wait(max(self.interval - (time.monotonic() - started), 0))
@@ -0,0 +1,164 @@
+import mmap
+import os
+import pickle
+
+from pytwitcasting.error import TwitcastingError
+from pytwitcasting.models import Model, ModelFactory
+from pytwitcasting.parsers import ModelParser
+
+
+# ファイルの先頭
+MAGIC = b'PYTCSNAP'
+VERSION = 1
+
+# モデルのクラスと、 :class:`ModelParser <pytwitcasting.parsers.ModelParser>` に渡すparse_type
+_PARSE_TYPES = {model: parse_type for parse_type, model in vars(ModelFactory).items()
+                if isinstance(model, type) and issubclass(model, Model)}
+
+
+def _parse_type(model):
+    """ モデルのparse_typeを返す。 :class:`Supporter <pytwitcasting.models.Supporter>` などの子クラスは親クラスのもの """
+    for cls in type(model).__mro__:
+        if cls in _PARSE_TYPES:
+            return _PARSE_TYPES[cls]
+    return None
+
+
+class ModelCache(object):
+    """ モデルのdict( :meth:`API.get_movies_info <pytwitcasting.api.API.get_movies_info>` の ``users`` など)を
+    :class:`Snapshot` で保存するためのラッパー
+
+    モデルは :class:`API <pytwitcasting.api.API>` を参照しているため、レスポンスのdictだけを保存し、
+    復元するときに ``api`` を使ってモデルを作り直す
+    """
+
+    def __init__(self, api, mapping):
+        """
+        :param api: 復元したモデルに渡す :class:`API <pytwitcasting.api.API>`
+        :param mapping: キーとモデルのdict
+        :type mapping: dict
+        """
+        self.api = api
+        self.mapping = mapping
+
+    def snapshot_state(self):
+        states = {}
+        for key, model in list(self.mapping.items()):
+            parse_type = _parse_type(model)
+            if parse_type is not None:
+                states[key] = (parse_type, model._json)
+        return states
+
+    def restore_state(self, state):
+        parser = ModelParser()
+        for key, (parse_type, payload) in state.items():
+            self.mapping.setdefault(key, parser.parse(self.api, payload, parse_type=parse_type, payload_list=False))
+
+
+class Snapshot(object):
+    """ キャッシュやスケジューラーの状態を1つのファイルに保存し、起動時に復元する
+
+    ``snapshot_state()`` と ``restore_state(state)`` を持つオブジェクトを名前を付けて登録する。
+    :class:`API <pytwitcasting.api.API>` (レート制限の状態)、
+    :class:`CommentTailer <pytwitcasting.events.CommentTailer>` (ライブごとの最後のコメントID)、
+    :class:`LiveMonitor <pytwitcasting.events.LiveMonitor>` (ユーザごとの配信状態)、
+    :class:`ThumbnailCapture <pytwitcasting.thumbnails.ThumbnailCapture>` 、
+    :class:`SeenSet <pytwitcasting.dedupe.SeenSet>` が対応している。
+    モデルのdictは :class:`ModelCache` で包むか、そのまま登録する
+
+    ファイルはpickleで、読み込むときはメモリマップしてそのまま復元するため、大きなファイルでも読み込みが速い。
+    書き込みは一時ファイルから置き換えるため、途中で落ちても前回のファイルは壊れない
+
+    Usage::
+
+      >>> from pytwitcasting.snapshot import Snapshot
+      >>> snapshot = Snapshot('state.snap', api)
+      >>> snapshot.register('api', api)
+      >>> snapshot.register('tailer', tailer)
+      >>> snapshot.register('monitor', monitor)
+      >>> snapshot.register('seen', seen)
+      >>> snapshot.restore()
+      ['api', 'tailer', 'monitor', 'seen']
+      >>> # 終了時
+      >>> snapshot.save()
+    """
+
+    def __init__(self, path, api=None):
+        """
+        :param path: ファイルのパス
+        :type path: str
+        :param api: (optional) そのまま登録したモデルのdictを復元するときに使う :class:`API <pytwitcasting.api.API>`
+        """
+        self.path = path
+        self.api = api
+        self._components = {}
+
+    def register(self, name, component):
+        """ 保存するオブジェクトを登録する
+
+        :param name: ファイル内での名前
+        :type name: str
+        :param component: ``snapshot_state()`` と ``restore_state(state)`` を持つオブジェクトか、モデルのdict
+        :return: ``component``
+        """
+        if isinstance(component, dict):
+            component = ModelCache(self.api, component)
+        elif not (hasattr(component, 'snapshot_state') and hasattr(component, 'restore_state')):
+            raise TypeError(f'{type(component).__name__} does not support snapshots')
+        self._components[name] = component
+        return component
+
+    def save(self):
+        """ 登録したオブジェクトの状態をファイルに保存する
+
+        :return: 書き込んだバイト数
+        :rtype: int
+        """
+        states = {name: component.snapshot_state() for name, component in self._components.items()}
+        data = pickle.dumps({'version': VERSION, 'states': states}, protocol=pickle.HIGHEST_PROTOCOL)
+
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC)
+            f.write(data)
+        os.replace(tmp, self.path)
+        return len(MAGIC) + len(data)
+
+    def load(self):
+        """ ファイルを読み込む。ファイルがなければ ``{}``
+
+        :return: 名前と状態のdict
+        :rtype: dict
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return {}
+        with f:
+            if os.fstat(f.fileno()).st_size <= len(MAGIC):
+                raise TwitcastingError(f'{self.path} is not a snapshot')
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                if m[:len(MAGIC)] != MAGIC:
+                    raise TwitcastingError(f'{self.path} is not a snapshot')
+                # コピーせずにメモリマップから直接復元する
+                with memoryview(m) as view:
+                    data = pickle.loads(view[len(MAGIC):])
+        if data.get('version') != VERSION:
+            raise TwitcastingError(f'Unsupported snapshot version: {data.get("version")}')
+        return data['states']
+
+    def restore(self):
+        """ ファイルから登録したオブジェクトの状態を復元する
+
+        ファイルにない名前や、登録されていない名前は無視する
+
+        :return: 復元した名前の配列
+        :rtype: list[str]
+        """
+        states = self.load()
+        restored = []
+        for name, component in self._components.items():
+            if name in states:
+                component.restore_state(states[name])
+                restored.append(name)
+        return restored
@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+
+
+class SQLiteStore(object):
+    """ 複数のプロセスとスレッドで共有するSQLiteのファイルを使うクラスの基底クラス
+
+    接続はスレッドごとに作り、WALモードで開く。
+    pickleでほかのプロセスに渡すときは接続を渡さず、渡した先で作り直す
+
+    サブクラスは ``__init__`` で :meth:`_init_store` を呼び出す
+    """
+
+    def _init_store(self, path, schema):
+        """ 接続を用意し、テーブルを作る
+
+        :param path: SQLiteのファイルのパス
+        :type path: str
+        :param schema: テーブルを作るSQL
+        :type schema: str
+        :return: 今のスレッドの接続
+        :rtype: :class:`sqlite3.Connection`
+        """
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(schema)
+        return conn
+
+    def __getstate__(self):
+        # 接続はプロセスごとに作り直す
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def _connect(self):
+        """ スレッドごとの接続を返す """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, func):
+        """ 書き込みロックを取ってから ``func(conn)`` を実行する """
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func(conn)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+        return result
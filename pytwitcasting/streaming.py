@@ -0,0 +1,121 @@
+import codecs
+import json
+
+from pytwitcasting.error import TwitcastingError
+
+
+WHITESPACE = ' \t\n\r'
+
+# 値の後に続く文字
+DELIMITERS = WHITESPACE + ',]}'
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer(object):
+    """ 受信したバイト列の断片を文字列としてためておく """
+
+    def __init__(self, chunks, encoding):
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+
+    def more(self):
+        """ 次の断片を読み込む。もうなければ ``False`` """
+        if self.eof:
+            return False
+        # 読み終わった部分は捨てる
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        for chunk in self._chunks:
+            if chunk:
+                self.text += self._decoder.decode(chunk)
+                return True
+        self.text += self._decoder.decode(b'', final=True)
+        self.eof = True
+        return True
+
+    def peek(self):
+        """ 空白を読み飛ばして次の文字を返す。終端なら ``''`` """
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.more():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise TwitcastingError(f'Invalid JSON: expected {char!r} at {self.text[self.pos:self.pos + 20]!r}')
+        self.pos += 1
+
+    def value(self):
+        """ 次のJSONの値を1つ読み込む。途中で切れている場合は続きを読み込んでからやり直す """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except ValueError:
+                if not self.more():
+                    raise
+                continue
+            # 数値は断片の境目で切れていても("1." や "1e" など)値として読めてしまうため、
+            # 区切り文字が続くことを確認できるまで続きを読み込む
+            if not self.eof and (end == len(self.text) or
+                                 (isinstance(value, (int, float)) and not isinstance(value, bool)
+                                  and self.text[end] not in DELIMITERS)):
+                self.more()
+                continue
+            self.pos = end
+            return value
+
+
+def iter_array_items(chunks, key, meta=None, encoding='utf-8'):
+    """ JSONオブジェクトのバイト列を受信しながら、トップレベルの ``key`` の配列の要素を1つずつ返す
+
+    レスポンス全体を受信するのを待たずに、要素が1つ読み込めた時点で返すため、
+    最初の要素がすぐに使え、メモリの使用量も要素1つ分で済む
+
+    :param chunks: バイト列の断片のイテレータ( :meth:`requests.Response.iter_content` など)
+    :param key: 配列のキー
+    :type key: str
+    :param meta: (optional) 配列以外のトップレベルの値を入れるdict
+    :type meta: dict
+    :param encoding: (optional) 文字コード
+    :type encoding: str
+    :return: 配列の要素を返すジェネレータ
+    """
+    buf = _Buffer(chunks, encoding)
+    buf.expect('{')
+    while True:
+        char = buf.peek()
+        if char == '}':
+            return
+        if char == ',':
+            buf.pos += 1
+            continue
+        if char != '"':
+            raise TwitcastingError(f'Invalid JSON: unexpected {char!r}')
+
+        name = buf.value()
+        buf.expect(':')
+        if name == key and buf.peek() == '[':
+            buf.pos += 1
+            while True:
+                char = buf.peek()
+                if char == ']':
+                    buf.pos += 1
+                    break
+                if char == ',':
+                    buf.pos += 1
+                    continue
+                if not char:
+                    raise TwitcastingError('Invalid JSON: unexpected end of data')
+                yield buf.value()
+        else:
+            value = buf.value()
+            if meta is not None:
+                meta[name] = value
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+class MovieSyncer(object):
+    """ ユーザごとの取得済みの最新のライブ(ハイウォーターマーク)を保存し、新しい過去ライブだけを取得する
+
+    Usage::
+
+      >>> from pytwitcasting.sync import MovieSyncer
+      >>> syncer = MovieSyncer(api, 'movies_hwm.json')
+      >>> res = syncer.sync_many(['twitcasting_jp', 'tamago324_pad'], on_movies=store)
+      >>> syncer.save()
+    """
+
+    def __init__(self, api, path=None, max_workers=8):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param path: (optional) ハイウォーターマークを保存するJSONファイルのパス。あれば読み込む
+        :type path: str
+        :param max_workers: (optional) 並列に同期するユーザ数
+        :type max_workers: int
+        """
+        self.api = api
+        self.path = path
+        self.max_workers = max_workers
+        # user_id -> {'movie_id': ..., 'created': UNIX時間}
+        self.marks = {}
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.marks = json.load(f)
+
+    def _fetch(self, user_id):
+        """ 新しい過去ライブと、それを処理し終えたときのハイウォーターマークを返す
+
+        :return: ``(movies, mark)`` 。新しいライブがなければ ``mark`` は ``None``
+        """
+        with self._lock:
+            mark = self.marks.get(user_id, {})
+
+        movies = self.api.sync_movies(user_id, since_movie_id=mark.get('movie_id'))
+        if not movies:
+            return movies, None
+        latest = movies[0]
+        return movies, {'movie_id': str(latest.id), 'created': int(latest.created.timestamp())}
+
+    def _commit(self, user_id, mark):
+        if mark is not None:
+            with self._lock:
+                self.marks[user_id] = mark
+
+    def sync(self, user, on_movies=None):
+        """ 1人のユーザの新しい過去ライブを取得し、ハイウォーターマークを進める
+
+        ``on_movies`` を指定した場合は、それが例外を送出せずに返ってから進める
+
+        :param user: :class:`User <pytwitcasting.models.User>` かユーザのid
+        :type user: :class:`User <pytwitcasting.models.User>` or str
+        :param on_movies: (optional) ``on_movies(user_id, movies)`` の形で呼び出される関数
+        :return: :class:`Movie <pytwitcasting.models.Movie>` の配列(新しい順)
+        :rtype: list[ :class:`Movie <pytwitcasting.models.Movie>` ]
+        """
+        user_id = str(getattr(user, 'id', user))
+        movies, mark = self._fetch(user_id)
+        if on_movies and movies:
+            on_movies(user_id, movies)
+        self._commit(user_id, mark)
+        return movies
+
+    def sync_many(self, users, on_movies=None):
+        """ 複数のユーザを並列に同期する
+
+        ユーザごとのハイウォーターマークは、 ``on_movies`` が返ってから進める。
+        取得や ``on_movies`` で失敗したユーザは進めずに ``failed`` に入れ、ほかのユーザの同期は続ける
+
+        :param users: :class:`User <pytwitcasting.models.User>` かユーザのidの配列
+        :param on_movies: (optional) ``on_movies(user_id, movies)`` の形で呼び出される関数
+        :return: - ``movies`` : ユーザのidと新しい :class:`Movie <pytwitcasting.models.Movie>` の配列のdict
+                 - ``failed`` : 失敗したユーザのidと例外のdict
+        :rtype: dict
+        """
+        def fetch(user):
+            user_id = str(getattr(user, 'id', user))
+            try:
+                return user_id, self._fetch(user_id), None
+            except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException) as e:
+                return user_id, None, e
+
+        result = {'movies': {}, 'failed': {}}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for user_id, fetched, error in executor.map(fetch, users):
+                if error is not None:
+                    result['failed'][user_id] = error
+                    continue
+                movies, mark = fetched
+                if on_movies and movies:
+                    try:
+                        on_movies(user_id, movies)
+                    except Exception as e:
+                        # 渡せなかったライブは次回また取得する
+                        result['failed'][user_id] = e
+                        continue
+                self._commit(user_id, mark)
+                result['movies'][user_id] = movies
+        return result
+
+    def save(self, path=None):
+        """ ハイウォーターマークをJSONファイルに保存する
+
+        :param path: (optional) ファイルのパス。省略時はコンストラクタの ``path``
+        :type path: str
+        """
+        path = path or self.path
+        with self._lock:
+            data = json.dumps(self.marks, separators=(',', ':'))
+        # 書き込み途中で落ちても壊れないように、一時ファイルから置き換える
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(data)
+        os.replace(tmp, path)
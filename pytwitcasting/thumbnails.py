@@ -0,0 +1,246 @@
+import collections
+import hashlib
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+
+
+# 知覚ハッシュのビット数(8x8)
+HASH_BITS = 64
+
+_pil = None
+
+
+def _image_module():
+    """ `Pillow` があれば ``PIL.Image`` を返す。なければ ``False`` """
+    global _pil
+    if _pil is None:
+        try:
+            from PIL import Image
+            _pil = Image
+        except ImportError:
+            _pil = False
+    return _pil
+
+
+def image_hash(data):
+    """ 画像のハッシュを計算する
+
+    `Pillow` があれば差分ハッシュ(dHash)を、なければ内容のダイジェストを返す。
+    dHashは似た画像ほどハミング距離が小さくなる
+
+    :param data: 画像のバイト列
+    :type data: bytes
+    :return: ``('dhash', int)`` or ``('digest', str)``
+    :rtype: tuple
+    """
+    Image = _image_module()
+    if Image:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                pixels = list(image.convert('L').resize((9, 8)).getdata())
+        except (OSError, ValueError):
+            pass
+        else:
+            value = 0
+            for row in range(8):
+                for col in range(8):
+                    value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+            return 'dhash', value
+    return 'digest', hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def hash_distance(a, b):
+    """ 2つのハッシュの距離を返す
+
+    dHash同士ならハミング距離、それ以外は同じなら ``0`` 、違えば :data:`HASH_BITS`
+
+    :param a: :func:`image_hash` の戻り値
+    :param b: :func:`image_hash` の戻り値
+    :rtype: int
+    """
+    if a is None or b is None:
+        return HASH_BITS
+    if a[0] == b[0] == 'dhash':
+        return bin(a[1] ^ b[1]).count('1')
+    return 0 if a == b else HASH_BITS
+
+
+class ThumbnailCapture(object):
+    """ 配信中のライブのサムネイルを定期的に取得し、前回保存したものと違う場合だけ保存する
+
+    前回保存したサムネイルとの :func:`hash_distance` が ``threshold`` 以下なら保存しない。
+    取得する間隔はユーザごとに ``min_interval`` から ``max_interval`` の間で変え、
+    変化があれば半分に、なければ ``backoff`` 倍にする
+
+    ユーザごとに覚えておくのはハッシュと間隔だけで、画像は保存し終えたら手放すため、
+    メモリの使用量は画像 ``max_workers`` 枚分とユーザ数に比例する分に収まる
+
+    Usage::
+
+      >>> from pytwitcasting.thumbnails import ThumbnailCapture
+      >>> def store(user_id, image, captured_at):
+      ...     with open(f'{user_id}_{int(captured_at)}.{image["file_ext"]}', 'wb') as f:
+      ...         f.write(image['bytes_data'])
+      >>> capture = ThumbnailCapture(api, store, min_interval=10)
+      >>> capture.add('twitcasting_jp')
+      >>> capture.run()
+    """
+
+    def __init__(self, api, store, threshold=5, min_interval=10.0, max_interval=120.0, backoff=1.5,
+                 size='small', max_workers=8):
+        """
+        :param api: :class:`API <pytwitcasting.api.API>`
+        :param store: 保存するときに ``store(user_id, image, captured_at)`` で呼び出す。
+                      ``image`` は ``bytes_data`` と ``file_ext`` のdict
+        :param threshold: (optional) 保存しないハッシュの距離の上限. 0 ~ 64
+        :type threshold: int
+        :param min_interval: (optional) 取得する間隔の下限(秒)
+        :type min_interval: float
+        :param max_interval: (optional) 取得する間隔の上限(秒)
+        :type max_interval: float
+        :param backoff: (optional) 変化がなかったときに間隔を何倍にするか
+        :type backoff: float
+        :param size: (optional) 画像サイズ。``'small'`` or ``'large'``
+        :type size: str
+        :param max_workers: (optional) 並列に取得するユーザ数
+        :type max_workers: int
+        """
+        self.api = api
+        self.store = store
+        self.threshold = threshold
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.size = size
+        self.max_workers = max_workers
+        # user_id -> {'hash': 前回保存したハッシュ, 'interval': 秒, 'next_at': UNIX時間}
+        self.states = {}
+        self._lock = threading.Lock()
+        self._counts = collections.Counter()
+
+    def add(self, user_id):
+        """ ユーザを対象に追加する
+
+        :param user_id: ユーザのidかscreen_id
+        :type user_id: str
+        """
+        with self._lock:
+            self.states.setdefault(user_id, {'hash': None, 'interval': self.min_interval, 'next_at': 0.0})
+
+    def remove(self, user_id):
+        """ ユーザを対象から外す
+
+        :param user_id: ユーザのidかscreen_id
+        :type user_id: str
+        """
+        with self._lock:
+            self.states.pop(user_id, None)
+
+    def snapshot_state(self):
+        """ :class:`Snapshot <pytwitcasting.snapshot.Snapshot>` で保存する状態を返す """
+        with self._lock:
+            return {user_id: dict(state) for user_id, state in self.states.items()}
+
+    def restore_state(self, state):
+        """ :meth:`snapshot_state` の状態に戻す。 :meth:`add` で追加済みのユーザだけ反映する """
+        with self._lock:
+            for user_id, user_state in state.items():
+                if user_id in self.states:
+                    self.states[user_id] = dict(user_state)
+
+    def _capture(self, user_id, previous):
+        """ 1人分を取得して、変化していれば保存する
+
+        :return: ``(保存したハッシュかNone, 変化したかどうか)``
+        """
+        try:
+            image = self.api._get_live_thumbnail_image(user_id, size=self.size, position='latest')
+        except (TwitcastingException, TwitcastingError, requests.exceptions.RequestException):
+            # 一時的な失敗でもほかのユーザの取得は続け、このユーザは間隔をあけてから取得し直す
+            with self._lock:
+                self._counts['errors'] += 1
+            return None, False
+        if not image:
+            return None, False
+
+        with self._lock:
+            self._counts['fetched'] += 1
+        current = image_hash(image['bytes_data'])
+        if previous is not None and hash_distance(previous, current) <= self.threshold:
+            with self._lock:
+                self._counts['skipped'] += 1
+                self._counts['skipped_bytes'] += len(image['bytes_data'])
+            return None, False
+
+        self.store(user_id, image, time.time())
+        with self._lock:
+            self._counts['stored'] += 1
+        return current, True
+
+    def poll(self, now=None):
+        """ 取得する時刻になったユーザを並列で取得する
+
+        :param now: (optional) 現在のUNIX時間
+        :type now: float
+        :return: 保存した数
+        :rtype: int
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [(user_id, state['hash']) for user_id, state in self.states.items() if state['next_at'] <= now]
+
+        stored = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for (user_id, _), (current, changed) in zip(due, executor.map(lambda args: self._capture(*args), due)):
+                with self._lock:
+                    state = self.states.get(user_id)
+                    if state is None:
+                        continue
+                    if changed:
+                        state['hash'] = current
+                        state['interval'] = max(self.min_interval, state['interval'] / 2)
+                        stored += 1
+                    else:
+                        state['interval'] = min(self.max_interval, state['interval'] * self.backoff)
+                    state['next_at'] = now + state['interval']
+        return stored
+
+    def next_at(self):
+        """ 次に取得するユーザの時刻を返す。対象がいなければ ``None``
+
+        :rtype: float or None
+        """
+        with self._lock:
+            return min((state['next_at'] for state in self.states.values()), default=None)
+
+    def run(self, stop_event=None):
+        """ 取得する時刻になったユーザから順に :meth:`poll` する
+
+        :param stop_event: (optional) 止めるための :class:`threading.Event`
+        :type stop_event: :class:`threading.Event`
+        """
+        stop_event = stop_event or threading.Event()
+        while not stop_event.is_set():
+            self.poll()
+            next_at = self.next_at()
+            wait = self.min_interval if next_at is None else next_at - time.time()
+            stop_event.wait(max(wait, 0.05))
+
+    def metrics(self):
+        """ 取得と保存の統計
+
+        :return: - ``fetched`` : 取得した数
+                 - ``stored`` : 保存した数
+                 - ``skipped`` : 変化がなく保存しなかった数
+                 - ``skipped_bytes`` : 保存しなかった画像の合計バイト数
+                 - ``errors`` : 取得に失敗した数
+        :rtype: dict
+        """
+        with self._lock:
+            return {key: self._counts[key] for key in ('fetched', 'stored', 'skipped', 'skipped_bytes', 'errors')}
@@ -2,12 +2,6 @@
 from datetime import datetime
 
 import os
-import webbrowser
-
-from pytwitcasting.auth import (
-    TwitcastingImplicit,
-    TwitcastingOauth
-)
 
 
 def parse_datetime(unix_time):
@@ -32,6 +26,10 @@ def get_access_token_prompt_implicit(client_id=None):
     :rtype: str
     """
 
+    # 認証するときだけ必要なため、ここでimportする
+    import webbrowser
+    from pytwitcasting.auth import TwitcastingImplicit
+
     if not client_id:
         client_id = os.environ['TWITCASTING_CLIENT_ID']
 
@@ -72,6 +70,10 @@ def get_access_token_prompt_oauth(client_id=None, client_secret=None, redirect_u
     :return: アクセストークン
     :rtype: str
     """
+    # 認証するときだけ必要なため、ここでimportする
+    import webbrowser
+    from pytwitcasting.auth import TwitcastingOauth
+
     if not client_id:
         client_id = os.environ['TWITCASTING_CLIENT_ID']
 
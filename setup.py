@@ -21,6 +21,9 @@ setuptools.setup(
     long_description_content_type='text/markdown',
     url='https://github.com/tamago324/PyTwitcasting',
     packages=setuptools.find_packages(),
+    entry_points={
+        'console_scripts': ['pytwitcasting = pytwitcasting.cli:main'],
+    },
     install_requires=['requests>=2.0.1,<3.0.0'],
     python_requires='!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*'
 )
@@ -0,0 +1,73 @@
+import pytest
+import requests
+
+from pytwitcasting.api import API, create_session
+from pytwitcasting.dispatch import BULK, PriorityDispatcher
+from pytwitcasting.error import TwitcastingException
+from pytwitcasting.resilience import CircuitBreaker, RetryPolicy
+
+
+class _Response(object):
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {'Content-Type': 'application/json'}
+        self.text = '{}' if status_code == 200 else 'null'
+        self.url = 'https://apiv2.twitcasting.tv/users/a'
+
+    def json(self):
+        return {'user': {'id': 'a', 'screen_id': 'a'}}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(self.status_code)
+
+    def close(self):
+        pass
+
+
+class _Session(requests.Session):
+    """ 指定したステータスコードを順に返す """
+
+    def __init__(self, *statuses):
+        super().__init__()
+        self.statuses = list(statuses)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        return _Response(self.statuses.pop(0))
+
+
+def test_each_retry_is_dispatched_separately():
+    dispatcher = PriorityDispatcher()
+    session = _Session(503, 503, 200)
+    api = API('token', requests_session=session, dispatcher=dispatcher,
+              retry_policy=RetryPolicy(max_retries=3, base=0.001, cap=0.001)).with_priority(BULK)
+
+    assert api.get_user_info('a').screen_id == 'a'
+    assert session.calls == 3
+    # リトライも1回ずつ送信枠を使う
+    assert dispatcher.metrics()[BULK]['sent'] == 3
+    assert dispatcher.metrics()[BULK]['running'] == 0
+
+
+def test_rate_limited_responses_do_not_open_the_circuit():
+    breaker = CircuitBreaker(failure_threshold=2)
+    session = _Session(429, 429, 429, 200)
+    api = API('token', requests_session=session, circuit_breaker=breaker)
+
+    for _ in range(3):
+        with pytest.raises(TwitcastingException):
+            api.get_user_info('a')
+    assert api.get_user_info('a').screen_id == 'a'
+
+    assert session.calls == 4
+    assert [c['state'] for c in breaker.metrics().values()] == ['closed']
+    assert [c['failures'] for c in breaker.metrics().values()] == [0]
+
+
+def test_retry_policy_does_not_change_a_shared_session():
+    session = create_session(retries=3)
+    API('token', requests_session=session, retry_policy=RetryPolicy())
+
+    assert session.adapters['https://'].max_retries.total == 3
@@ -0,0 +1,82 @@
+import threading
+
+import requests
+
+from pytwitcasting.api import API
+
+
+class _Response(object):
+    def __init__(self, data):
+        self.status_code = 200
+        self.headers = {'Content-Type': 'application/json'}
+        self.text = 'json'
+        self.data = data
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _Session(requests.Session):
+    """ コメントを新しい順に返す。 ``posted_per_request`` 件ずつ、リクエストのたびに新しいコメントが増える """
+
+    def __init__(self, count, posted_per_request=0):
+        super().__init__()
+        self.ids = list(range(count, 0, -1))
+        self.posted_per_request = posted_per_request
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    def request(self, method, url, params=None, **kwargs):
+        with self.lock:
+            self.requests += 1
+            offset, limit = int(params['offset']), int(params['limit'])
+            page = self.ids[offset:offset + limit]
+            data = {'movie_id': '1', 'all_count': len(self.ids),
+                    'comments': [{'id': str(i), 'message': f'comment {i}'} for i in page]}
+            for _ in range(self.posted_per_request):
+                self.ids.insert(0, self.ids[0] + 1)
+        return _Response(data)
+
+
+def test_backfill_returns_every_comment_oldest_first():
+    session = _Session(1234)
+    api = API('token', requests_session=session)
+
+    ids = [int(c.id) for c in api.backfill_comments('1', max_workers=4)]
+
+    assert ids == list(range(1, 1235))
+
+
+def test_backfill_reports_progress():
+    api = API('token', requests_session=_Session(300))
+    progress = []
+
+    list(api.backfill_comments('1', max_workers=3, progress=lambda done, total: progress.append((done, total))))
+
+    assert progress[-1] == (300, 300)
+    assert all(total == 300 for _, total in progress)
+
+
+def test_backfill_survives_new_comments_during_the_backfill():
+    session = _Session(1000, posted_per_request=3)
+    api = API('token', requests_session=session)
+
+    ids = [int(c.id) for c in api.backfill_comments('1', max_workers=4)]
+
+    # 開始時点のコメントはすべて1回ずつ含まれる
+    assert ids == sorted(set(ids))
+    assert set(range(1, 1001)) <= set(ids)
+
+
+def test_backfill_of_a_short_movie_uses_one_request():
+    session = _Session(10)
+    api = API('token', requests_session=session)
+
+    assert len(list(api.backfill_comments('1'))) == 10
+    assert session.requests == 1
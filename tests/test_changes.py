@@ -0,0 +1,52 @@
+import os
+
+import requests
+
+from pytwitcasting.changes import UserChangeTracker
+
+
+class _User(object):
+    def __init__(self, user_id, level):
+        self.id = user_id
+        self.level = level
+        self.supporter_count = 0
+        self.supporting_count = 0
+        self.is_live = False
+        self.last_movie_id = None
+
+
+class _API(object):
+    def __init__(self):
+        self.levels = {'a': 1, 'b': 1}
+        self.down = set()
+
+    def get_user_info(self, user_id):
+        if user_id in self.down:
+            raise requests.exceptions.ConnectionError('down')
+        return _User(user_id, self.levels[user_id])
+
+
+def test_poll_reports_only_changed_fields_and_survives_errors():
+    api = _API()
+    deltas = []
+    tracker = UserChangeTracker(api, on_delta=deltas.append, emit_initial=False)
+    assert tracker.poll(['a', 'b'])['deltas'] == []
+
+    api.levels['b'] = 2
+    api.down.add('a')
+    res = tracker.poll(['a', 'b'])
+    assert isinstance(res['failed']['a'], requests.exceptions.ConnectionError)
+    assert [(d.user_id, d.changes) for d in deltas] == [('b', {'level': (1, 2)})]
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / 'state.json')
+    tracker = UserChangeTracker(emit_initial=False)
+    tracker.observe(_User('a', 1))
+    tracker.save(path)
+    assert os.listdir(tmp_path) == ['state.json']
+
+    loaded = UserChangeTracker()
+    loaded.load(path)
+    assert loaded.observe(_User('a', 1)) is None
+    assert loaded.observe(_User('a', 3)).changes == {'level': (1, 3)}
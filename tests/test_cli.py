@@ -0,0 +1,41 @@
+import json
+
+import requests
+
+from pytwitcasting import cli
+from pytwitcasting.api import API
+
+
+def _summary(capsys):
+    lines = capsys.readouterr().err.strip().splitlines()
+    return json.loads(lines[-1])
+
+
+def test_missing_input_file_reports_summary(capsys, tmp_path):
+    status = cli.main(['webhooks', str(tmp_path / 'missing.json'), '--client-id', 'a', '--client-secret', 'b', '-q'])
+    summary = _summary(capsys)
+    assert status == 1
+    assert summary['command'] == 'webhooks'
+    assert 'missing.json' in summary['error']
+
+
+def test_malformed_input_file_reports_summary(capsys, tmp_path):
+    path = tmp_path / 'desired.json'
+    path.write_text('{')
+    status = cli.main(['webhooks', str(path), '--client-id', 'a', '--client-secret', 'b', '-q'])
+    assert status == 1
+    assert 'error' in _summary(capsys)
+
+
+def test_users_records_network_errors_per_id(capsys, monkeypatch):
+    def get_user_info(self, user_id):
+        if user_id == 'down':
+            raise requests.exceptions.ConnectionError('down')
+        raise requests.exceptions.Timeout('slow')
+
+    monkeypatch.setattr(API, 'get_user_info', get_user_info)
+    status = cli.main(['users', 'down', 'slow', '--token', 't', '-q'])
+    summary = _summary(capsys)
+    assert status == 1
+    assert set(summary['failed']) == {'down', 'slow'}
+    assert summary['errors'] == 2
@@ -0,0 +1,60 @@
+import time
+
+from pytwitcasting.crawl import Crawler, CrawlQueue
+from pytwitcasting.error import TwitcastingException
+
+
+def test_expired_lease_cannot_complete_or_fail(tmp_path):
+    queue = CrawlQueue(str(tmp_path / 'crawl.db'), visibility_timeout=0.01, max_attempts=5)
+    queue.enqueue('user', {'user_id': 'a'})
+    first = queue.lease()
+    time.sleep(0.02)
+    second = queue.lease()
+
+    assert second.key == first.key
+    assert not queue.complete(first)
+    assert not queue.fail(first, 'late')
+    assert queue.complete(second)
+    assert queue.stats() == {'done': 1}
+
+
+def test_expired_lease_stops_at_max_attempts(tmp_path):
+    queue = CrawlQueue(str(tmp_path / 'crawl.db'), visibility_timeout=0.01, max_attempts=2)
+    queue.enqueue('user', {'user_id': 'a'})
+    assert queue.lease().attempts == 1
+    time.sleep(0.02)
+    assert queue.lease().attempts == 2
+    time.sleep(0.02)
+
+    assert queue.lease() is None
+    assert queue.stats() == {'dead': 1}
+
+
+class _User(object):
+    id = 'a'
+
+
+class _API(object):
+    def __init__(self):
+        self.calls = 0
+
+    def get_user_info(self, user_id):
+        self.calls += 1
+        if self.calls == 1:
+            raise TwitcastingException(503, 2000, 'unavailable')
+        return _User()
+
+    def _get_movies_by_user(self, user_id, offset=0, limit=50):
+        return {'movies': [], 'total_count': 0}
+
+
+def test_run_retries_a_failed_job_within_one_run(tmp_path):
+    queue = CrawlQueue(str(tmp_path / 'crawl.db'), retry_delay=0.05, max_attempts=3)
+    api = _API()
+    crawler = Crawler(api, queue, crawl_comments=False)
+    crawler.enqueue_user('a')
+
+    # 失敗、再実行で成功、過去ライブの1ページ目
+    assert crawler.run(idle_timeout=0.0) == 3
+    assert api.calls == 2
+    assert queue.stats() == {'done': 2}
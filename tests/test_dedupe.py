@@ -0,0 +1,82 @@
+import pytest
+
+from pytwitcasting.dedupe import BloomFilter, ScalableBloomFilter, SeenSet
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(i)
+
+    assert all(i in bloom for i in range(1000))
+
+
+def test_bloom_filter_false_positive_rate_is_near_error_rate():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(i)
+
+    false_positives = sum(1 for i in range(10000, 60000) if i in bloom)
+    assert false_positives / 50000 < 0.02
+
+
+def test_scalable_bloom_filter_grows():
+    bloom = ScalableBloomFilter(initial_capacity=100, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(i)
+
+    assert len(bloom.filters) > 1
+    assert all(i in bloom for i in range(1000))
+    assert bloom.add(5) is False
+
+
+def test_scalable_bloom_filter_stays_under_max_bytes():
+    bloom = ScalableBloomFilter(initial_capacity=1000, error_rate=0.01, max_bytes=4096)
+    for i in range(50000):
+        bloom.add(i)
+
+    assert bloom.nbytes <= 4096
+    # 古いキーは忘れるが、新しいキーは覚えている
+    assert all(i in bloom for i in range(49900, 50000))
+
+
+def test_seen_set_drops_duplicates():
+    seen = SeenSet(window=10, initial_capacity=100)
+
+    assert [seen.add(i) for i in (1, 2, 1, '2', 3)] == [True, True, False, False, True]
+    assert len(seen) == 3
+
+
+def test_seen_set_remembers_ids_older_than_the_window():
+    seen = SeenSet(window=10, initial_capacity=1000)
+    for i in range(500):
+        seen.add(i)
+
+    assert all(i in seen for i in range(500))
+    assert not any(seen.add(i) for i in range(500))
+
+
+@pytest.mark.parametrize('round_trip', ['save', 'snapshot'])
+def test_seen_set_round_trips(tmp_path, round_trip):
+    seen = SeenSet(window=10, initial_capacity=100)
+    for i in range(50):
+        seen.add(i)
+
+    if round_trip == 'save':
+        path = str(tmp_path / 'seen.bin')
+        seen.save(path)
+        restored = SeenSet.load(path)
+    else:
+        restored = SeenSet()
+        restored.restore_state(seen.snapshot_state())
+
+    assert all(i in restored for i in range(50))
+    assert restored.add(50) is True
+    assert restored.add(50) is False
+
+
+def test_load_without_a_file_creates_a_new_set(tmp_path):
+    seen = SeenSet.load(str(tmp_path / 'missing.bin'), window=5)
+
+    assert seen.window == 5
+    assert len(seen) == 0
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+from pytwitcasting.dispatch import BULK, INTERACTIVE, PriorityDispatcher
+from pytwitcasting.error import TwitcastingDeadlineError
+
+
+def _saturate(dispatcher, priorities, seconds):
+    """ 優先度ごとに4スレッドで送信し続け、送信できた回数を返す """
+    counts = dict.fromkeys(priorities, 0)
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(priority):
+        def count():
+            with lock:
+                counts[priority] += 1
+
+        while not stop.is_set():
+            try:
+                dispatcher.call(priority, count, timeout=0.1)
+            except TwitcastingDeadlineError:
+                pass
+
+    threads = [threading.Thread(target=worker, args=(priority,)) for priority in priorities * 4]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def test_interactive_keeps_share_after_running_alone():
+    # 送信枠は最初に400回分、以降は1秒あたり100回
+    dispatcher = PriorityDispatcher(rate=400, per=4.0, concurrency={INTERACTIVE: 4, BULK: 4})
+    # 先にinteractiveだけで送信枠を使い切る
+    for _ in range(400):
+        dispatcher.call(INTERACTIVE, lambda: None)
+
+    counts = _saturate(dispatcher, (INTERACTIVE, BULK), 0.5)
+
+    # 重み 8:1 で配分され、それまで待っていなかったbulkにinteractiveが後回しにされない
+    assert counts[INTERACTIVE] > counts[BULK] * 2
+    assert counts[BULK] >= 1
+
+
+def test_call_raises_when_deadline_passes():
+    dispatcher = PriorityDispatcher(rate=1, per=60.0)
+    dispatcher.call(BULK, lambda: None)
+    with pytest.raises(TwitcastingDeadlineError):
+        dispatcher.call(BULK, lambda: None, timeout=0.05)
+    assert dispatcher.metrics()[BULK]['dropped'] == 1
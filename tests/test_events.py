@@ -0,0 +1,94 @@
+import requests
+
+from pytwitcasting.events import LIVE_END, LIVE_START, EventBus, LiveMonitor
+
+
+class _User(object):
+    def __init__(self, is_live, last_movie_id):
+        self.is_live = is_live
+        self.last_movie_id = last_movie_id
+
+
+class _Movie(object):
+    def __init__(self, movie_id, is_live):
+        self.id = movie_id
+        self.is_live = is_live
+
+
+class _API(object):
+    def __init__(self):
+        self.live = False
+        self.fail_user = False
+        self.fail_movie = False
+
+    def get_user_info(self, user_id):
+        if self.fail_user:
+            raise requests.exceptions.ConnectionError('down')
+        return _User(self.live, '10')
+
+    def _get_current_live(self, user_id):
+        return {'movie': _Movie('10', True), 'broadcaster': _User(True, '10')}
+
+    def get_movie_info(self, movie_id):
+        if self.fail_movie:
+            raise requests.exceptions.ConnectionError('down')
+        return {'movie': _Movie(movie_id, False)}
+
+
+def _events(subscription):
+    events = []
+    while True:
+        event = subscription.get(timeout=0)
+        if event is None:
+            return events
+        events.append(event)
+
+
+def test_live_end_carries_the_ended_movie():
+    api = _API()
+    bus = EventBus()
+    subscription = bus.subscribe([LIVE_START, LIVE_END])
+    monitor = LiveMonitor(api, bus, interval=0.0)
+    monitor.add('user')
+
+    monitor.poll()
+    api.live = True
+    monitor.poll()
+    api.live = False
+    monitor.poll()
+    start, end = _events(subscription)
+
+    assert start.data['movie'].is_live
+    assert end.data['movie'].id == '10'
+    assert not end.data['movie'].is_live
+
+
+def test_live_end_falls_back_to_the_last_seen_movie():
+    api = _API()
+    bus = EventBus()
+    subscription = bus.subscribe([LIVE_END])
+    monitor = LiveMonitor(api, bus, interval=0.0)
+    monitor.add('user')
+
+    monitor.poll()
+    api.live = True
+    monitor.poll()
+    api.live = False
+    api.fail_movie = True
+    monitor.poll()
+    (end,) = _events(subscription)
+
+    assert end.data['movie'].id == '10'
+    assert end.data['movie'].is_live
+
+
+def test_network_errors_do_not_stop_polling():
+    api = _API()
+    monitor = LiveMonitor(api, EventBus(), interval=0.0, max_backoff=0.0)
+    monitor.add('user')
+    api.fail_user = True
+
+    assert monitor.poll() == 0
+    api.fail_user = False
+    monitor.poll()
+    assert monitor.states['user'] == {'is_live': False, 'last_movie_id': '10'}
@@ -0,0 +1,57 @@
+import json
+
+import requests
+
+from pytwitcasting.export import Exporter
+
+
+class _API(object):
+    def __init__(self, movies, comments, supporters=0):
+        self.movies = movies
+        self.comments = comments
+        self.supporters = supporters
+        self.open_streams = 0
+        self.max_open_streams = 0
+        self.limits = []
+
+    def _stream_call(self, url, params, key, meta=None):
+        if url.startswith('/users/down/'):
+            raise requests.exceptions.ConnectionError('down')
+        offset, limit = params['offset'], params['limit']
+        self.limits.append((key, limit))
+        if key == 'movies':
+            items, meta['total_count'] = self.movies[offset:offset + limit], len(self.movies)
+        elif key == 'comments':
+            items, meta['all_count'] = self.comments[offset:offset + limit], len(self.comments)
+        else:
+            # /supporters は1回に20件まで
+            everyone = [{'id': str(i)} for i in range(self.supporters)]
+            items, meta['total'] = everyone[offset:offset + min(limit, 20)], self.supporters
+
+        self.open_streams += 1
+        self.max_open_streams = max(self.max_open_streams, self.open_streams)
+        try:
+            yield from items
+        finally:
+            self.open_streams -= 1
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_export_pages_and_skips_failed_users(tmp_path):
+    movies = [{'id': str(i), 'comment_count': 1} for i in range(60)]
+    comments = [{'id': str(i), 'message': 'x'} for i in range(3)]
+    api = _API(movies, comments, supporters=45)
+    res = Exporter(api, str(tmp_path), max_workers=1).export(['a', 'down'])
+
+    assert res['movies'] == 60
+    assert res['comments'] == 180
+    assert res['supporters'] == 45
+    assert isinstance(res['errors']['down'], requests.exceptions.ConnectionError)
+    assert ('supporters', 20) in api.limits
+    assert len(_read(tmp_path / 'movies.ndjson')) == 60
+    # 過去ライブのページを読み切ってからコメントを取得する
+    assert api.max_open_streams == 1
@@ -0,0 +1,45 @@
+from pytwitcasting.index import CommentIndex
+
+
+def test_search_returns_each_comment_once(tmp_path):
+    index = CommentIndex(str(tmp_path / 'comments.idx'))
+    index.add('1', '10', 'こんにちは')
+    index.add('1', '10', 'こんにちは')
+    assert index.search('こんにち') == [('1', '10')]
+
+    index.flush()
+    index.add('1', '10', 'こんにちは')
+    assert index.search('こんにち') == [('1', '10')]
+    index.close()
+
+
+def test_comment_without_message(tmp_path):
+    index = CommentIndex(str(tmp_path / 'comments.idx'))
+    index.add('1', '10', None)
+    assert index.search('a') == []
+    index.flush()
+    assert index.search('a') == []
+    index.close()
+
+
+def test_search_matches_across_blocks_and_movies(tmp_path):
+    index = CommentIndex(str(tmp_path / 'comments.idx'), flush_size=3)
+    for i in range(10):
+        index.add(str(i % 2), str(i), f'こんにちは{i}' if i % 3 else 'こんばんは')
+    index.flush()
+
+    assert index.search('こんにちは') == [(str(i % 2), str(i)) for i in (8, 7, 5, 4, 2, 1)]
+    assert index.search('こんにちは', movie_id='1') == [('1', '7'), ('1', '5'), ('1', '1')]
+    assert index.search('こんにちは', limit=2) == [('0', '8'), ('1', '7')]
+    assert index.search('ちは3') == []
+    index.close()
+
+
+def test_search_without_messages_intersects_every_gram(tmp_path):
+    index = CommentIndex(str(tmp_path / 'comments.idx'), store_messages=False)
+    index.add('1', '1', 'あいう')
+    index.add('1', '2', 'いうえ')
+    index.flush()
+    assert index.search('あいう') == [('1', '1')]
+    assert index.search('いう') == [('1', '2'), ('1', '1')]
+    index.close()
@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import pytwitcasting
+
+
+def test_import_does_not_load_requests():
+    code = 'import sys, pytwitcasting; print("requests" in sys.modules)'
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(pytwitcasting.__file__)))
+
+    assert out.stdout.strip() == 'False'
+
+
+def test_every_submodule_is_listed():
+    package = os.path.dirname(pytwitcasting.__file__)
+    modules = {name[:-3] for name in os.listdir(package)
+               if name.endswith('.py') and not name.startswith('_')}
+
+    assert set(pytwitcasting._SUBMODULES) == modules
+
+
+def test_lazy_attributes_resolve():
+    from pytwitcasting.api import API
+
+    assert pytwitcasting.API is API
+    assert pytwitcasting.sync.__name__ == 'pytwitcasting.sync'
+    assert 'APIPool' in dir(pytwitcasting)
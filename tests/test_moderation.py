@@ -0,0 +1,130 @@
+import threading
+import time
+
+import requests
+
+from pytwitcasting.error import TwitcastingException
+from pytwitcasting.events import EventBus
+from pytwitcasting.moderation import KeywordMatcher, Moderator
+from pytwitcasting.models import Comment
+from pytwitcasting.ratelimit import RateLimit
+
+
+def test_matcher_finds_every_keyword_in_one_pass():
+    matcher = KeywordMatcher(['he', 'she', 'his', 'hers'])
+
+    assert matcher.search('ushers') == ['she', 'he', 'hers']
+    assert matcher.first('ushers') == 'she'
+    assert matcher.search('nothing') == []
+    assert matcher.first('nothing') is None
+
+
+def test_matcher_folds_width_case_and_kana():
+    matcher = KeywordMatcher(['ばか', 'NG'])
+
+    assert matcher.search('ﾊﾞｶじゃないの？ ｎｇ') == ['ばか', 'NG']
+    assert KeywordMatcher(['ばか'], fold_kana=False).search('バカ') == []
+
+
+def test_matcher_skips_empty_and_duplicate_words():
+    matcher = KeywordMatcher(['', 'NG', 'ｎｇ'])
+
+    assert len(matcher) == 1
+    assert matcher.words == ['NG']
+
+
+class _API(object):
+    """ ``errors`` にあるコメントIDの削除は、その例外で失敗する """
+
+    def __init__(self, errors=None, remaining=None):
+        self.errors = dict(errors or {})
+        self.deleted = []
+        self.lock = threading.Lock()
+        self.rate_limit = RateLimit()
+        if remaining is not None:
+            self.rate_limit.update({'X-RateLimit-Limit': '60', 'X-RateLimit-Remaining': str(remaining),
+                                    'X-RateLimit-Reset': str(int(time.time()) + 60)})
+
+    def _delete_comment(self, movie_id, comment_id):
+        with self.lock:
+            error = self.errors.pop(comment_id, None)
+            if error:
+                raise error
+            self.deleted.append(comment_id)
+        return {'comment_id': comment_id}
+
+
+def _comment(comment_id, message):
+    return Comment.parse(None, {'id': str(comment_id), 'message': message, 'from_user': {'id': 'u'}})
+
+
+def test_matching_comments_are_deleted():
+    api = _API()
+    moderator = Moderator(api, ['NG'])
+
+    assert moderator.submit(_comment(1, 'ｎｇワード'), movie_id='m') == 'NG'
+    assert moderator.submit(_comment(2, 'こんにちは'), movie_id='m') is None
+    assert moderator.flush() == 1
+
+    assert api.deleted == ['1']
+    assert moderator.metrics()['checked'] == 2
+    assert moderator.metrics()['deleted'] == 1
+
+
+def test_failed_deletions_are_retried_only_when_transient():
+    api = _API({'1': TwitcastingException(503, 1000, 'error'),
+                '2': requests.exceptions.ConnectionError('down'),
+                '3': TwitcastingException(403, 1000, 'error'),
+                '4': TwitcastingException(404, 1000, 'error')})
+    deleted = []
+    moderator = Moderator(api, ['NG'], on_delete=lambda movie_id, comment, word, error: deleted.append(comment.id))
+    for comment_id in range(1, 5):
+        moderator.submit(_comment(comment_id, 'NG'), movie_id='m')
+
+    moderator.flush()
+    assert moderator.metrics()['retried'] == 2
+    assert moderator.metrics()['pending'] == 2
+    assert sorted(deleted) == ['3', '4']
+
+    moderator.flush()
+    assert sorted(api.deleted) == ['1', '2']
+    assert {key: moderator.metrics()[key] for key in ('deleted', 'gone', 'failed', 'pending')} == \
+        {'deleted': 2, 'gone': 1, 'failed': 1, 'pending': 0}
+
+
+def test_deletions_keep_a_reserve_of_the_rate_limit():
+    api = _API(remaining=13)
+    moderator = Moderator(api, ['NG'], reserve=10)
+    for comment_id in range(5):
+        moderator.submit(_comment(comment_id, 'NG'), movie_id='m')
+
+    assert moderator.flush() == 3
+    assert moderator.metrics()['deferred'] == 2
+    assert moderator.metrics()['pending'] == 2
+
+
+def test_dry_run_does_not_delete():
+    api = _API()
+    moderator = Moderator(api, ['NG'], dry_run=True)
+    moderator.submit(_comment(1, 'NG'), movie_id='m')
+
+    moderator.flush()
+    assert api.deleted == []
+
+
+def test_run_deletes_until_the_subscription_closes():
+    api = _API()
+    comments = [_comment(i, 'NG' if i % 2 else 'ok') for i in range(10)]
+    for comment in comments:
+        comment.movie_id = 'm'
+    moderator = Moderator(api, ['NG'], batch_size=2, flush_interval=0.01)
+
+    bus = EventBus()
+    subscription = bus.subscribe(['comment'])
+    for comment in comments:
+        bus.publish('comment', comment)
+    subscription.close()
+
+    moderator.run(subscription)
+
+    assert sorted(api.deleted, key=int) == ['1', '3', '5', '7', '9']
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+from pytwitcasting.models import Comment, User
+from pytwitcasting.outbound import FAILED, SENT, CommentSender
+from pytwitcasting.resilience import RetryPolicy
+
+
+class _API(object):
+    """ 投稿したコメントを覚えておく。 ``failures`` の順に、投稿の結果を失敗にする
+
+    ``failures`` の要素は ``(例外, 投稿されたかどうか)``
+    """
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.comments = {}
+        self.posts = []
+        self.lock = threading.Lock()
+
+    def verify_credentials(self):
+        return {'user': User.parse(self, {'id': 'me'})}
+
+    def _post_comment(self, movie_id, comment, sns='none'):
+        with self.lock:
+            self.posts.append((movie_id, comment, time.monotonic()))
+            error, posted = self.failures.pop(0) if self.failures else (None, True)
+            if posted:
+                comments = self.comments.setdefault(movie_id, [])
+                posted = Comment.parse(self, {'id': str(len(self.posts)), 'message': comment,
+                                              'from_user': {'id': 'me'}, 'created': int(time.time())})
+                comments.insert(0, posted)
+        if error:
+            raise error
+        return {'movie_id': movie_id, 'comment': posted}
+
+    def _get_comments(self, movie_id, offset=0, limit=10, slice_id=None):
+        with self.lock:
+            comments = self.comments.get(movie_id, [])[offset:offset + limit]
+        return {'movie_id': movie_id, 'all_count': len(comments), 'comments': comments}
+
+
+def _sender(api, **kwargs):
+    kwargs.setdefault('retry_policy', RetryPolicy(max_retries=3, base=0.001, cap=0.001))
+    return CommentSender(api, **kwargs)
+
+
+def test_comments_to_one_movie_are_posted_in_order_and_spaced():
+    api = _API()
+    with _sender(api, per_movie_interval=0.05) as sender:
+        deliveries = [sender.send('1', f'message {i}') for i in range(3)]
+
+    assert [d.status for d in deliveries] == [SENT] * 3
+    assert [message for _, message, _ in api.posts] == ['message 0', 'message 1', 'message 2']
+    gaps = [b[2] - a[2] for a, b in zip(api.posts, api.posts[1:])]
+    assert min(gaps) >= 0.045
+
+
+def test_movies_are_posted_in_parallel():
+    api = _API()
+    with _sender(api, per_movie_interval=10) as sender:
+        deliveries = [sender.send(str(movie_id), 'hello') for movie_id in range(5)]
+        assert all(d.wait(2) for d in deliveries)
+
+    assert sender.metrics()['sent'] == 5
+
+
+def test_ambiguous_failure_that_was_posted_is_not_posted_twice():
+    api = _API([(TwitcastingException(500, 1000, 'error'), True)])
+    with _sender(api, per_movie_interval=0) as sender:
+        delivery = sender.send('1', 'hello')
+
+    assert delivery.status == SENT
+    assert delivery.recovered
+    assert len(api.posts) == 1
+    assert sender.metrics()['recovered'] == 1
+
+
+def test_ambiguous_failure_that_was_not_posted_is_retried():
+    api = _API([(requests.exceptions.ReadTimeout('timeout'), False)])
+    with _sender(api, per_movie_interval=0) as sender:
+        delivery = sender.send('1', 'hello')
+
+    assert delivery.status == SENT
+    assert not delivery.recovered
+    assert len(api.posts) == 2
+    assert len(api.comments['1']) == 1
+
+
+def test_client_errors_are_not_retried():
+    api = _API([(TwitcastingException(400, 1000, 'error'), False)])
+    with _sender(api, per_movie_interval=0) as sender:
+        delivery = sender.send('1', 'hello')
+
+    assert delivery.status == FAILED
+    assert delivery.error.http_status == 400
+    assert len(api.posts) == 1
+
+
+def test_rate_limited_comments_give_up_after_max_retries():
+    api = _API([(TwitcastingException(429, 1000, 'error'), False)] * 10)
+    with _sender(api, per_movie_interval=0) as sender:
+        delivery = sender.send('1', 'hello')
+
+    assert delivery.status == FAILED
+    assert len(api.posts) == 4
+    assert sender.metrics()['retries'] == 3
+
+
+def test_closed_sender_rejects_comments():
+    sender = _sender(_API())
+    sender.close()
+
+    with pytest.raises(TwitcastingError):
+        sender.send('1', 'hello')
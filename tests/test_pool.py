@@ -0,0 +1,98 @@
+import time
+
+import pytest
+
+from pytwitcasting.api import API
+from pytwitcasting.error import TwitcastingError, TwitcastingException
+from pytwitcasting.pool import APIPool
+
+
+class _API(API):
+    """ 指定したステータスで失敗するか、トークンを返す """
+
+    def __init__(self, access_token, remaining, status=None):
+        super().__init__(access_token=access_token)
+        self.rate_limit.update({'X-RateLimit-Limit': '60', 'X-RateLimit-Remaining': str(remaining),
+                                'X-RateLimit-Reset': str(int(time.time()) + 60)})
+        self.status = status
+        self.calls = 0
+
+    def get_user_info(self, user_id):
+        self.calls += 1
+        if self.status:
+            raise TwitcastingException(self.status, 1000, 'error')
+        return self._access_token
+
+
+def _pool(*apis):
+    pool = APIPool(bench_seconds=60)
+    for api in apis:
+        pool.add(api)
+    return pool
+
+
+def test_reads_go_to_the_token_with_the_most_remaining_calls():
+    pool = _pool(_API('a', remaining=5), _API('b', remaining=50), _API('c', remaining=10))
+
+    assert pool.get_user_info('twitcasting_jp') == 'b'
+
+
+def test_unauthorized_token_is_benched_and_the_call_is_retried():
+    broken = _API('broken', remaining=50, status=401)
+    pool = _pool(broken, _API('ok', remaining=5))
+
+    assert pool.get_user_info('twitcasting_jp') == 'ok'
+    assert pool.get_user_info('twitcasting_jp') == 'ok'
+    # 一度外したトークンは使わない
+    assert broken.calls == 1
+
+
+def test_rate_limited_token_is_benched_until_reset():
+    limited = _API('limited', remaining=50, status=429)
+    pool = _pool(limited, _API('ok', remaining=5))
+
+    assert pool.get_user_info('twitcasting_jp') == 'ok'
+    assert pool.get_user_info('twitcasting_jp') == 'ok'
+    assert limited.calls == 1
+
+
+def test_other_errors_are_raised_without_retry():
+    missing = _API('missing', remaining=50, status=404)
+    other = _API('other', remaining=5)
+    pool = _pool(missing, other)
+
+    with pytest.raises(TwitcastingException) as e:
+        pool.get_user_info('nobody')
+    assert e.value.http_status == 404
+    assert other.calls == 0
+
+
+def test_last_error_is_raised_when_every_token_fails():
+    pool = _pool(_API('a', remaining=5, status=401), _API('b', remaining=5, status=403))
+
+    with pytest.raises(TwitcastingException) as e:
+        pool.get_user_info('twitcasting_jp')
+    assert e.value.http_status in (401, 403)
+    # すべて外れている間は呼び出さない
+    with pytest.raises(TwitcastingError):
+        pool.get_user_info('twitcasting_jp')
+
+
+def test_api_for_returns_the_token_owner():
+    a, b = _API('a', remaining=5), _API('b', remaining=5)
+    pool = _pool(a, b)
+
+    assert pool.api_for('b') is b
+    with pytest.raises(TwitcastingError):
+        pool.api_for('c')
+
+
+def test_only_read_methods_are_spread():
+    with pytest.raises(AttributeError):
+        _pool().support_user
+
+
+def test_tokens_share_one_session():
+    pool = APIPool(access_tokens=['a', 'b'])
+
+    assert pool.apis[0]._session is pool.apis[1]._session
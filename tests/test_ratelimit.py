@@ -0,0 +1,129 @@
+import multiprocessing
+import pickle
+import threading
+import time
+
+import pytest
+
+from pytwitcasting.ratelimit import SharedRateLimit
+from pytwitcasting.storage import SQLiteStore
+
+
+def _headers(limit, remaining, reset):
+    return {'X-RateLimit-Limit': str(limit), 'X-RateLimit-Remaining': str(remaining),
+            'X-RateLimit-Reset': str(reset)}
+
+
+def _send(rate_limit, count):
+    for _ in range(count):
+        rate_limit.release(rate_limit.acquire())
+        rate_limit.consume()
+
+
+def test_state_is_shared_through_the_file(tmp_path):
+    path = str(tmp_path / 'rate.db')
+    reset = int(time.time()) + 60
+    SharedRateLimit(path, 'token').update(_headers(60, 30, reset))
+
+    other = SharedRateLimit(path, 'token')
+    assert (other.limit, other.remaining, other.reset) == (60, 30, reset)
+    # トークンが違えば別の状態
+    assert SharedRateLimit(path, 'another').available() == float('inf')
+
+
+def test_in_flight_requests_are_counted(tmp_path):
+    rate_limit = SharedRateLimit(str(tmp_path / 'rate.db'), 'token', margin=1)
+    rate_limit.update(_headers(60, 3, int(time.time()) + 60))
+
+    first = rate_limit.acquire(block=False)
+    second = rate_limit.acquire(block=False)
+    assert rate_limit.available() == 1
+    # 残り3回から送信中の2回とmarginの1回を引くと送信できない
+    assert rate_limit.acquire(block=False) is None
+
+    rate_limit.release(first)
+    rate_limit.release(second)
+    assert rate_limit.available() == 3
+
+
+def test_responses_out_of_order_keep_the_lowest_remaining(tmp_path):
+    rate_limit = SharedRateLimit(str(tmp_path / 'rate.db'), 'token')
+    reset = int(time.time()) + 60
+    rate_limit.update(_headers(60, 10, reset))
+    rate_limit.update(_headers(60, 12, reset))
+    assert rate_limit.remaining == 10
+
+    # 古い期間のレスポンスは無視する
+    rate_limit.update(_headers(60, 50, reset - 60))
+    assert rate_limit.remaining == 10
+
+
+def test_remaining_recovers_after_reset(tmp_path):
+    rate_limit = SharedRateLimit(str(tmp_path / 'rate.db'), 'token')
+    rate_limit.update(_headers(60, 0, int(time.time()) - 1))
+
+    assert rate_limit.remaining == 60
+    assert rate_limit.acquire(block=False) is not None
+
+
+def test_pickled_rate_limit_reconnects(tmp_path):
+    rate_limit = SharedRateLimit(str(tmp_path / 'rate.db'), 'token')
+    rate_limit.update(_headers(60, 30, int(time.time()) + 60))
+
+    copied = pickle.loads(pickle.dumps(rate_limit))
+    copied.consume()
+
+    assert rate_limit.remaining == 29
+
+
+def test_processes_share_the_remaining_count(tmp_path):
+    rate_limit = SharedRateLimit(str(tmp_path / 'rate.db'), 'token')
+    rate_limit.update(_headers(60, 50, int(time.time()) + 60))
+
+    context = multiprocessing.get_context('spawn')
+    processes = [context.Process(target=_send, args=(rate_limit, 5)) for _ in range(2)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(30)
+
+    assert [process.exitcode for process in processes] == [0, 0]
+    assert rate_limit.remaining == 40
+    assert rate_limit.available() == 40
+
+
+class _Counter(SQLiteStore):
+    def __init__(self, path):
+        self._init_store(path, 'CREATE TABLE IF NOT EXISTS counter (n INTEGER NOT NULL);')
+        self._transaction(lambda conn: conn.execute('INSERT INTO counter VALUES (0)'))
+
+    def add(self, fail=False):
+        def add(conn):
+            conn.execute('UPDATE counter SET n = n + 1')
+            if fail:
+                raise ValueError('fail')
+
+        self._transaction(add)
+
+    def value(self):
+        return self._connect().execute('SELECT n FROM counter').fetchone()[0]
+
+
+def test_store_rolls_back_failed_transactions(tmp_path):
+    counter = _Counter(str(tmp_path / 'counter.db'))
+    counter.add()
+
+    with pytest.raises(ValueError):
+        counter.add(fail=True)
+    assert counter.value() == 1
+
+
+def test_store_uses_a_connection_per_thread(tmp_path):
+    counter = _Counter(str(tmp_path / 'counter.db'))
+    threads = [threading.Thread(target=lambda: [counter.add() for _ in range(20)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert counter.value() == 80
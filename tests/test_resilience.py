@@ -0,0 +1,64 @@
+import threading
+import time
+
+from pytwitcasting.resilience import HedgePolicy
+
+
+class _Response(object):
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_hedge_latency_excludes_pool_wait():
+    policy = HedgePolicy(initial_delay=10.0, max_workers=1)
+
+    def send():
+        time.sleep(0.02)
+        return 'ok'
+
+    threads = [threading.Thread(target=policy.request, args=(send,)) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 20件が1スレッドで順に送信されるが、待ち時間は1件の送信時間から計算される
+    assert policy.metrics()['requests'] == 20
+    assert policy.metrics()['delay'] < 0.2
+
+
+def test_hedge_is_skipped_when_no_worker_is_free():
+    policy = HedgePolicy(max_extra=1.0, initial_delay=0.01, max_workers=1)
+
+    def send():
+        time.sleep(0.2)
+        return 'ok'
+
+    started = time.monotonic()
+    assert policy.request(send) == 'ok'
+
+    assert time.monotonic() - started < 0.35
+    assert policy.metrics()['hedged'] == 0
+    assert policy.metrics()['skipped'] == 1
+
+
+def test_slow_request_is_hedged():
+    policy = HedgePolicy(max_extra=1.0, initial_delay=0.01, max_workers=2)
+    responses = []
+
+    def send():
+        response = _Response(len(responses) + 1)
+        responses.append(response)
+        time.sleep(0.3 if response.number == 1 else 0.01)
+        return response
+
+    assert policy.request(send).number == 2
+    assert policy.metrics()['hedged'] == 1
+    assert policy.metrics()['hedge_wins'] == 1
+    # 遅れて返ってきた最初のレスポンスは閉じられる
+    time.sleep(0.4)
+    assert responses[0].closed
@@ -0,0 +1,39 @@
+import requests
+
+from pytwitcasting.sampler import RingBuffer, ViewCountSampler
+
+
+class _Movie(object):
+    def __init__(self, movie_id):
+        self.id = movie_id
+        self.is_live = True
+        self.current_view_count = 10
+        self.total_view_count = 100
+        self.comment_count = 5
+        self.max_view_count = 20
+
+
+class _API(object):
+    def get_movie_info(self, movie_id):
+        if movie_id == 'down':
+            raise requests.exceptions.ConnectionError('down')
+        return {'movie': _Movie(movie_id)}
+
+
+def test_ring_buffer_keeps_latest_samples():
+    buffer = RingBuffer(3)
+    for i in range(5):
+        buffer.append(float(i), i, i * 10, i * 100, i * 2)
+    columns = buffer.columns()
+    assert list(columns['timestamp']) == [2.0, 3.0, 4.0]
+    assert list(columns['max_view_count']) == [4, 6, 8]
+
+
+def test_network_error_does_not_stop_other_movies():
+    sampler = ViewCountSampler(_API())
+    sampler.add_movie('1')
+    sampler.add_movie('down')
+
+    assert sampler.sample() == 1
+    assert sampler.metrics() == {'samples': 1, 'errors': 1}
+    assert list(sampler.buffers['1'].columns()['max_view_count']) == [20]
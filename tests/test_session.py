@@ -0,0 +1,64 @@
+import threading
+
+from pytwitcasting.api import API, ThreadSafeSession, create_session
+
+
+def test_session_pool_is_sized_as_requested():
+    session = create_session(pool_connections=2, pool_maxsize=30, retries=1)
+    adapter = session.adapters['https://']
+
+    assert adapter.poolmanager.connection_pool_kw['maxsize'] == 30
+    assert adapter.max_retries.total == 1
+
+
+def test_apis_share_one_session():
+    session = create_session()
+    first = API('a', requests_session=session)
+    second = API('b', requests_session=session)
+
+    assert first._session is session
+    assert second._session is session
+
+
+def test_with_token_shares_the_session_but_not_the_rate_limit():
+    api = API('a', requests_session=create_session())
+    other = api.with_token('b')
+
+    assert other._session is api._session
+    assert other.rate_limit is not api.rate_limit
+    assert api._access_token == 'a'
+
+
+def test_thread_safe_session_gives_each_thread_its_own_session():
+    session = ThreadSafeSession(pool_maxsize=4)
+    sessions = []
+
+    def run():
+        sessions.append(session.session)
+        # 同じスレッドでは同じセッションを使い回す
+        sessions.append(session.session)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(a is b for a, b in zip(sessions[::2], sessions[1::2]))
+    assert len({id(s) for s in sessions}) == 4
+    # コネクションプールは全スレッドで共有する
+    assert len({id(s.adapters['https://']) for s in sessions}) == 1
+
+
+def test_thread_safe_session_blocks_at_pool_maxsize():
+    session = ThreadSafeSession(pool_maxsize=4)
+    adapter = session.session.adapters['https://']
+
+    assert adapter.poolmanager.connection_pool_kw['maxsize'] == 4
+    assert adapter.poolmanager.connection_pool_kw['block'] is True
+
+
+def test_api_accepts_a_thread_safe_session():
+    session = ThreadSafeSession()
+
+    assert API('a', requests_session=session)._session is session
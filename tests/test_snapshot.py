@@ -0,0 +1,83 @@
+import pytest
+
+from pytwitcasting.error import TwitcastingError
+from pytwitcasting.models import (App, Category, Comment, ModelFactory, Movie, SubCategory, Supporter, User,
+                                  WebHook)
+from pytwitcasting.snapshot import ModelCache, Snapshot
+
+
+USER = {'id': '182224938', 'screen_id': 'twitcasting_jp', 'name': 'ツイキャス公式', 'created': 1479368944}
+PAYLOADS = {
+    User: USER,
+    Supporter: dict(USER, point=10, total_point=20),
+    Movie: {'id': '189037369', 'user_id': '182224938', 'title': 'ライブ #189037369', 'created': 1479368944},
+    App: {'client_id': '182224938.d37f58350925d568e2db24719fe86f1cd5c3eb5f1ac8d3a6b5e2d1b4c6a7e9f0',
+          'name': 'Sample App', 'owner_user_id': '182224938'},
+    Comment: {'id': '7134775954', 'message': 'モイ！', 'from_user': USER, 'created': 1479579471},
+    Category: {'id': 'girls_jcjk_jp', 'name': '女子中高生',
+               'sub_categories': [{'id': 'girls_jcjk_jp_sub', 'name': '女子中高生 雑談', 'count': 3}]},
+    SubCategory: {'id': 'girls_jcjk_jp_sub', 'name': '女子中高生 雑談', 'count': 3},
+    WebHook: {'user_id': '182224938', 'event': 'livestart'},
+}
+
+
+def test_every_cached_model_type_round_trips(tmp_path):
+    # ModelFactoryに登録されたモデルはすべて保存できる
+    factory_models = {model for model in vars(ModelFactory).values() if isinstance(model, type)}
+    assert factory_models <= set(PAYLOADS)
+
+    path = str(tmp_path / 'state.snap')
+    models = {cls.__name__: cls.parse(None, payload) for cls, payload in PAYLOADS.items()}
+    snapshot = Snapshot(path)
+    snapshot.register('models', ModelCache(None, models))
+    snapshot.save()
+
+    restored = {}
+    snapshot = Snapshot(path)
+    snapshot.register('models', ModelCache(None, restored))
+    assert snapshot.restore() == ['models']
+
+    assert set(restored) == set(models)
+    for name, model in models.items():
+        assert restored[name]._json == model._json
+    assert type(restored['SubCategory']) is SubCategory
+    assert type(restored['Category'].sub_categories[0]) is SubCategory
+    assert restored['Comment'].from_user.screen_id == 'twitcasting_jp'
+    assert restored['Movie'].created == models['Movie'].created
+    # 子クラスは親クラスとして復元される
+    assert type(restored['Supporter']) is User
+
+
+def test_restore_keeps_newer_models(tmp_path):
+    path = str(tmp_path / 'state.snap')
+    snapshot = Snapshot(path)
+    snapshot.register('users', {'a': User.parse(None, dict(USER, name='old'))})
+    snapshot.save()
+
+    users = {'a': User.parse(None, dict(USER, name='new'))}
+    snapshot = Snapshot(path)
+    snapshot.register('users', users)
+    snapshot.restore()
+
+    assert users['a'].name == 'new'
+
+
+def test_missing_file_restores_nothing(tmp_path):
+    snapshot = Snapshot(str(tmp_path / 'missing.snap'))
+    snapshot.register('users', {})
+
+    assert snapshot.restore() == []
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'state.snap'
+    path.write_bytes(b'not a snapshot file')
+    snapshot = Snapshot(str(path))
+
+    with pytest.raises(TwitcastingError):
+        snapshot.load()
+
+
+def test_unsupported_components_are_rejected(tmp_path):
+    with pytest.raises(TypeError):
+        Snapshot(str(tmp_path / 'state.snap')).register('bad', object())
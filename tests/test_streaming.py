@@ -0,0 +1,28 @@
+import json
+
+import pytest
+
+from pytwitcasting.streaming import iter_array_items
+
+
+DOCUMENTS = [
+    '{"movies":[1.25]}',
+    '{"total_count":12.5e-3,"movies":[1,-2.0,3e10,1E+2,0.5],"next":null}',
+    '{"movies":[{"id":"1","duration":12.75,"is_live":true},{"id":"2","title":"\\u3042 ツイキャス"}],"all_count":2}',
+    '{ "all_count" : 100 , "movies" : [ [1, 2.5], {"a": [false, null]}, "x" ] , "extra": -0.0 }',
+]
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('document', DOCUMENTS)
+def test_matches_json_loads_for_every_chunk_size(document):
+    data = document.encode('utf-8')
+    expected = json.loads(document)
+    for size in range(1, len(data) + 1):
+        meta = {}
+        items = list(iter_array_items(_chunks(data, size), 'movies', meta))
+        assert items == expected['movies'], size
+        assert meta == {k: v for k, v in expected.items() if k != 'movies'}, size
@@ -0,0 +1,63 @@
+import datetime
+
+import requests
+
+from pytwitcasting.sync import MovieSyncer
+
+
+class _Movie(object):
+    def __init__(self, movie_id):
+        self.id = movie_id
+        self.created = datetime.datetime.fromtimestamp(1500000000 + movie_id)
+
+
+class _API(object):
+    def __init__(self, movies):
+        # user_id -> ライブIDの配列(新しい順)
+        self.movies = movies
+        self.down = set()
+
+    def sync_movies(self, user_id, since_movie_id=None):
+        if user_id in self.down:
+            raise requests.exceptions.ConnectionError('down')
+        since = int(since_movie_id) if since_movie_id is not None else 0
+        return [_Movie(movie_id) for movie_id in self.movies[user_id] if movie_id > since]
+
+
+def test_sync_returns_only_new_movies(tmp_path):
+    api = _API({'a': [3, 2, 1]})
+    path = str(tmp_path / 'marks.json')
+    syncer = MovieSyncer(api, path)
+    assert [m.id for m in syncer.sync('a')] == [3, 2, 1]
+    syncer.save()
+
+    api.movies['a'] = [5, 4, 3, 2, 1]
+    assert [m.id for m in MovieSyncer(api, path).sync('a')] == [5, 4]
+
+
+def test_sync_many_keeps_going_after_network_error():
+    api = _API({'a': [2, 1], 'b': [1]})
+    api.down.add('a')
+    syncer = MovieSyncer(api)
+    res = syncer.sync_many(['a', 'b'])
+
+    assert isinstance(res['failed']['a'], requests.exceptions.ConnectionError)
+    assert [m.id for m in res['movies']['b']] == [1]
+    assert 'a' not in syncer.marks
+    assert syncer.marks['b']['movie_id'] == '1'
+
+
+def test_mark_advances_only_after_on_movies_returns():
+    api = _API({'a': [2, 1], 'b': [1]})
+    syncer = MovieSyncer(api)
+
+    def on_movies(user_id, movies):
+        if user_id == 'a':
+            raise OSError('disk full')
+
+    res = syncer.sync_many(['a', 'b'], on_movies=on_movies)
+    assert isinstance(res['failed']['a'], OSError)
+    assert 'a' not in syncer.marks
+    assert syncer.marks['b']['movie_id'] == '1'
+    # 次回は渡せなかったライブをもう一度取得する
+    assert [m.id for m in syncer.sync('a')] == [2, 1]
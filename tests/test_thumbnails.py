@@ -0,0 +1,32 @@
+import requests
+
+from pytwitcasting.thumbnails import ThumbnailCapture
+
+
+class _API(object):
+    def _get_live_thumbnail_image(self, user_id, size='small', position='latest'):
+        if user_id == 'down':
+            raise requests.exceptions.ReadTimeout('slow')
+        return {'bytes_data': user_id.encode('utf-8'), 'file_ext': 'jpg'}
+
+
+def test_network_error_does_not_stop_other_users():
+    stored = []
+    capture = ThumbnailCapture(_API(), lambda user_id, image, captured_at: stored.append(user_id))
+    capture.add('a')
+    capture.add('down')
+
+    assert capture.poll(now=0.0) == 1
+    assert stored == ['a']
+    assert capture.metrics()['errors'] == 1
+    # 変化がなければ保存しない
+    assert capture.poll(now=1000.0) == 0
+
+
+def test_restore_state_only_for_registered_users():
+    capture = ThumbnailCapture(_API(), lambda *args: None)
+    capture.add('a')
+    capture.restore_state({'a': {'hash': None, 'interval': 20.0, 'next_at': 5.0},
+                           'gone': {'hash': None, 'interval': 10.0, 'next_at': 0.0}})
+    assert set(capture.states) == {'a'}
+    assert capture.states['a']['interval'] == 20.0
@@ -0,0 +1,92 @@
+import threading
+
+import requests
+
+from pytwitcasting.api import API
+from pytwitcasting.models import WebHook
+
+
+class _API(API):
+    """ WebHookの登録状況をメモリに持つ """
+
+    def __init__(self, current, down=()):
+        super().__init__(application_basis='basis')
+        self.current = set(current)
+        self.down = set(down)
+        self.calls = []
+        self._hooks_lock = threading.Lock()
+
+    def get_webhook_list(self, limit=50, offset=0, user_id=None):
+        with self._hooks_lock:
+            self.calls.append(('list', offset))
+            hooks = sorted(self.current)
+        return {'all_count': len(hooks),
+                'webhooks': [WebHook.parse(self, {'user_id': u, 'event': e}) for u, e in hooks[offset:offset + limit]]}
+
+    def register_webhook(self, user_id, events):
+        if user_id in self.down:
+            raise requests.exceptions.ConnectionError('down')
+        with self._hooks_lock:
+            self.calls.append(('register', user_id))
+            self.current.update((user_id, event) for event in events)
+        return {'user_id': user_id, 'added_events': events}
+
+    def remove_webhook(self, user_id, events):
+        if user_id in self.down:
+            raise requests.exceptions.ConnectionError('down')
+        with self._hooks_lock:
+            self.calls.append(('remove', user_id))
+            self.current.difference_update((user_id, event) for event in events)
+        return {'user_id': user_id, 'deleted_events': events}
+
+
+def test_reconcile_applies_only_the_difference():
+    api = _API({('1', 'livestart'), ('2', 'livestart'), ('2', 'liveend')})
+
+    result = api.reconcile_webhooks({'1': ['livestart', 'liveend'], 3: ['livestart']})
+
+    assert result['registered'] == {'1': ['liveend'], '3': ['livestart']}
+    assert result['removed'] == {'2': ['liveend', 'livestart']}
+    assert result['failed'] == {}
+    # 一覧1回と、ユーザごとに1回ずつ
+    assert result['api_calls'] == 4
+    assert api.current == {('1', 'livestart'), ('1', 'liveend'), ('3', 'livestart')}
+
+
+def test_reconcile_is_idempotent():
+    api = _API({('2', 'livestart')})
+    desired = [('1', 'livestart')]
+    api.reconcile_webhooks(desired)
+
+    result = api.reconcile_webhooks(desired)
+
+    assert result == {'registered': {}, 'removed': {}, 'failed': {}, 'api_calls': 1}
+
+
+def test_reconcile_without_prune_keeps_extra_webhooks():
+    api = _API({('2', 'livestart')})
+
+    result = api.reconcile_webhooks({'1': ['livestart']}, prune=False)
+
+    assert result['removed'] == {}
+    assert api.current == {('1', 'livestart'), ('2', 'livestart')}
+
+
+def test_reconcile_reads_every_page():
+    current = {(str(i), 'livestart') for i in range(250)}
+    api = _API(current)
+
+    result = api.reconcile_webhooks(current)
+
+    assert sorted(offset for call, offset in api.calls if call == 'list') == [0, 100, 200]
+    assert result['registered'] == {} and result['removed'] == {}
+
+
+def test_reconcile_keeps_every_failure_per_user():
+    api = _API({('9', 'liveend')}, down={'9'})
+
+    result = api.reconcile_webhooks({'9': ['livestart']})
+
+    assert [f['action'] for f in result['failed']['9']] == ['registered', 'removed']
+    assert all(isinstance(f['error'], requests.exceptions.ConnectionError) for f in result['failed']['9'])
+    assert api.current == {('9', 'liveend')}